@@ -1,20 +1,31 @@
-from flask import Flask, redirect, url_for, flash
+import click
+from flask import Flask, redirect, url_for, flash, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
-from flask_marshmallow import Marshmallow
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
 from config import Config
 from .utils import setup_logging
 
 # Extensions
 db = SQLAlchemy()
-ma = Marshmallow()
 jwt = JWTManager()
-migrate = Migrate()
 
-def create_app():
+
+def __getattr__(name):
+    # flask-marshmallow pulls in marshmallow-sqlalchemy (~100 ms) and nothing needs it at
+    # startup, so `from app import ma` imports it on first use instead
+    if name == 'ma':
+        from flask_marshmallow import Marshmallow
+        globals()['ma'] = Marshmallow()
+        return globals()['ma']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_app(test_config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    # Overrides for scratch apps (benchmarks, tests): a different database, caches off, ...
+    if test_config:
+        app.config.update(test_config)
 
     # JWT Config (Cookies-based)
     app.config.update({
@@ -26,34 +37,48 @@ def create_app():
     })
 
     # Initialize extensions
+    from .engine_profile import configure_engine_options, install_sqlite_profile
+    configure_engine_options(app)
     db.init_app(app)
-    ma.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+
+    # Flask-Migrate (and Alembic, ~130 ms to import) only backs the `flask db` commands,
+    # so it is loaded when running under the flask CLI and skipped in server workers
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        from .dbcheck import migrations_dir
+        Migrate(app, db, directory=migrations_dir(app))
+
+    # SQLite connection profile (WAL, pragmas, lock-contention metrics)
+    with app.app_context():
+        install_sqlite_profile(db.engine, app.config)
 
     # Setup logging
     setup_logging(app)
 
     # JWT Error Handlers
+    def login_required_response(message):
+        # JSON API clients get a 401 instead of the login page
+        if request.blueprint == 'api':
+            return jsonify(error=message), 401
+        flash(message, "warning")
+        return redirect(url_for('auth.login'))
+
     @jwt.unauthorized_loader
     def custom_unauthorized_response(callback):
-        flash("Please log in to continue.", "warning")
-        return redirect(url_for('auth.login'))
+        return login_required_response("Please log in to continue.")
 
     @jwt.invalid_token_loader
     def custom_invalid_token_response(callback):
-        flash("Invalid or expired token. Please log in again.", "warning")
-        return redirect(url_for('auth.login'))
+        return login_required_response("Invalid or expired token. Please log in again.")
 
     @jwt.expired_token_loader
     def custom_expired_token_response(jwt_header, jwt_payload):
-        flash("Your session has expired. Please log in again.", "warning")
-        return redirect(url_for('auth.login'))
+        return login_required_response("Your session has expired. Please log in again.")
 
     @jwt.revoked_token_loader
     def custom_revoked_token_response(jwt_header, jwt_payload):
-        flash("Token has been revoked. Please log in again.", "warning")
-        return redirect(url_for('auth.login'))
+        return login_required_response("Token has been revoked. Please log in again.")
 
     # Blueprint Registration
     with app.app_context():
@@ -61,13 +86,48 @@ def create_app():
         from .routes.device import device_bp
         from .routes.diagnostics import diagnostics_bp
         from .routes.main import main_bp
+        from .routes.api import api_bp
 
         app.register_blueprint(auth_bp, url_prefix="/auth")
         app.register_blueprint(device_bp, url_prefix="/devices")
         app.register_blueprint(diagnostics_bp, url_prefix="/diagnostics")
         app.register_blueprint(main_bp)
+        app.register_blueprint(api_bp, url_prefix="/api/v1")
+
+    # Schema must be at the migration head (no implicit create_all on boot)
+    from .dbcheck import check_migrations_at_head
+    check_migrations_at_head(app, db)
+
+    # Request metrics (/metrics)
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # Recent samples per device for the device listing
+    from .hotstore import init_hot_store
+    init_hot_store(app)
+
+    # Rendered list fragments, invalidated by data version
+    from .cache import init_page_cache
+    init_page_cache(app)
+
+    # Late samples for months already in the cold archive
+    from .archive import init_archive
+    init_archive(app)
+
+    # Optional write-behind queue for diagnostics ingest
+    from .writebehind import init_write_behind
+    init_write_behind(app)
+
+    # Live diagnostics stream (SSE) fan-out
+    from .live import init_live_feed
+    init_live_feed(app)
+
+    # Opt-in SQL profiling (slow queries + N+1 detection)
+    from .profiling import init_profiling
+    init_profiling(app)
 
-        # Create tables (safe if already exist)
-        db.create_all()
+    # CLI Commands
+    from .cli import register_cli
+    register_cli(app)
 
     return app
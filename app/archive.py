@@ -0,0 +1,385 @@
+import os
+import struct
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app.models import Device, DeviceDiagnostics, db
+from app.signals import diagnostics_added, diagnostics_changed
+
+# Partition file: 64-byte header, then int64 timestamps (microseconds since the
+# epoch, ascending), float32 cpu_usage, float32 memory_usage and, from version 2,
+# the int64 DeviceDiagnostics ids, all little-endian.
+MAGIC = b'DGA1'
+VERSION = 2
+HEADER = struct.Struct('<4sHHqQqq')  # magic, version, flags, device_id, count, first_ts, last_ts
+HEADER_SIZE = 64
+SUFFIX = '.dga'
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(timestamp):
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros):
+    return _EPOCH + timedelta(microseconds=int(micros))
+
+
+def month_start(timestamp):
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+# ----------------------
+# Layout
+# ----------------------
+def archive_dir():
+    """Configured archive root, or None when archiving is disabled."""
+    return current_app.config.get('DIAGNOSTICS_ARCHIVE_DIR') or None
+
+
+def partition_path(root, device_id, month):
+    return os.path.join(root, str(device_id), f"{month:%Y-%m}{SUFFIX}")
+
+
+def partitions(device_id, root=None):
+    """[(month_start, path)] of a device's archived months, oldest first."""
+    root = root or archive_dir()
+    device_dir = os.path.join(root, str(device_id)) if root else None
+    if not device_dir or not os.path.isdir(device_dir):
+        return []
+    months = []
+    for name in os.listdir(device_dir):
+        if name.endswith(SUFFIX):
+            try:
+                months.append((datetime.strptime(name[:-len(SUFFIX)], '%Y-%m'), os.path.join(device_dir, name)))
+            except ValueError:
+                continue
+    return sorted(months)
+
+
+def horizon(device_id, root=None):
+    """
+    End of the newest archived month. Reads before this point come from the
+    archive and reads after it from DeviceDiagnostics, so a sample is never
+    counted twice while its raw row waits for the retention purge.
+    """
+    archived = partitions(device_id, root)
+    return next_month(archived[-1][0]) if archived else None
+
+
+def live_ranges(device_ids, start):
+    """[(live_start, device_ids)]: where each device's live rows begin, grouped by that start."""
+    groups = {}
+    for device_id in device_ids:
+        device_horizon = horizon(device_id)
+        live_start = start
+        if device_horizon is not None and (start is None or device_horizon > start):
+            live_start = device_horizon
+        groups.setdefault(live_start, []).append(device_id)
+    return list(groups.items())
+
+
+# ----------------------
+# Reader
+# ----------------------
+class Partition:
+    """Read-only, memory-mapped partition. Column arrays are zero-copy views of the file."""
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, _, self.device_id, self.count, first_ts, last_ts = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"{path} is not a diagnostics archive partition")
+
+        offset = HEADER_SIZE
+        self.timestamps = self._map[offset:offset + 8 * self.count].view('<i8')
+        offset += 8 * self.count
+        self.cpu = self._map[offset:offset + 4 * self.count].view('<f4')
+        offset += 4 * self.count
+        self.memory = self._map[offset:offset + 4 * self.count].view('<f4')
+        offset += 4 * self.count
+        # Version 1 files predate archived ids; 0 is never a row id
+        self.ids = (self._map[offset:offset + 8 * self.count].view('<i8') if version >= 2
+                    else np.zeros(self.count, dtype='<i8'))
+        self.first = _from_micros(first_ts) if self.count else None
+        self.last = _from_micros(last_ts) if self.count else None
+
+    def slice(self, start=None, end=None):
+        """(timestamps, cpu, memory, ids) views for samples in [start, end)."""
+        import numpy as np
+
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, _to_micros(start), 'left'))
+        hi = self.count if end is None else int(np.searchsorted(self.timestamps, _to_micros(end), 'left'))
+        return self.timestamps[lo:hi], self.cpu[lo:hi], self.memory[lo:hi], self.ids[lo:hi]
+
+
+def archived_slices(device_id, start=None, end=None):
+    """Yield (timestamps, cpu, memory, ids) views of the device's archived samples in [start, end), in time order."""
+    for month, path in partitions(device_id):
+        if (end is not None and month >= end) or (start is not None and next_month(month) <= start):
+            continue
+        columns = Partition(path).slice(start, end)
+        if len(columns[0]):
+            yield columns
+
+
+def archived_rows(device_id, start=None, end=None, chunk_size=5000):
+    """
+    Archived samples as export tuples (id, device_id, cpu, mem, timestamp),
+    chunk_size at a time. The id is None in files written before ids were
+    archived; float32 values are rounded to 4 decimals so they print as they
+    were entered.
+    """
+    for timestamps, cpu, memory, ids in archived_slices(device_id, start, end):
+        for offset in range(0, len(timestamps), chunk_size):
+            stop = offset + chunk_size
+            yield [
+                (i or None, device_id, round(c, 4), round(m, 4), _from_micros(t))
+                for t, c, m, i in zip(timestamps[offset:stop].tolist(), cpu[offset:stop].tolist(),
+                                      memory[offset:stop].tolist(), ids[offset:stop].tolist())
+            ]
+
+
+def archived_columns(device_ids, start, end):
+    """(device_id, cpu, memory) float64 rows of archived samples, same shape as stats.fetch_columns."""
+    import numpy as np
+
+    blocks = []
+    for device_id in device_ids:
+        for timestamps, cpu, memory, _ in archived_slices(device_id, start, end):
+            block = np.empty((len(timestamps), 3))
+            block[:, 0] = device_id
+            # Same 4-decimal rounding as exports, so float32 storage does not shift percentiles
+            block[:, 1] = np.round(cpu.astype(np.float64), 4)
+            block[:, 2] = np.round(memory.astype(np.float64), 4)
+            blocks.append(block)
+    return np.concatenate(blocks) if blocks else np.empty((0, 3))
+
+
+# ----------------------
+# Writer
+# ----------------------
+def write_partition(path, device_id, timestamps, cpu, memory, ids):
+    """Write one partition atomically (temp file + rename). Inputs must be sorted by timestamp."""
+    import numpy as np
+
+    timestamps = np.ascontiguousarray(timestamps, dtype='<i8')
+    count = len(timestamps)
+    header = HEADER.pack(MAGIC, VERSION, 0, device_id, count,
+                         int(timestamps[0]) if count else 0, int(timestamps[-1]) if count else 0)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Per writer: `archive run`, the retention purge and the archiver thread may rewrite the same month
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(timestamps.tobytes())
+        f.write(np.ascontiguousarray(cpu, dtype='<f4').tobytes())
+        f.write(np.ascontiguousarray(memory, dtype='<f4').tobytes())
+        f.write(np.ascontiguousarray(ids, dtype='<i8').tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return HEADER_SIZE + 24 * count
+
+
+def _keep_before(device_id):
+    """
+    Archived samples older than this may have lost their raw rows to the
+    retention purge, so a month rewrite keeps them; newer archived samples
+    missing from DeviceDiagnostics were deleted and are dropped.
+    """
+    purged_before, oldest = db.session.execute(
+        select(Device.purged_before,
+               select(func.min(DeviceDiagnostics.timestamp))
+               .where(DeviceDiagnostics.device_id == device_id).scalar_subquery())
+        .where(Device.id == device_id)
+    ).one_or_none() or (None, None)
+    return purged_before or oldest or datetime.max
+
+
+def _archive_month(device_id, month, root, keep_before):
+    """
+    Rewrite one month's partition from its DeviceDiagnostics rows, keyed by
+    row id: archived samples take their current values, and those deleted
+    from the table are dropped unless they are older than `keep_before`.
+    Returns (samples, bytes), or None when the file is already up to date.
+    """
+    import numpy as np
+
+    rows = db.session.execute(
+        select(DeviceDiagnostics.timestamp, DeviceDiagnostics.cpu_usage,
+               DeviceDiagnostics.memory_usage, DeviceDiagnostics.id)
+        .where(DeviceDiagnostics.device_id == device_id,
+               DeviceDiagnostics.timestamp >= month,
+               DeviceDiagnostics.timestamp < next_month(month))
+        .order_by(DeviceDiagnostics.timestamp, DeviceDiagnostics.id)
+    ).all()
+    timestamps = np.fromiter((_to_micros(t) for t, _, _, _ in rows), dtype='<i8', count=len(rows))
+    cpu = np.fromiter((c for _, c, _, _ in rows), dtype='<f4', count=len(rows))
+    memory = np.fromiter((m for _, _, m, _ in rows), dtype='<f4', count=len(rows))
+    ids = np.fromiter((i for _, _, _, i in rows), dtype='<i8', count=len(rows))
+
+    path = partition_path(root, device_id, month)
+    if os.path.exists(path):
+        existing = Partition(path)
+        kept = ~np.isin(existing.ids, ids) & (existing.timestamps < _to_micros(keep_before))
+        if kept.any():
+            timestamps = np.concatenate([existing.timestamps[kept], timestamps])
+            cpu = np.concatenate([existing.cpu[kept], cpu])
+            memory = np.concatenate([existing.memory[kept], memory])
+            ids = np.concatenate([existing.ids[kept], ids])
+            order = np.lexsort((ids, timestamps))
+            timestamps, cpu, memory, ids = timestamps[order], cpu[order], memory[order], ids[order]
+        unchanged = (existing.count == len(ids) and np.array_equal(existing.ids, ids)
+                     and np.array_equal(existing.timestamps, timestamps)
+                     and np.array_equal(existing.cpu, cpu) and np.array_equal(existing.memory, memory))
+        del existing
+        if unchanged:
+            return None
+        if not len(ids):
+            os.remove(path)
+            return 0, 0
+    elif not len(ids):
+        return None
+
+    return len(ids), write_partition(path, device_id, timestamps, cpu, memory, ids)
+
+
+def archive_device(device_id, before, root=None, since=None):
+    """
+    Archive a device's closed months (those ending at or before `before`, and
+    from the month of `since` on, if given) that still have rows in
+    DeviceDiagnostics. A month archived earlier is rewritten from its rows,
+    so late, edited and deleted samples are reflected. Returns [(month, samples, bytes)].
+    """
+    root = root or archive_dir()
+    window = [DeviceDiagnostics.device_id == device_id, DeviceDiagnostics.timestamp < before]
+    if since is not None:
+        window.append(DeviceDiagnostics.timestamp >= month_start(since))
+    first = db.session.execute(
+        select(DeviceDiagnostics.timestamp).where(*window).order_by(DeviceDiagnostics.timestamp).limit(1)
+    ).scalar()
+    if first is None:
+        return []
+
+    keep_before = _keep_before(device_id)
+    written = []
+    month = month_start(first)
+    while next_month(month) <= before:
+        result = _archive_month(device_id, month, root, keep_before)
+        if result is not None:
+            written.append((month, *result))
+        month = next_month(month)
+    return written
+
+
+def rearchive_device(device_id, since=None, root=None):
+    """
+    Bring a device's archived months (from the month of `since` on, if given)
+    in line with DeviceDiagnostics after samples were added, edited or
+    deleted there. Returns [(month, samples, bytes)] of rewritten months.
+    """
+    root = root or archive_dir()
+    months = [month for month, _ in partitions(device_id, root)
+              if since is None or next_month(month) > since]
+    if not months:
+        return []
+
+    keep_before = _keep_before(device_id)
+    written = []
+    for month in months:
+        result = _archive_month(device_id, month, root, keep_before)
+        if result is not None:
+            written.append((month, *result))
+    return written
+
+
+def delete_device_archive(device_id):
+    root = archive_dir()
+    for _, path in partitions(device_id, root):
+        os.remove(path)
+    if root and os.path.isdir(os.path.join(root, str(device_id))):
+        os.rmdir(os.path.join(root, str(device_id)))
+
+
+# ----------------------
+# App Wiring
+# ----------------------
+_archiver_lock = threading.Lock()
+
+
+def request_rearchive(app, device_id, since=None):
+    """Queue a device for the archiver thread; `since` None means all of its archived months."""
+    with _archiver_lock:
+        pending = app.extensions.setdefault('archive_pending', {})
+        if device_id in pending:
+            queued = pending[device_id]
+            since = None if queued is None or since is None else min(queued, since)
+        pending[device_id] = since
+
+        # Started lazily so forked workers get their own thread
+        thread = app.extensions.get('archiver')
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_run_archiver, args=(app,), name='archiver', daemon=True)
+            app.extensions['archiver'] = thread
+            thread.start()
+
+
+def _run_archiver(app):
+    with app.app_context():
+        while True:
+            with _archiver_lock:
+                pending = app.extensions.get('archive_pending')
+                if not pending:
+                    # Checked under the lock, so a request queued now starts a new thread
+                    app.extensions.pop('archiver', None)
+                    return
+                device_id, since = pending.popitem()
+            try:
+                rearchive_device(device_id, since)
+            except Exception as e:
+                app.logger.warning("Re-archiving device %s failed: %s", device_id, str(e))
+            finally:
+                db.session.remove()
+
+
+def init_archive(app):
+    """
+    Keep archived months in line with DeviceDiagnostics: reads take those
+    months from the archive alone, so /stats and exports would otherwise
+    miss back-dated samples and show edited or deleted ones until the next
+    `archive run`. The rewrite runs on a background thread, off the request
+    path; a failure only delays it, as the retention purge archives before
+    it deletes.
+    """
+    def on_added(sender, rows, **kwargs):
+        if not archive_dir():
+            return
+        closed = month_start(datetime.utcnow())
+        late = {}
+        for row in rows:
+            timestamp = row.get('timestamp')
+            if timestamp is not None and timestamp < closed:
+                device_id = row['device_id']
+                late[device_id] = min(timestamp, late.get(device_id, timestamp))
+        for device_id, oldest in late.items():
+            request_rearchive(app, device_id, since=oldest)
+
+    def on_changed(sender, device_ids, **kwargs):
+        if not archive_dir():
+            return
+        for device_id in device_ids:
+            request_rearchive(app, device_id)
+
+    diagnostics_added.connect(on_added, sender=app, weak=False)
+    diagnostics_changed.connect(on_changed, sender=app, weak=False)
@@ -0,0 +1,364 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urlparse
+from sqlalchemy import event, insert, select
+from app.models import Device, DeviceDiagnostics, User, db
+from app.seed import SEED_PASSWORD, seed, seed_usernames
+
+# Rows seeded per scale: users, devices per user, diagnostics per device
+SCALES = {
+    'small': {'users': 2, 'devices': 10, 'diagnostics': 100},
+    'medium': {'users': 5, 'devices': 50, 'diagnostics': 1000},
+    'large': {'users': 10, 'devices': 100, 'diagnostics': 2000},
+}
+DEFAULT_SCALES = ('small', 'medium')
+
+# Scratch app settings: a throwaway database, and none of the optional
+# background machinery, so every timed request does its own work
+BENCH_CONFIG = {
+    'TESTING': True,
+    'DB_SCHEMA_CHECK': 'off',
+    'PAGE_CACHE_TTL': 0,
+    'PAGE_CACHE_BACKEND': '',
+    'DIAGNOSTICS_WRITE_BEHIND': False,
+    'LIVE_FEED_BROKER': '',
+    'METRICS_DIR': None,
+    'SQL_PROFILING': False,
+}
+
+Scenario = namedtuple('Scenario', 'name endpoint method status location send')
+Clients = namedtuple('Clients', 'user anonymous')
+RouteResult = namedtuple('RouteResult', 'name endpoint method p50_ms p95_ms queries errors')
+Regression = namedtuple('Regression', 'scale name metric baseline current')
+
+
+# ----------------------
+# Scenarios
+# ----------------------
+def route_scenarios(ctx):
+    """
+    The requests the suite times, at least one per (endpoint, method) in
+    app/routes. send(clients, i) issues request number i; ctx holds ids picked
+    after seeding. Reads run first so they all see the seeded data; auth runs
+    last (password hashing dominates it, and logout ends the session).
+    """
+    device_id, diagnostic_id = ctx['device_id'], ctx['diagnostic_id']
+    device_form = {'name': 'bench-device', 'device_type': 'sensor', 'location': 'Bench 1', 'status': 'online'}
+    sample_form = {'device_id': device_id, 'cpu_usage': '42.5', 'memory_usage': '512'}
+    samples = [{'device_id': device_id, 'cpu_usage': n % 100, 'memory_usage': 512} for n in range(100)]
+    import_body = '\n'.join(
+        json.dumps({'name': f'imported-{n}', 'device_type': 'sensor', 'location': 'Bench 2', 'status': 'online'})
+        for n in range(100)
+    )
+    login_form = {'username': ctx['username'], 'password': SEED_PASSWORD}
+
+    def request(method, path, client='user', **kwargs):
+        # path and data may be callables of i. The body is read inside the timing:
+        # streamed responses (export) do their work while being read
+        def send(clients, i):
+            options = {k: v(i) if callable(v) else v for k, v in kwargs.items()}
+            response = getattr(clients, client).open(path(i) if callable(path) else path, method=method, **options)
+            response.get_data()
+            return response
+        return send
+
+    def get(path, **kwargs):
+        return request('GET', path, **kwargs)
+
+    def post(path, **kwargs):
+        return request('POST', path, **kwargs)
+
+    def open_stream(clients, i):
+        # Time to the first event, then hang up
+        response = clients.user.get('/diagnostics/stream', buffered=False)
+        next(iter(response.response), None)
+        response.close()
+        return response
+
+    return [
+        Scenario('home', 'main.home', 'GET', 200, None, get('/')),
+        Scenario('devices list', 'device.list_devices', 'GET', 200, None, get('/devices/home')),
+        Scenario('devices text search', 'device.list_devices', 'GET', 200, None, get('/devices/home?q=sensor')),
+        Scenario('devices status filter', 'device.list_devices', 'GET', 200, None, get('/devices/home?status=offline')),
+        Scenario('device add form', 'device.add_device', 'GET', 200, None, get('/devices/add')),
+        Scenario('device update form', 'device.update_device', 'GET', 200, None, get(f'/devices/update/{device_id}')),
+        Scenario('device import form', 'device.import_devices_route', 'GET', 200, None, get('/devices/import')),
+        Scenario('devices catch-all', 'device.catch_all_device', 'GET', 302, '/devices/home', get('/devices/nowhere')),
+        Scenario('diagnostics list', 'diagnostics.list_diagnostics', 'GET', 200, None, get('/diagnostics/home')),
+        Scenario('diagnostics list by cpu', 'diagnostics.list_diagnostics', 'GET', 200, None,
+                 get('/diagnostics/home?sort=cpu_usage')),
+        Scenario('diagnostics hourly rollups', 'diagnostics.list_diagnostics', 'GET', 200, None,
+                 get('/diagnostics/home?resolution=hour')),
+        Scenario('diagnostics add form', 'diagnostics.add_diagnostics', 'GET', 200, None, get('/diagnostics/add')),
+        Scenario('diagnostics update form', 'diagnostics.update_diagnostics', 'GET', 200, None,
+                 get(f'/diagnostics/update/{diagnostic_id}')),
+        Scenario('diagnostics stats 24h', 'diagnostics.diagnostics_stats', 'GET', 200, None,
+                 get('/diagnostics/stats?window=24h')),
+        Scenario('diagnostics export device', 'diagnostics.export_diagnostics', 'GET', 200, None,
+                 get(f'/diagnostics/export?format=csv&device_id={device_id}')),
+        Scenario('diagnostics stream open', 'diagnostics.stream_diagnostics', 'GET', 200, None, open_stream),
+        Scenario('diagnostics catch-all', 'diagnostics.catch_all_diagnostics', 'GET', 302, '/diagnostics/home',
+                 get('/diagnostics/nowhere')),
+        Scenario('api devices', 'api.api_devices', 'GET', 200, None, get('/api/v1/devices')),
+        Scenario('api device diagnostics', 'api.api_device_diagnostics', 'GET', 200, None,
+                 get(f'/api/v1/devices/{device_id}/diagnostics')),
+        Scenario('auth login form', 'auth.login', 'GET', 200, None, get('/auth/login')),
+        Scenario('auth register form', 'auth.register', 'GET', 200, None, get('/auth/register')),
+        Scenario('auth catch-all', 'auth.catch_all_auth', 'GET', 302, '/auth/login', get('/auth/login-page')),
+
+        Scenario('device add', 'device.add_device', 'POST', 302, '/devices/home',
+                 post('/devices/add', data=device_form)),
+        Scenario('device update', 'device.update_device', 'POST', 302, '/devices/home',
+                 post(f'/devices/update/{device_id}', data=device_form)),
+        Scenario('device import 100 rows', 'device.import_devices_route', 'POST', 201, None,
+                 post('/devices/import', data=import_body, content_type='application/x-ndjson')),
+        Scenario('diagnostics add', 'diagnostics.add_diagnostics', 'POST', 302, '/diagnostics/home',
+                 post('/diagnostics/add', data=sample_form)),
+        Scenario('diagnostics batch 100', 'diagnostics.ingest_diagnostics_batch', 'POST', 201, None,
+                 post('/diagnostics/batch', json=samples)),
+        Scenario('diagnostics update', 'diagnostics.update_diagnostics', 'POST', 302, '/diagnostics/home',
+                 post(f'/diagnostics/update/{diagnostic_id}', data=sample_form)),
+        Scenario('diagnostics delete', 'diagnostics.delete_diagnostics', 'GET', 302, '/diagnostics/home',
+                 get(lambda i: f"/diagnostics/delete/{ctx['spare_diagnostic_ids'][i]}")),
+        Scenario('device delete', 'device.delete_device', 'GET', 302, '/devices/home',
+                 get(lambda i: f"/devices/delete/{ctx['spare_device_ids'][i]}")),
+
+        Scenario('auth login', 'auth.login', 'POST', 302, '/home',
+                 post('/auth/login', client='anonymous', data=login_form)),
+        Scenario('auth register', 'auth.register', 'POST', 302, '/auth/login',
+                 post('/auth/register', client='anonymous',
+                      data=lambda i: {'username': f'bench_new_{i:05d}', 'password': SEED_PASSWORD})),
+        Scenario('auth logout', 'auth.logout', 'GET', 302, '/auth/login', get('/auth/logout', client='anonymous')),
+    ]
+
+
+def uncovered_routes(app, scenarios):
+    """(endpoint, method) pairs of the blueprints in app/routes that no scenario requests."""
+    covered = {(s.endpoint, s.method) for s in scenarios}
+    required = set()
+    for rule in app.url_map.iter_rules():
+        if '.' not in rule.endpoint:
+            continue  # static, /metrics
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            required.add((rule.endpoint, method))
+    return sorted(required - covered)
+
+
+# ----------------------
+# Measurement
+# ----------------------
+class StatementCounter:
+    """SQL statements run by one thread (background purges and flushes are not counted)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        self._thread = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _problem(scenario, response):
+    if response.status_code != scenario.status:
+        return f"status {response.status_code}, expected {scenario.status}"
+    if scenario.location is not None and urlparse(response.location or '').path != scenario.location:
+        # The views report failures with a flash and a redirect elsewhere
+        return f"redirected to {response.location}, expected {scenario.location}"
+    return None
+
+
+def _clear_flashes(clients):
+    # Untimed: keeps flashes from piling up in the session cookie between requests
+    for client in clients:
+        with client.session_transaction() as session:
+            session.pop('_flashes', None)
+
+
+def run_scenario(scenario, clients, counter, iterations, warmup):
+    latencies, statements, errors = [], [], []
+    for i in range(warmup + iterations):
+        counter.count = 0
+        started = time.perf_counter()
+        response = scenario.send(clients, i)
+        elapsed = time.perf_counter() - started
+        problem = _problem(scenario, response)
+        if problem and problem not in errors:
+            errors.append(problem)
+        _clear_flashes(clients)
+        if i >= warmup:
+            latencies.append(elapsed)
+            statements.append(counter.count)
+
+    latencies.sort()
+    statements.sort()
+    return RouteResult(
+        scenario.name, scenario.endpoint, scenario.method,
+        round(1000 * percentile(latencies, 0.50), 3),
+        round(1000 * percentile(latencies, 0.95), 3),
+        percentile(statements, 0.50),
+        errors,
+    )
+
+
+def _prepare(username, spare):
+    """Ids the scenarios need, plus `spare` devices and diagnostics the delete scenarios use up."""
+    user_id = db.session.execute(select(User.id).where(User.username == username)).scalar_one()
+    device_id = db.session.execute(
+        select(Device.id).where(Device.user_id == user_id).order_by(Device.id).limit(1)
+    ).scalar_one()
+    diagnostic_id = db.session.execute(
+        select(DeviceDiagnostics.id).where(DeviceDiagnostics.device_id == device_id)
+        .order_by(DeviceDiagnostics.id).limit(1)
+    ).scalar_one()
+
+    db.session.execute(insert(Device), [
+        {'name': f'spare-{n}', 'device_type': 'sensor', 'location': 'Bench 3', 'status': 'offline', 'user_id': user_id}
+        for n in range(spare)
+    ])
+    spare_device_ids = db.session.execute(
+        select(Device.id).where(Device.user_id == user_id, Device.name.like('spare-%')).order_by(Device.id)
+    ).scalars().all()
+    db.session.execute(insert(DeviceDiagnostics), [
+        {'device_id': device_id, 'cpu_usage': 1.0, 'memory_usage': 1.0, 'timestamp': datetime.utcnow()}
+        for _ in range(spare)
+    ])
+    spare_diagnostic_ids = db.session.execute(
+        select(DeviceDiagnostics.id).where(DeviceDiagnostics.device_id == device_id)
+        .order_by(DeviceDiagnostics.id.desc()).limit(spare)
+    ).scalars().all()
+    db.session.commit()
+    return {
+        'username': username, 'device_id': device_id, 'diagnostic_id': diagnostic_id,
+        'spare_device_ids': spare_device_ids, 'spare_diagnostic_ids': spare_diagnostic_ids,
+    }
+
+
+def run_scale(scale, iterations=30, warmup=3, page_cache=False, only=(), on_result=None):
+    """
+    Seed a scratch SQLite database at `scale`, then time every scenario with
+    the Flask test client. Returns (seed_result, [RouteResult], uncovered).
+    """
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = dict(BENCH_CONFIG, SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        if page_cache:
+            config.pop('PAGE_CACHE_TTL')
+        app = create_app(config)
+
+        with app.app_context():
+            db.create_all()
+            seeded = seed(**SCALES[scale], prefix='bench')
+            ctx = _prepare(seed_usernames('bench', 1)[0], warmup + iterations)
+            counter = StatementCounter(db.engine)
+
+            clients = Clients(app.test_client(), app.test_client())
+            clients.user.post('/auth/login', data={'username': ctx['username'], 'password': SEED_PASSWORD})
+
+            scenarios = route_scenarios(ctx)
+            uncovered = uncovered_routes(app, scenarios)
+            results = []
+            for scenario in scenarios:
+                if only and not any(part in scenario.name for part in only):
+                    continue
+                result = run_scenario(scenario, clients, counter, iterations, warmup)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+            purger = app.extensions.get('device_purger')
+            if purger is not None:
+                purger.join(10)
+            db.session.remove()
+            db.engine.dispose()
+        return seeded, results, uncovered
+
+
+# ----------------------
+# Baselines
+# ----------------------
+def results_document(runs, iterations, warmup):
+    """{scale: (seed_result, results)} as the JSON stored for --save-baseline."""
+    return {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'iterations': iterations,
+        'warmup': warmup,
+        'scales': {
+            scale: {
+                'rows': seeded._asdict() | {'seconds': round(seeded.seconds, 2)},
+                'routes': {
+                    r.name: {'endpoint': r.endpoint, 'method': r.method, 'p50_ms': r.p50_ms,
+                             'p95_ms': r.p95_ms, 'queries': r.queries}
+                    for r in results
+                },
+            }
+            for scale, (seeded, results) in runs.items()
+        },
+    }
+
+
+def query_counts_document(runs, previous=None):
+    """
+    SQL statements per request of each route, as stored for --save-queries.
+    Unlike latencies they do not depend on the machine, so the file is
+    committed; scales and routes not run this time keep their stored counts.
+    """
+    scales = dict((previous or {}).get('scales', {}))
+    for scale, (_, results) in runs.items():
+        scales[scale] = scales.get(scale, {}) | {r.name: r.queries for r in results}
+    return {'scales': scales}
+
+
+def read_baseline(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def write_baseline(path, document):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(document, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def compare_queries(scale, results, counts):
+    """Routes of one scale running more SQL statements per request than the stored counts."""
+    previous = counts.get('scales', {}).get(scale, {})
+    return [
+        Regression(scale, result.name, 'queries', previous[result.name], result.queries)
+        for result in results
+        if result.name in previous and result.queries > previous[result.name]
+    ]
+
+
+def compare_latency(scale, results, baseline, threshold=0.25, min_ms=1.0):
+    """
+    Latency regressions of one scale against a baseline saved on the same
+    machine: p50 or p95 more than `threshold` (a fraction) slower and at
+    least min_ms slower. Routes missing from the baseline are skipped.
+    """
+    previous = baseline.get('scales', {}).get(scale, {}).get('routes', {})
+    regressions = []
+    for result in results:
+        before = previous.get(result.name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            old, new = before[metric], getattr(result, metric)
+            if new > old * (1 + threshold) and new - old >= min_ms:
+                regressions.append(Regression(scale, result.name, metric, old, new))
+    return regressions
@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import time
+from flask import current_app, request
+from markupsafe import Markup
+from app.conditional import data_version
+from app.metrics import registry
+from app.ownership import TTLCache
+from app.signals import user_data_changed
+
+registry.describe('page_cache_requests_total', 'counter',
+                  'Cached page fragments by scope and result (local_hit / shared_hit / miss).')
+registry.describe('page_cache_errors_total', 'counter', 'Shared page cache backend errors (the page is rendered instead).')
+
+
+# ----------------------
+# Shared Backends
+# ----------------------
+class MemoryBackend:
+    """
+    In-process stand-in for a shared cache server (tests, single-worker runs).
+    Same interface as RedisBackend: bytes values with a TTL in seconds.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if len(self._data) >= self.maxsize and key not in self._data:
+                self._data.pop(next(iter(self._data)))  # Oldest insert first
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisBackend:
+    """Cache shared by every worker process. Needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+def make_backend(spec):
+    """PAGE_CACHE_BACKEND: '' (no shared tier), 'memory', or a redis:// URL."""
+    if not spec:
+        return None
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(spec)
+    raise ValueError(f"Unknown PAGE_CACHE_BACKEND {spec!r}")
+
+
+# ----------------------
+# Two-tier Fragment Cache
+# ----------------------
+def normalized_args(args):
+    """Query args as a stable string: sorted, repeated keys kept, empty values dropped."""
+    return '&'.join(sorted(f"{key}={value}" for key, value in args.items(multi=True) if value != ''))
+
+
+class PageCache:
+    """
+    Rendered fragments keyed by (scope, user, data version, query args). Entries
+    live in a per-process LRU with a TTL and, when configured, in a shared backend.
+    A write bumps the user's data version, so every process and the shared
+    backend stop serving that user's old entries at once; the local LRU also
+    drops them right away to free the space.
+    """
+
+    def __init__(self, maxsize=512, ttl=30.0, shared=None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+
+    def fetch(self, scope, user_id, args, render):
+        """The cached fragment, or render() stored for next time. Returns Markup."""
+        user_id = int(user_id)
+        version = data_version(user_id)
+        if version is None:
+            return Markup(render())
+
+        digest = hashlib.sha1(normalized_args(args).encode()).hexdigest()
+        local_key = (user_id, scope, version[0], digest)
+        shared_key = f"page:{scope}:{user_id}:{version[0]}:{digest}"
+
+        value = self.local.get(local_key)
+        result = 'local_hit'
+        if value is None and self.shared is not None:
+            value = self._shared_get(shared_key)
+            result = 'shared_hit'
+            if value is not None:
+                self.local.set(local_key, value)
+        if value is None:
+            value = str(render())
+            result = 'miss'
+            self.local.set(local_key, value)
+            if self.shared is not None:
+                self._shared_set(shared_key, value)
+
+        registry.inc('page_cache_requests_total', (('scope', scope), ('result', result)))
+        return Markup(value)
+
+    def discard_users(self, user_ids):
+        user_ids = {int(user_id) for user_id in user_ids}
+        return self.local.pop_matching(lambda key: key[0] in user_ids)
+
+    def clear(self):
+        self.local.clear()
+
+    def _shared_get(self, key):
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            registry.inc('page_cache_errors_total')
+            current_app.logger.warning("Page cache backend read failed: %s", str(e))
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def _shared_set(self, key, value):
+        try:
+            self.shared.set(key, value.encode('utf-8'), self.ttl)
+        except Exception as e:
+            registry.inc('page_cache_errors_total')
+            current_app.logger.warning("Page cache backend write failed: %s", str(e))
+
+
+# ----------------------
+# App Wiring
+# ----------------------
+def page_cache():
+    return current_app.extensions['page_cache']
+
+
+def cached_fragment(scope, user_id, render, args=None):
+    """Fragment through the app's page cache, or rendered directly when PAGE_CACHE_TTL is 0."""
+    cache = current_app.extensions.get('page_cache')
+    if cache is None:
+        return Markup(render())
+    return cache.fetch(scope, user_id, request.args if args is None else args, render)
+
+
+def init_page_cache(app):
+    if app.config['PAGE_CACHE_TTL'] <= 0:
+        return
+    cache = PageCache(
+        maxsize=app.config['PAGE_CACHE_SIZE'],
+        ttl=app.config['PAGE_CACHE_TTL'],
+        shared=make_backend(app.config['PAGE_CACHE_BACKEND']),
+    )
+    app.extensions['page_cache'] = cache
+
+    def on_user_data_changed(sender, user_ids, **kwargs):
+        # Sent after the commit: stale entries still expire with the new data version
+        try:
+            cache.discard_users(user_ids)
+        except Exception as e:
+            app.logger.warning("Page cache discard failed: %s", str(e))
+
+    user_data_changed.connect(on_user_data_changed, sender=app, weak=False)
@@ -0,0 +1,610 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+# -------------------------------
+#  Database Setup
+# -------------------------------
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create all tables on a new database and stamp it at the migration head."""
+    from flask_migrate import stamp
+    from sqlalchemy import inspect
+    from app import db
+
+    if 'alembic_version' in inspect(db.engine).get_table_names():
+        click.echo("Database is already under migrations; run 'flask db upgrade' instead.")
+        return
+
+    db.create_all()
+    stamp(revision='head')
+    click.echo("Database created and stamped at the migration head.")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """(Re)create the device search index and its triggers, then re-index every device."""
+    from app import db
+    from app.search import install_search_index
+
+    with db.engine.begin() as connection:
+        if not install_search_index(connection, rebuild=True):
+            raise click.ClickException("The device search index needs SQLite; other databases use ILIKE.")
+    click.echo("Device search index rebuilt.")
+
+
+@click.command('seed')
+@click.option('--users', default=10, show_default=True, help="Users to create.")
+@click.option('--devices', default=50, show_default=True, help="Devices per user.")
+@click.option('--diagnostics', default=1000, show_default=True, help="Samples per device.")
+@click.option('--interval', default=60, show_default=True, help="Seconds between a device's samples.")
+@click.option('--seed', 'random_seed', default=42, show_default=True, help="Random seed (same seed, same data).")
+@click.option('--end', type=click.DateTime(), default=None,
+              help="Time of the newest sample (UTC, default: now). Fix it to reproduce a dataset exactly.")
+@click.option('--prefix', default='seed', show_default=True, help="Usernames are PREFIX_0001, PREFIX_0002, ...")
+@with_appcontext
+def seed_command(users, devices, diagnostics, interval, random_seed, end, prefix):
+    """Bulk-insert synthetic users, devices and diagnostics for development and benchmarks."""
+    from app.seed import SEED_PASSWORD, seed, seed_usernames
+
+    try:
+        result = seed(users, devices, diagnostics, random_seed=random_seed, end=end, interval=interval, prefix=prefix)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    rows = result.users + result.devices + result.diagnostics
+    click.echo(f"Seeded {result.users} users, {result.devices} devices and {result.diagnostics} diagnostics "
+               f"in {result.seconds:.1f}s ({rows / max(result.seconds, 1e-9):,.0f} rows/s).")
+    if result.users:
+        click.echo(f"Log in as {seed_usernames(prefix, 1)[0]} with password {SEED_PASSWORD}")
+
+
+# -------------------------------
+#  Rollup Commands
+# -------------------------------
+rollups_cli = AppGroup('rollups', help="Maintain diagnostics rollup tables.")
+
+
+@rollups_cli.command('backfill')
+@click.option('--device-id', type=int, default=None, help="Only rebuild this device's rollups.")
+def backfill_rollups(device_id):
+    """Rebuild minute/hour/day rollups from raw diagnostics (purged ranges keep their rollups)."""
+    from app import rollups
+
+    written = rollups.backfill(device_id=device_id)
+    click.echo(f"Rollups rebuilt: {written} buckets written.")
+
+
+# -------------------------------
+#  Retention Commands
+# -------------------------------
+retention_cli = AppGroup('retention', help="Diagnostics retention policy.")
+
+
+@retention_cli.command('purge')
+@click.option('--device-id', type=int, default=None, help="Only purge this device.")
+@click.option('--days', type=int, default=None, help="Override DIAGNOSTICS_RETENTION_DAYS for this run.")
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction (RETENTION_BATCH_SIZE).")
+@click.option('--pause', type=float, default=None, help="Seconds between batches (RETENTION_BATCH_PAUSE).")
+@click.option('--dry-run', is_flag=True, help="Only count the rows that would be deleted.")
+@click.option('--vacuum', is_flag=True, help="Afterwards, return free pages to the filesystem (incremental_vacuum).")
+def purge_command(device_id, days, batch_size, pause, dry_run, vacuum):
+    """Delete raw diagnostics older than each device's retention, in short batches."""
+    from app import retention
+
+    config = current_app.config
+    default_days = config['DIAGNOSTICS_RETENTION_DAYS'] if days is None else days
+    batch_size = batch_size or config['RETENTION_BATCH_SIZE']
+    pause = config['RETENTION_BATCH_PAUSE'] if pause is None else pause
+
+    plan = retention.purge_plan(default_days, device_id=device_id)
+    if not plan:
+        click.echo("Nothing to purge: no device has a retention period (DIAGNOSTICS_RETENTION_DAYS=0).")
+        return
+
+    last_report = [0.0]
+
+    def report(device, rows, elapsed):
+        # Progress at most once a second
+        if time.monotonic() - last_report[0] >= 1.0:
+            last_report[0] = time.monotonic()
+            click.echo(f"  device {device}: {rows} rows deleted ({rows / elapsed:,.0f} rows/s)")
+
+    total_rows, started = 0, time.perf_counter()
+    for device, cutoff in plan:
+        result = retention.purge_device(device, cutoff, batch_size=batch_size, pause=pause,
+                                        dry_run=dry_run, on_batch=None if dry_run else report)
+        total_rows += result.rows
+        verb = "would delete" if dry_run else "deleted"
+        click.echo(f"device {device}: {verb} {result.rows} rows older than {cutoff:%Y-%m-%d %H:%M}"
+                   + ("" if dry_run else f" in {result.batches} batches"))
+
+    elapsed = time.perf_counter() - started
+    if dry_run:
+        click.echo(f"Dry run: {total_rows} rows would be deleted.")
+        return
+    click.echo(f"Purged {total_rows} rows in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s).")
+
+    if vacuum:
+        released = retention.incremental_vacuum(pause=pause)
+        if released is None:
+            click.echo("incremental_vacuum skipped: the database does not use auto_vacuum=INCREMENTAL. "
+                       "Convert it once (offline) with: PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+        else:
+            click.echo(f"incremental_vacuum released {released} pages.")
+
+
+@retention_cli.command('purge-deleted')
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction (DEVICE_PURGE_BATCH_SIZE).")
+def purge_deleted_command(batch_size):
+    """Finish removing deleted devices and their diagnostics (what the background purge does)."""
+    from app.deletion import purge_pending
+
+    config = current_app.config
+    started = time.perf_counter()
+
+    def report(device, rows):
+        click.echo(f"device {device}: {'deleted ' + str(rows) + ' rows' if rows else 'removed'}")
+
+    total = purge_pending(batch_size or config['DEVICE_PURGE_BATCH_SIZE'], config['DEVICE_PURGE_BATCH_PAUSE'],
+                          on_batch=report)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Purged {total} rows of deleted devices in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s).")
+
+
+@retention_cli.command('set')
+@click.argument('device_id', type=int)
+@click.argument('days')
+def set_retention_command(device_id, days):
+    """Set a device's retention in days (0 = keep forever, 'default' = use DIAGNOSTICS_RETENTION_DAYS)."""
+    from app.models import Device, db
+
+    device = db.session.get(Device, device_id)
+    if device is None:
+        raise click.ClickException(f"Device {device_id} not found.")
+    if days == 'default':
+        device.retention_days = None
+    elif days.isdigit():
+        device.retention_days = int(days)
+    else:
+        raise click.BadParameter("DAYS must be a non-negative integer or 'default'.")
+    db.session.commit()
+    click.echo(f"Device {device_id} retention: {days}.")
+
+
+# -------------------------------
+#  Device Commands
+# -------------------------------
+devices_cli = AppGroup('devices', help="Device management.")
+
+
+@devices_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help="Owner of the imported devices.")
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help="File format (default: from the extension, else csv).")
+@click.option('--batch-size', type=int, default=None, help="Rows per INSERT (DEVICE_IMPORT_BATCH_SIZE).")
+@click.option('--dry-run', is_flag=True, help="Validate only; nothing is inserted.")
+@click.option('--show-errors', default=20, show_default=True, help="Rejected rows to print.")
+def import_devices_command(path, username, fmt, batch_size, dry_run, show_errors):
+    """Bulk import devices from a CSV (with a header row) or NDJSON file."""
+    from app.models import User
+    from app.routes.device import import_devices, import_format, iter_device_rows
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"User {username!r} not found.")
+
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        try:
+            inserted, rejected, errors = import_devices(
+                user.id, iter_device_rows(f, import_format(None, path, fmt)),
+                batch_size or current_app.config['DEVICE_IMPORT_BATCH_SIZE'], dry_run=dry_run,
+                max_errors=show_errors,
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+
+    for error in errors:
+        messages = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in error['errors'].items())
+        click.echo(f"line {error['line']}: {messages}")
+    if rejected > len(errors):
+        click.echo(f"... and {rejected - len(errors)} more rejected rows")
+    rows = inserted + rejected
+    click.echo(f"{'Validated' if dry_run else 'Imported'} {inserted} devices, rejected {rejected} rows "
+               f"in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s).")
+
+
+# -------------------------------
+#  Archive Commands
+# -------------------------------
+archive_cli = AppGroup('archive', help="Columnar cold archive of closed months.")
+
+
+@archive_cli.command('run')
+@click.option('--device-id', type=int, default=None, help="Only archive this device.")
+def archive_run_command(device_id):
+    """Write every closed month with raw samples to DIAGNOSTICS_ARCHIVE_DIR."""
+    from datetime import datetime
+    from app import archive
+    from app.models import Device, db
+
+    if not archive.archive_dir():
+        raise click.ClickException("DIAGNOSTICS_ARCHIVE_DIR is not set.")
+
+    before = archive.month_start(datetime.utcnow())
+    query = db.session.query(Device.id).filter(Device.deleted_at.is_(None)).order_by(Device.id)
+    if device_id is not None:
+        query = query.filter(Device.id == device_id)
+
+    samples = size = 0
+    started = time.perf_counter()
+    for (device,) in query:
+        for month, count, nbytes in archive.archive_device(device, before):
+            samples += count
+            size += nbytes
+            click.echo(f"device {device} {month:%Y-%m}: {count} samples, {nbytes / 1024:.1f} KiB")
+        db.session.rollback()  # Release the read snapshot between devices
+
+    click.echo(f"Archived {samples} samples ({size / 1024 / 1024:.1f} MiB) in {time.perf_counter() - started:.1f}s.")
+
+
+@archive_cli.command('list')
+@click.option('--device-id', type=int, default=None, help="Only list this device.")
+def archive_list_command(device_id):
+    """Show archived partitions and each device's archive horizon."""
+    import os
+    from app import archive
+
+    root = archive.archive_dir()
+    if not root or not os.path.isdir(root):
+        click.echo("No archive.")
+        return
+
+    devices = [device_id] if device_id is not None else sorted(int(d) for d in os.listdir(root) if d.isdigit())
+    for device in devices:
+        for month, path in archive.partitions(device, root):
+            partition = archive.Partition(path)
+            click.echo(f"device {device} {month:%Y-%m}: {partition.count} samples, "
+                       f"{os.path.getsize(path) / 1024:.1f} KiB")
+        click.echo(f"device {device} horizon: {archive.horizon(device, root)}")
+
+
+# -------------------------------
+#  Query Plan Regression Check
+# -------------------------------
+@click.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help="Print the full plan of every query.")
+@with_appcontext
+def check_query_plans_command(verbose):
+    """EXPLAIN every route query and exit non-zero if one full-scans a table or a listing sorts."""
+    from app.queryplans import check_query_plans
+
+    failures = 0
+    for name, (plan, problems) in check_query_plans().items():
+        status = "FAIL" if problems else "ok"
+        failures += bool(problems)
+        click.echo(f"[{status:>4}] {name}")
+        for line in (plan if verbose else problems):
+            click.echo(f"         {line}")
+
+    if failures:
+        raise click.ClickException(
+            f"{failures} quer{'y' if failures == 1 else 'ies'} fall back to a full table scan or a sort."
+        )
+    click.echo("All route queries use indexes.")
+
+
+# -------------------------------
+#  Benchmarks
+# -------------------------------
+bench_cli = AppGroup('bench', help="Micro-benchmarks for tuning configuration.")
+
+DEFAULT_HASH_METHODS = (
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+)
+
+
+@bench_cli.command('login')
+@click.option('--method', 'methods', multiple=True,
+              help="Hash method to measure (repeatable). Defaults to the configured one plus common settings.")
+@click.option('--seconds', default=2.0, show_default=True, help="Measurement time per method.")
+def bench_login(methods, seconds):
+    """Password verifications (≈ logins) per second on one core for each hash setting."""
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    configured = current_app.config['PASSWORD_HASH_METHOD']
+    methods = methods or (configured,) + tuple(m for m in DEFAULT_HASH_METHODS if m != configured)
+    password = 'Benchmark#2024'
+
+    click.echo(f"{'method':<28} {'ms/login':>9} {'logins/s/core':>14}")
+    for method in methods:
+        stored = generate_password_hash(password, method=method)
+        count, started = 0, time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            check_password_hash(stored, password)
+            count += 1
+        elapsed = time.perf_counter() - started
+        marker = '  (configured)' if method == configured else ''
+        click.echo(f"{method:<28} {1000 * elapsed / count:>9.2f} {count / elapsed:>14.1f}{marker}")
+
+
+@bench_cli.command('sqlite-concurrency')
+@click.option('--seconds', default=3.0, show_default=True, help="Run time per journal mode.")
+@click.option('--readers', default=4, show_default=True, help="Concurrent reader threads.")
+@click.option('--rows-per-txn', default=100000, show_default=True, help="Rows per writer transaction.")
+def bench_sqlite_concurrency(seconds, readers, rows_per_txn):
+    """Reader latency while a writer commits large transactions, rollback journal vs WAL."""
+    import os
+    import tempfile
+    import threading
+    from sqlalchemy import create_engine, text
+    from app.engine_profile import install_sqlite_profile
+
+    click.echo(f"{'journal':<8} {'reads':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'writes':>7}")
+    for journal_mode in ('DELETE', 'WAL'):
+        with tempfile.TemporaryDirectory() as tmp:
+            # A small page cache makes the writer spill mid-transaction, as large ingest batches do
+            config = dict(current_app.config, SQLITE_JOURNAL_MODE=journal_mode, SQLITE_CACHE_SIZE=100)
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=readers + 1)
+            install_sqlite_profile(engine, config)
+            with engine.begin() as conn:
+                conn.execute(text("CREATE TABLE sample (id INTEGER PRIMARY KEY, device_id INTEGER, value REAL)"))
+
+            stop = threading.Event()
+            latencies, errors, writes = [], [0], [0]
+
+            def writer():
+                while not stop.is_set():
+                    with engine.begin() as conn:
+                        conn.execute(text("INSERT INTO sample (device_id, value) VALUES (:d, :v)"),
+                                     [{'d': i % 50, 'v': i * 0.5} for i in range(rows_per_txn)])
+                    writes[0] += 1
+
+            def reader():
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        with engine.connect() as conn:
+                            conn.execute(text("SELECT value FROM sample ORDER BY id DESC LIMIT 10")).all()
+                    except Exception:
+                        errors[0] += 1
+                    latencies.append(time.perf_counter() - started)
+
+            threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            engine.dispose()
+
+            latencies.sort()
+            def pct(p):
+                return 1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+            click.echo(f"{journal_mode:<8} {len(latencies):>7} {pct(0.5):>8.2f} {pct(0.99):>8.2f} "
+                       f"{1000 * (latencies[-1] if latencies else 0):>8.2f} {errors[0]:>7} {writes[0]:>7}")
+
+
+@bench_cli.command('serialize')
+@click.option('--rows', default=100000, show_default=True, help="Devices and diagnostics rows to serialize.")
+def bench_serialize(rows):
+    """JSON API fast path (column tuples + RowEncoder) vs marshmallow dump(many=True) of ORM objects."""
+    import json
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine, insert, select
+    from sqlalchemy.orm import Session
+    from app.models import Device, DeviceDiagnostics, User, db
+    from app.routes.api import DEVICE_COLUMNS, DIAGNOSTIC_COLUMNS
+    from app.schemas import DeviceDiagnosticsSchema, DeviceSchema
+    from app.search import bulk_insert_indexing
+    from app.serializers import DEVICE_ENCODER, DIAGNOSTIC_ENCODER
+
+    def timed(fn):
+        started = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine, tables=[User.__table__, Device.__table__, DeviceDiagnostics.__table__])
+        started = datetime(2026, 1, 1)
+        with Session(engine) as session:
+            session.execute(insert(User), [{'username': 'bench', 'password': '-'}])
+            with bulk_insert_indexing(session):
+                session.execute(insert(Device), [
+                    {'name': f'Device {i}', 'device_type': 'sensor', 'status': 'online',
+                     'location': f'Rack {i % 100}', 'user_id': 1}
+                    for i in range(rows)
+                ])
+            session.execute(insert(DeviceDiagnostics), [
+                {'device_id': i % rows + 1, 'cpu_usage': (i % 1000) / 10, 'memory_usage': (i % 777) / 7,
+                 'timestamp': started + timedelta(seconds=i)}
+                for i in range(rows)
+            ])
+            session.commit()
+
+        # Both paths emit the API fields only. That also keeps DeviceSchema's relationships out:
+        # dumping them would run one query per device for the lazy='dynamic' diagnostics
+        cases = (
+            ('devices', Device, DEVICE_COLUMNS, DEVICE_ENCODER,
+             DeviceSchema(many=True, only=DEVICE_ENCODER.names)),
+            ('diagnostics', DeviceDiagnostics, DIAGNOSTIC_COLUMNS, DIAGNOSTIC_ENCODER,
+             DeviceDiagnosticsSchema(many=True, only=DIAGNOSTIC_ENCODER.names)),
+        )
+        click.echo(f"{'resource':<12} {'path':<12} {'query s':>8} {'encode s':>9} {'total s':>8} {'rows/s':>10}")
+        for name, model, columns, encoder, schema in cases:
+            with Session(engine) as session:
+                objects, load_s = timed(lambda: session.query(model).order_by(model.id).all())
+                slow, slow_s = timed(lambda: json.dumps(schema.dump(objects), separators=(',', ':')))
+            with Session(engine) as session:
+                tuples, query_s = timed(lambda: session.execute(select(*columns).order_by(model.id)).all())
+                fast, fast_s = timed(lambda: encoder.encode_rows(tuples))
+
+            for path, first, second in (('marshmallow', load_s, slow_s), ('fast path', query_s, fast_s)):
+                total = first + second
+                click.echo(f"{name:<12} {path:<12} {first:>8.3f} {second:>9.3f} {total:>8.3f} {rows / total:>10,.0f}")
+            same = json.loads(fast) == json.loads(slow)
+            click.echo(f"{name:<12} speedup {(load_s + slow_s) / (query_s + fast_s):.1f}x, "
+                       f"output {'identical' if same else 'DIFFERS'}")
+        engine.dispose()
+
+
+@bench_cli.command('routes')
+@click.option('--scale', 'scales', multiple=True, type=click.Choice(['small', 'medium', 'large']),
+              help="Data scales to run (repeatable; default: small and medium).")
+@click.option('--iterations', default=30, show_default=True, help="Timed requests per scenario.")
+@click.option('--warmup', default=3, show_default=True, help="Untimed requests per scenario first.")
+@click.option('--route', 'only', multiple=True, help="Only scenarios whose name contains this (repeatable).")
+@click.option('--page-cache', is_flag=True, help="Keep the rendered-page cache on (off: every request does its work).")
+@click.option('--queries', 'queries_path', type=click.Path(dir_okay=False), default=None,
+              help="Committed SQL statement counts (default: benchmarks/queries.json).")
+@click.option('--save-queries', is_flag=True, help="Store this run's statement counts instead of comparing them.")
+@click.option('--baseline', 'baseline_path', type=click.Path(dir_okay=False), default=None,
+              help="Local latency baseline (default: instance/bench_routes_baseline.json).")
+@click.option('--save-baseline', is_flag=True, help="Store this run as the local latency baseline.")
+@click.option('--compare-latency', 'latency', is_flag=True, help="Also fail on p50/p95 regressions against the local baseline.")
+@click.option('--threshold', default=0.25, show_default=True, help="Allowed p50/p95 slowdown (0.25 = 25%).")
+@click.option('--min-ms', default=1.0, show_default=True, help="Ignore latency changes smaller than this.")
+def bench_routes(scales, iterations, warmup, only, page_cache, queries_path, save_queries, baseline_path,
+                 save_baseline, latency, threshold, min_ms):
+    """
+    p50/p95 latency and SQL statements per request for every route, on seeded
+    scratch databases. Fails on a route running more statements than the
+    committed counts, answering with an unexpected status, or having no
+    scenario. Latencies depend on the machine, so they are only compared
+    (with --compare-latency) against a baseline saved locally.
+    """
+    import os
+    from app.benchmark import (
+        DEFAULT_SCALES, SCALES, compare_latency, compare_queries,
+        query_counts_document, read_baseline, results_document, run_scale, write_baseline
+    )
+
+    queries_path = queries_path or os.path.join(os.path.dirname(current_app.root_path), 'benchmarks', 'queries.json')
+    counts = read_baseline(queries_path) if os.path.exists(queries_path) else {}
+    baseline_path = baseline_path or os.path.join(current_app.instance_path, 'bench_routes_baseline.json')
+    baseline = None
+    if latency:
+        if not os.path.exists(baseline_path):
+            raise click.ClickException(f"No baseline at {baseline_path}; run with --save-baseline to store one.")
+        baseline = read_baseline(baseline_path)
+
+    runs, regressions, failures = {}, [], []
+    for scale in scales or DEFAULT_SCALES:
+        shape = SCALES[scale]
+        click.echo(f"\n{scale}: {shape['users']} users x {shape['devices']} devices x "
+                   f"{shape['diagnostics']} diagnostics")
+        previous = (baseline or {}).get('scales', {}).get(scale, {}).get('routes', {})
+        click.echo(f"{'scenario':<30} {'p50 ms':>8} {'p95 ms':>8} {'queries':>7} {'p95 vs base':>11}")
+
+        def report(result):
+            before = previous.get(result.name)
+            change = f"{100 * (result.p95_ms / before['p95_ms'] - 1):+.0f}%" if before and before['p95_ms'] else ''
+            click.echo(f"{result.name:<30} {result.p50_ms:>8.2f} {result.p95_ms:>8.2f} {result.queries:>7} "
+                       f"{change:>11}" + (f"  FAILED: {'; '.join(result.errors)}" if result.errors else ''))
+
+        seeded, results, uncovered = run_scale(scale, iterations, warmup, page_cache, only, on_result=report)
+        click.echo(f"(seeded {seeded.diagnostics:,} diagnostics in {seeded.seconds:.1f}s)")
+        runs[scale] = (seeded, results)
+        failures += [f"{scale}: {r.name}: {'; '.join(r.errors)}" for r in results if r.errors]
+        if not only:
+            failures += [f"{scale}: no scenario for {method} {endpoint}" for endpoint, method in uncovered]
+        if not save_queries:
+            if scale not in counts.get('scales', {}):
+                click.echo(f"No statement counts for {scale} in {queries_path}; run with --save-queries to store them.")
+            regressions += compare_queries(scale, results, counts)
+        if baseline is not None:
+            regressions += compare_latency(scale, results, baseline, threshold, min_ms)
+
+    if save_queries:
+        write_baseline(queries_path, query_counts_document(runs, counts))
+        click.echo(f"\nStatement counts saved to {queries_path}")
+    if save_baseline:
+        write_baseline(baseline_path, results_document(runs, iterations, warmup))
+        click.echo(f"\nBaseline saved to {baseline_path}")
+
+    for regression in regressions:
+        click.echo(f"REGRESSION {regression.scale}: {regression.name}: {regression.metric} "
+                   f"{regression.baseline} -> {regression.current}")
+    if failures or regressions:
+        raise click.ClickException('\n'.join([f"{len(regressions)} regressions, {len(failures)} failures"] + failures))
+
+
+_STARTUP_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": 1000 * (imported - started),
+    "create_app_ms": 1000 * (created - imported),
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "alembic_loaded": "alembic" in sys.modules,
+}))
+'''
+
+
+@bench_cli.command('startup')
+@click.option('--runs', default=5, show_default=True, help="Fresh interpreter runs (median is reported).")
+@click.option('--max-ms', type=float, default=None, help="Fail if import + create_app() median exceeds this.")
+@click.option('--max-rss-mb', type=float, default=None, help="Fail if the median peak RSS exceeds this.")
+def bench_startup(runs, max_ms, max_rss_mb):
+    """Wall time and peak RSS of 'import app' + create_app() in a fresh worker process."""
+    import json
+    import os
+    import statistics
+    import subprocess
+    import sys
+
+    project_root = os.path.dirname(current_app.root_path)
+    # Measure what a server worker pays: outside the flask CLI, with the environment as configured
+    env = dict(os.environ, PYTHONPATH=project_root)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _STARTUP_PROBE], cwd=project_root, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    def median(key):
+        return statistics.median(s[key] for s in samples)
+
+    total_ms = median('import_ms') + median('create_app_ms')
+    click.echo(f"import:       {median('import_ms'):8.1f} ms")
+    click.echo(f"create_app(): {median('create_app_ms'):8.1f} ms")
+    click.echo(f"total:        {total_ms:8.1f} ms")
+    click.echo(f"peak RSS:     {median('rss_mb'):8.1f} MB")
+    click.echo(f"alembic loaded: {any(s['alembic_loaded'] for s in samples)} "
+               f"(DB_SCHEMA_CHECK={current_app.config['DB_SCHEMA_CHECK']})")
+
+    if max_ms is not None and total_ms > max_ms:
+        raise click.ClickException(f"Startup took {total_ms:.1f} ms (limit {max_ms} ms).")
+    if max_rss_mb is not None and median('rss_mb') > max_rss_mb:
+        raise click.ClickException(f"Peak RSS {median('rss_mb'):.1f} MB (limit {max_rss_mb} MB).")
+
+
+def register_cli(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(retention_cli)
+    app.cli.add_command(devices_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(bench_cli)
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, select, update
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+from app.metrics import registry
+from app.models import Device, User, db
+from app.signals import user_data_changed
+
+registry.describe('conditional_get_total', 'counter', 'Conditional GETs by endpoint and result (not_modified / full).')
+
+
+# ----------------------
+# Per-user Data Version
+# ----------------------
+_TOUCHED = '_data_versions_touched'
+_BUMPED = '_data_versions_bumped'
+
+
+def touch_data_versions(user_ids=(), device_ids=()):
+    """
+    Mark the users' data (or that of these devices' owners) as changed by the
+    current transaction. The version UPDATE runs inside that transaction just
+    before it commits, so a write costs no extra commit and a rolled back write
+    leaves the version alone. user_data_changed is sent after the commit.
+    """
+    touched_users, touched_devices = db.session.info.setdefault(_TOUCHED, (set(), set()))
+    touched_users.update(int(user_id) for user_id in user_ids)
+    touched_devices.update(int(device_id) for device_id in device_ids)
+
+
+def _bump_data_versions(session, user_ids, device_ids):
+    """One UPDATE of the users' versions; returns the ids of the users it changed."""
+    condition = User.id.in_(user_ids) if user_ids else None
+    if device_ids:
+        owners = User.id.in_(select(Device.user_id).where(Device.id.in_(device_ids)))
+        condition = owners if condition is None else condition | owners
+    if condition is None:
+        return set()
+
+    statement = (
+        update(User).where(condition)
+        .values(data_version=User.data_version + 1, data_modified_at=datetime.utcnow())
+    )
+    if db.engine.dialect.update_returning:
+        return set(session.execute(statement.returning(User.id)).scalars())
+    changed = set(session.execute(select(User.id).where(condition)).scalars())
+    session.execute(statement)
+    return changed
+
+
+@event.listens_for(db.session, 'before_commit')
+def _bump_touched(session):
+    touched = session.info.pop(_TOUCHED, None)
+    if touched:
+        session.info.setdefault(_BUMPED, set()).update(_bump_data_versions(session, *touched))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _announce_bumped(session):
+    changed = session.info.pop(_BUMPED, None)
+    if changed:
+        g.pop('_data_versions', None)
+        user_data_changed.send(current_app._get_current_object(), user_ids=changed)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_touched(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_TOUCHED, None)
+        session.info.pop(_BUMPED, None)
+
+
+def data_version(user_id):
+    """
+    (version, modified_at) of a user's devices and diagnostics; a primary-key
+    lookup, memoized for the request.
+    """
+    memo = g.setdefault('_data_versions', {})
+    user_id = int(user_id)
+    if user_id not in memo:
+        memo[user_id] = db.session.execute(
+            select(User.data_version, User.data_modified_at).where(User.id == user_id)
+        ).first()
+    return memo[user_id]
+
+
+def _template_stamp(app):
+    """Changes when templates are deployed, so cached pages are not reused across releases."""
+    stamp = app.extensions.get('conditional_template_stamp')
+    if stamp is None:
+        folder = os.path.join(app.root_path, app.template_folder)
+        stamp = str(max((os.stat(os.path.join(folder, name)).st_mtime_ns for name in os.listdir(folder)),
+                        default=0))
+        app.extensions['conditional_template_stamp'] = stamp
+    return stamp
+
+
+# ----------------------
+# Conditional GET
+# ----------------------
+def conditional_get(clock_dependent=False):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 from the user's data
+    version alone, before the view runs any query or template. The ETag covers
+    the version, endpoint, query arguments and deployed templates. Views whose
+    output also depends on the current time (relative windows, "last hour")
+    pass clock_dependent (a bool or a callable), which adds a time bucket of
+    CONDITIONAL_GET_CLOCK_SECONDS to the ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            # A pending flash message must be rendered, not hidden behind a 304
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            user_id = get_jwt_identity()
+            version = data_version(user_id)
+            if version is None:
+                return view(*args, **kwargs)
+            number, modified_at = version
+            modified_at = (modified_at or datetime(1970, 1, 1)).replace(microsecond=0)
+
+            parts = [str(user_id), str(number), request.endpoint, _template_stamp(app),
+                     *sorted(f"{key}={value}" for key, value in request.args.items(multi=True))]
+            if clock_dependent() if callable(clock_dependent) else clock_dependent:
+                seconds = app.config['CONDITIONAL_GET_CLOCK_SECONDS']
+                bucket = int(time.time() // seconds) * seconds
+                parts.append(str(bucket))
+                modified_at = max(modified_at, datetime.utcfromtimestamp(bucket))
+            etag = hashlib.sha1('\x1f'.join(parts).encode()).hexdigest()
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modified_at):
+                response = Response(status=304)
+                result = 'not_modified'
+            else:
+                response = make_response(view(*args, **kwargs))
+                result = 'full'
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = modified_at
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            registry.inc('conditional_get_total', (('endpoint', request.endpoint), ('result', result)))
+            return response
+        return wrapper
+    return decorator
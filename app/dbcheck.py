@@ -0,0 +1,51 @@
+import os
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+
+def migrations_dir(app):
+    return os.path.join(os.path.dirname(app.root_path), 'migrations')
+
+
+def migration_heads(app):
+    """Head revision(s) of the migration scripts on disk."""
+    from alembic.config import Config as AlembicConfig
+    from alembic.script import ScriptDirectory
+
+    config = AlembicConfig()
+    config.set_main_option('script_location', migrations_dir(app))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def current_revisions(db):
+    """Revision(s) recorded in the database; empty if it was never migrated or stamped."""
+    try:
+        with db.engine.connect() as conn:
+            return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+    except (OperationalError, ProgrammingError):
+        return set()
+
+
+def check_migrations_at_head(app, db):
+    """
+    Compare the database revision with the migration head instead of running
+    create_all() on every boot. DB_SCHEMA_CHECK: 'off' (production), 'warn' or 'strict'.
+    """
+    mode = app.config.get('DB_SCHEMA_CHECK', 'warn')
+    if mode == 'off':
+        return True
+
+    with app.app_context():
+        current = current_revisions(db)
+    heads = migration_heads(app)
+    if current == heads:
+        return True
+
+    message = (
+        f"Database schema is at {', '.join(sorted(current)) or 'no revision'} but migrations head is "
+        f"{', '.join(sorted(heads))}. Run 'flask db upgrade' (or 'flask init-db' for a new database)."
+    )
+    if mode == 'strict':
+        raise RuntimeError(message)
+    app.logger.warning(message)
+    return False
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select, update
+from app import archive, rollups
+from app.conditional import touch_data_versions
+from app.metrics import registry
+from app.models import Device, DeviceDiagnostics, db
+from app.ownership import invalidate_owner
+from app.signals import devices_changed, diagnostics_changed
+
+registry.describe('device_purge_rows_total', 'counter', 'Diagnostics rows deleted by the device purge.')
+
+DeletionProgress = namedtuple('DeletionProgress', 'device_id name deleted_at purged_rows estimated_total percent')
+
+
+# ----------------------
+# Marking
+# ----------------------
+def mark_deleted(device):
+    """Hide the device immediately; its rows are removed later by purge_next_batch()."""
+    device.deleted_at = datetime.utcnow()
+    touch_data_versions(user_ids={device.user_id})
+    db.session.commit()
+    invalidate_owner(device.user_id)
+    diagnostics_changed.send(current_app._get_current_object(), device_ids={device.id})
+    start_purger(current_app._get_current_object())
+
+
+def pending_deletions(user_id=None):
+    query = Device.query.filter(Device.deleted_at.isnot(None)).order_by(Device.deleted_at, Device.id)
+    if user_id is not None:
+        query = query.filter(Device.user_id == int(user_id))
+    return query
+
+
+def deletion_progress(user_id):
+    """Progress of the user's pending deletions: rows purged so far plus the day-rollup estimate of the rest."""
+    progress = []
+    for device in pending_deletions(user_id):
+        total = device.purged_rows + rollups.estimated_count([device.id])
+        percent = 100 if not total else min(99, int(100 * device.purged_rows / total))
+        progress.append(DeletionProgress(device.id, device.name, device.deleted_at, device.purged_rows, total, percent))
+    return progress
+
+
+# ----------------------
+# Batched Purge
+# ----------------------
+def purge_next_batch(batch_size):
+    """
+    Delete up to batch_size diagnostics rows of the oldest pending device, in one
+    short transaction. Once none are left, its rollups and the device row go too.
+    Returns (device_id, rows_deleted), or None when nothing is pending.
+    Safe to run from several processes at once: every step is idempotent.
+    """
+    pending = db.session.execute(
+        select(Device.id, Device.user_id)
+        .where(Device.deleted_at.isnot(None)).order_by(Device.deleted_at, Device.id).limit(1)
+    ).first()
+    if pending is None:
+        return None
+    device_id, user_id = pending
+
+    batch = select(DeviceDiagnostics.id).where(DeviceDiagnostics.device_id == device_id).limit(batch_size)
+    deleted = db.session.execute(
+        delete(DeviceDiagnostics).where(DeviceDiagnostics.id.in_(batch.scalar_subquery()))
+    ).rowcount
+    if deleted:
+        db.session.execute(
+            update(Device).where(Device.id == device_id).values(purged_rows=Device.purged_rows + deleted)
+        )
+    else:
+        rollups.delete_device_rollups(device_id)
+        db.session.execute(delete(Device).where(Device.id == device_id))
+    # Progress (or completion) shows on the owner's device list
+    touch_data_versions(user_ids={user_id})
+    db.session.commit()
+    registry.inc('device_purge_rows_total', value=deleted)
+    devices_changed.send(current_app._get_current_object(), user_ids={user_id})
+
+    if not deleted:
+        archive.delete_device_archive(device_id)
+    return device_id, deleted
+
+
+def purge_pending(batch_size, pause=0.0, on_batch=None):
+    """Run purge_next_batch() until nothing is pending. Returns the number of rows deleted."""
+    total = 0
+    while True:
+        result = purge_next_batch(batch_size)
+        if result is None:
+            return total
+        total += result[1]
+        if on_batch:
+            on_batch(*result)
+        if pause and result[1]:
+            time.sleep(pause)
+
+
+# ----------------------
+# Background Purger
+# ----------------------
+_purger_lock = threading.Lock()
+
+
+def _run_purger(app):
+    with app.app_context():
+        try:
+            purge_pending(app.config['DEVICE_PURGE_BATCH_SIZE'], app.config['DEVICE_PURGE_BATCH_PAUSE'])
+        except Exception as e:
+            app.logger.error("Background device purge failed: %s", str(e))
+        finally:
+            db.session.remove()
+            with _purger_lock:
+                if app.extensions.get('device_purger') is threading.current_thread():
+                    del app.extensions['device_purger']
+
+
+def start_purger(app):
+    """Start this process's purge thread unless it is already running."""
+    with _purger_lock:
+        thread = app.extensions.get('device_purger')
+        if thread is not None and thread.is_alive():
+            return thread
+        thread = threading.Thread(target=_run_purger, args=(app,), name='device-purger', daemon=True)
+        app.extensions['device_purger'] = thread
+        thread.start()
+        return thread
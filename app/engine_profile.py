@@ -0,0 +1,124 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app.metrics import registry
+
+_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+registry.describe('sqlite_lock_wait_seconds', 'histogram',
+                  'Time to take the write lock (BEGIN IMMEDIATE) before the first write of each transaction.',
+                  (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+registry.describe('sqlite_busy_waits_total', 'counter',
+                  'Transactions whose write lock was busy and had to be retried by the busy handler.')
+registry.describe('sqlite_busy_timeouts_total', 'counter',
+                  'Statements that failed with "database is locked" after busy_timeout expired.')
+
+
+def _is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def configure_engine_options(app):
+    """
+    Fill SQLALCHEMY_ENGINE_OPTIONS with pool sizing from config. Must run before
+    db.init_app(). In-memory SQLite uses a single shared connection, so no pool options.
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if not _is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', True)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+_AUTO_VACUUM_MODES = {'NONE': 0, 'FULL': 1, 'INCREMENTAL': 2}
+
+
+def sqlite_pragmas(config, auto_vacuum=None):
+    """
+    PRAGMA statements for the configured SQLite profile, in the order they must run.
+    `auto_vacuum` is the database's current mode: setting the mode it already has
+    still waits for the write lock, so it is only set when it differs.
+    """
+    mode = str(config['SQLITE_AUTO_VACUUM']).upper()
+    pragmas = [f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}"]
+    if auto_vacuum is None or _AUTO_VACUUM_MODES.get(mode, int(mode) if mode.isdigit() else mode) != auto_vacuum:
+        # Only changes a database that has no tables yet; existing files need a one-time VACUUM
+        pragmas.append(f"PRAGMA auto_vacuum = {mode}")
+    return pragmas + [
+        f"PRAGMA foreign_keys = {config['SQLITE_FOREIGN_KEYS']}",
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA temp_store = {config['SQLITE_TEMP_STORE']}",
+    ]
+
+
+def install_sqlite_profile(engine, config):
+    """Apply the PRAGMA profile on every new connection and record lock-contention metrics."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    busy_threshold = config['SQLITE_BUSY_WAIT_THRESHOLD_MS'] / 1000.0
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # A new pool connection must not queue behind a writer: reading the mode takes no lock
+            auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+            for pragma in sqlite_pragmas(config, auto_vacuum):
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    # pysqlite opens a deferred transaction before the first INSERT / UPDATE / DELETE,
+    # and that statement would both wait for the write lock and do its work. Taking
+    # the lock explicitly with BEGIN IMMEDIATE just before it times the wait alone
+    # (the busy handler sleeps inside it while another connection writes).
+    def begin_write(cursor, statement, context):
+        conn = context.root_connection
+        if conn.info.get('_sqlite_wrote') or not statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES):
+            return
+        conn.info['_sqlite_wrote'] = True
+        driver_connection = cursor.connection
+        if driver_connection.in_transaction or driver_connection.isolation_level is None:
+            return  # Already in a transaction (e.g. an explicit BEGIN IMMEDIATE), or autocommit
+
+        started = time.perf_counter()
+        cursor.execute('BEGIN IMMEDIATE')
+        waited = time.perf_counter() - started
+        registry.observe('sqlite_lock_wait_seconds', (), waited)
+        if waited >= busy_threshold:
+            registry.inc('sqlite_busy_waits_total')
+
+    # Dialect-level hooks run inside SQLAlchemy's error handling, so a lock timeout
+    # here is wrapped like any other and counted by count_busy_timeouts below
+    @event.listens_for(engine, 'do_execute')
+    def begin_write_execute(cursor, statement, parameters, context):
+        begin_write(cursor, statement, context)
+
+    @event.listens_for(engine, 'do_executemany')
+    def begin_write_executemany(cursor, statement, parameters, context):
+        begin_write(cursor, statement, context)
+
+    @event.listens_for(engine, 'do_execute_no_params')
+    def begin_write_no_params(cursor, statement, context):
+        begin_write(cursor, statement, context)
+
+    @event.listens_for(engine, 'handle_error')
+    def count_busy_timeouts(exception_context):
+        message = str(exception_context.original_exception).lower()
+        if 'database is locked' in message or 'database is busy' in message:
+            registry.inc('sqlite_busy_timeouts_total')
+
+    @event.listens_for(engine, 'commit')
+    def end_transaction_on_commit(conn):
+        conn.info.pop('_sqlite_wrote', None)
+
+    @event.listens_for(engine, 'rollback')
+    def end_transaction_on_rollback(conn):
+        conn.info.pop('_sqlite_wrote', None)
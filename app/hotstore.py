@@ -0,0 +1,223 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app.metrics import registry
+from app.models import DeviceDiagnostics, db
+from app.signals import diagnostics_added, diagnostics_changed
+
+_EPOCH = datetime(1970, 1, 1)
+
+registry.describe('hot_store_loads_total', 'counter', 'Device windows loaded from the database into the hot store.')
+registry.describe('hot_store_devices', 'gauge', 'Device windows held in the hot store.')
+
+# What the device listing renders for one device
+HotWindow = namedtuple('HotWindow', 'latest_at cpu memory cpu_points memory_points samples')
+
+
+def _epoch(timestamp):
+    return int((timestamp - _EPOCH).total_seconds())
+
+
+# ----------------------
+# Per-device Ring Buffer
+# ----------------------
+class DeviceWindow:
+    """
+    The newest `capacity` samples of one device: epoch seconds in an int64 array
+    and cpu/memory as float32, about 16 bytes per sample instead of an ORM object.
+    """
+    __slots__ = ('timestamps', 'cpu', 'memory', 'head', 'size', 'synced_at')
+
+    def __init__(self, capacity):
+        self.timestamps = array('q', bytes(8 * capacity))
+        self.cpu = array('f', bytes(4 * capacity))
+        self.memory = array('f', bytes(4 * capacity))
+        self.head = 0  # Next slot to write
+        self.size = 0
+        self.synced_at = time.monotonic()
+
+    def append(self, timestamp, cpu, memory):
+        """Add a sample. Samples older than the newest one held are ignored (late data stays in the DB)."""
+        if self.size and timestamp < self.timestamps[self.head - 1]:
+            return False
+        self.timestamps[self.head] = timestamp
+        self.cpu[self.head] = cpu
+        self.memory[self.head] = memory
+        self.head = (self.head + 1) % len(self.timestamps)
+        self.size = min(self.size + 1, len(self.timestamps))
+        return True
+
+    def samples(self, since=0):
+        """(timestamp, cpu, memory) tuples from oldest to newest, optionally only those at or after `since`."""
+        capacity = len(self.timestamps)
+        first = (self.head - self.size) % capacity
+        indexes = [(first + i) % capacity for i in range(self.size)]
+        return [
+            (self.timestamps[i], self.cpu[i], self.memory[i])
+            for i in indexes if self.timestamps[i] >= since
+        ]
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.timestamps, self.cpu, self.memory))
+
+
+# ----------------------
+# Store
+# ----------------------
+class HotStore:
+    """
+    Recent samples for up to `max_devices` devices, least recently viewed evicted
+    first, so memory is bounded by max_devices * capacity * 16 bytes. Windows are
+    loaded from the database the first time a device is viewed and then kept
+    current by the ingest signals. With refresh > 0 a window is reloaded once it
+    is that many seconds old, to pick up samples written by other worker processes.
+    """
+
+    def __init__(self, capacity=120, max_devices=10000, span=3600, refresh=30.0):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.span = span
+        self.refresh = refresh
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, rows):
+        """Append new samples to devices that are already loaded; others load on first view."""
+        with self._lock:
+            for row in rows:
+                window = self._windows.get(row['device_id'])
+                if window is not None and row.get('timestamp') is not None:
+                    window.append(_epoch(row['timestamp']), row['cpu_usage'], row['memory_usage'])
+
+    def discard(self, device_ids):
+        """Forget devices whose history was edited or deleted; they reload on next view."""
+        with self._lock:
+            for device_id in device_ids:
+                self._windows.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def load_select(self, device_ids, now):
+        """Newest `capacity` samples within the span for each device, in one query."""
+        ranked = select(
+            DeviceDiagnostics.device_id, DeviceDiagnostics.timestamp,
+            DeviceDiagnostics.cpu_usage, DeviceDiagnostics.memory_usage,
+            func.row_number().over(
+                partition_by=DeviceDiagnostics.device_id, order_by=DeviceDiagnostics.timestamp.desc()
+            ).label('position'),
+        ).where(
+            DeviceDiagnostics.device_id.in_(device_ids),
+            DeviceDiagnostics.timestamp >= now - timedelta(seconds=self.span),
+        ).subquery()
+        return (
+            select(ranked.c.device_id, ranked.c.timestamp, ranked.c.cpu_usage, ranked.c.memory_usage)
+            .where(ranked.c.position <= self.capacity)
+            .order_by(ranked.c.device_id, ranked.c.timestamp)
+        )
+
+    def _load(self, device_ids, now):
+        windows = {device_id: DeviceWindow(self.capacity) for device_id in device_ids}
+        for device_id, timestamp, cpu, memory in db.session.execute(self.load_select(device_ids, now)):
+            windows[device_id].append(_epoch(timestamp), cpu, memory)
+        registry.inc('hot_store_loads_total', value=len(device_ids))
+        return windows
+
+    def windows(self, device_ids, now=None):
+        """{device_id: HotWindow or None} for a page of devices; at most one query for those not loaded."""
+        now = now or datetime.utcnow()
+        expired = time.monotonic() - self.refresh if self.refresh > 0 else None
+
+        with self._lock:
+            missing = [
+                device_id for device_id in device_ids
+                if device_id not in self._windows
+                or (expired is not None and self._windows[device_id].synced_at < expired)
+            ]
+        loaded = self._load(missing, now) if missing else {}
+
+        since = _epoch(now) - self.span
+        views = {}
+        with self._lock:
+            self._windows.update(loaded)
+            for device_id in device_ids:
+                window = self._windows.get(device_id)
+                if window is None:
+                    views[device_id] = None
+                    continue
+                self._windows.move_to_end(device_id)
+                views[device_id] = _view(window.samples(since))
+            while len(self._windows) > self.max_devices:
+                self._windows.popitem(last=False)
+            registry.set_gauge('hot_store_devices', value=len(self._windows))
+        return views
+
+
+# ----------------------
+# Sparklines
+# ----------------------
+def sparkline_points(values, width=120, height=24):
+    """SVG polyline points for percentages (0-100, scaled up if a value exceeds 100)."""
+    if len(values) < 2:
+        return ''
+    top = max(100.0, max(values))
+    step = width / (len(values) - 1)
+    return ' '.join(
+        f"{i * step:.1f},{height - (value / top) * height:.1f}" for i, value in enumerate(values)
+    )
+
+
+def _view(samples):
+    if not samples:
+        return None
+    latest_at, cpu, memory = samples[-1]
+    return HotWindow(
+        latest_at=_EPOCH + timedelta(seconds=latest_at),
+        cpu=round(cpu, 1),
+        memory=round(memory, 1),
+        cpu_points=sparkline_points([s[1] for s in samples]),
+        memory_points=sparkline_points([s[2] for s in samples]),
+        samples=len(samples),
+    )
+
+
+# ----------------------
+# App Wiring
+# ----------------------
+def hot_store():
+    return current_app.extensions['hot_store']
+
+
+def init_hot_store(app):
+    store = HotStore(
+        capacity=app.config['HOT_WINDOW_SAMPLES'],
+        max_devices=app.config['HOT_WINDOW_MAX_DEVICES'],
+        span=app.config['HOT_WINDOW_SECONDS'],
+        refresh=app.config['HOT_WINDOW_REFRESH'],
+    )
+    app.extensions['hot_store'] = store
+
+    def on_added(sender, rows, **kwargs):
+        try:
+            store.add(rows)
+        except Exception as e:
+            # The samples are committed; the listing reloads them from the database
+            app.logger.warning("Hot store update failed: %s", str(e))
+            store.discard({row['device_id'] for row in rows})
+
+    def on_changed(sender, device_ids, **kwargs):
+        try:
+            store.discard(device_ids)
+        except Exception as e:
+            app.logger.warning("Hot store discard failed: %s", str(e))
+
+    diagnostics_added.connect(on_added, sender=app, weak=False)
+    diagnostics_changed.connect(on_changed, sender=app, weak=False)
@@ -0,0 +1,250 @@
+import json
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+from app.metrics import registry
+from app.models import Device, db
+from app.ownership import TTLCache
+from app.signals import diagnostics_added
+
+registry.describe('live_feed_subscribers', 'gauge', 'Open live diagnostics streams.')
+registry.describe('live_feed_messages_total', 'counter', 'Live feed messages by result (delivered / dropped).')
+registry.describe('live_feed_dropped_subscribers_total', 'counter', 'Live streams closed because the client fell behind.')
+registry.describe('live_feed_errors_total', 'counter', 'Live feed broker errors (the samples are still stored).')
+
+BROKER_CHANNEL = 'live:diagnostics'
+
+
+class TooManySubscribers(Exception):
+    """This process already serves LIVE_FEED_MAX_SUBSCRIBERS streams."""
+
+
+# ----------------------
+# Brokers (multi-worker fan-out)
+# ----------------------
+class MemoryBroker:
+    """
+    In-process stand-in for a pub/sub server (tests, single-worker runs).
+    Same interface as RedisBroker: publish() bytes, listen() with a callback.
+    """
+
+    def __init__(self):
+        self._callbacks = []
+
+    def publish(self, message):
+        for callback in list(self._callbacks):
+            callback(message)
+
+    def listen(self, callback):
+        self._callbacks.append(callback)
+
+
+class RedisBroker:
+    """Fan-out across worker processes over Redis pub/sub. Needs the optional `redis` package."""
+
+    def __init__(self, url, channel=BROKER_CHANNEL):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._channel = channel
+
+    def publish(self, message):
+        self._client.publish(self._channel, message)
+
+    def listen(self, callback):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._channel: lambda message: callback(message['data'])})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+def make_broker(spec):
+    """LIVE_FEED_BROKER: '' (this process only), 'memory', or a redis:// URL."""
+    if not spec:
+        return None
+    if spec == 'memory':
+        return MemoryBroker()
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(spec)
+    raise ValueError(f"Unknown LIVE_FEED_BROKER {spec!r}")
+
+
+# ----------------------
+# Per-user Fan-out
+# ----------------------
+class Subscription:
+    """One open stream: a bounded queue of encoded messages for one user."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LiveFeed:
+    """
+    New samples pushed to the streams of the devices' owners. Each stream has
+    a queue of at most queue_size messages; a stream that falls that far
+    behind is dropped rather than buffered (the browser reconnects and
+    reloads). Without a broker, samples only reach streams served by the
+    process that wrote them; with one, every process hears every message and
+    delivers it to its own streams.
+    """
+
+    def __init__(self, queue_size=100, max_subscribers=100, broker=None, owner_cache_ttl=300.0):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.broker = broker
+        self._subscribers = {}      # user_id -> {Subscription}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._listening_pid = None
+        # Devices never change owner, so device -> user lookups are cached
+        self._owners = TTLCache(maxsize=100000, ttl=owner_cache_ttl)
+
+    def subscribe(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers("Too many live streams.")
+            subscription = Subscription(user_id, self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+            registry.set_gauge('live_feed_subscribers', value=self._count)
+            # Only processes that serve streams listen to the broker; after a fork, listen again
+            if self.broker is not None and self._listening_pid != os.getpid():
+                self._listening_pid = os.getpid()
+                self.broker.listen(self._on_broker_message)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if not subscriptions or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+            self._count -= 1
+            registry.set_gauge('live_feed_subscribers', value=self._count)
+
+    def publish(self, rows):
+        """Route newly committed samples (diagnostics_added rows) to their owners' streams."""
+        if self.broker is None and not self._count:
+            return
+
+        by_user = {}
+        owners = self._owners_of({row['device_id'] for row in rows})
+        for row in rows:
+            user_id = owners.get(row['device_id'])
+            if user_id is None or (self.broker is None and user_id not in self._subscribers):
+                continue
+            timestamp = row.get('timestamp')
+            by_user.setdefault(user_id, []).append({
+                'device_id': row['device_id'],
+                'cpu_usage': row['cpu_usage'],
+                'memory_usage': row['memory_usage'],
+                'timestamp': timestamp.isoformat() if timestamp else None,
+            })
+
+        for user_id, events in by_user.items():
+            data = json.dumps(events)
+            if self.broker is None:
+                self._deliver(user_id, data)
+                continue
+            try:
+                self.broker.publish(f"{user_id} {data}".encode())
+            except Exception as e:
+                registry.inc('live_feed_errors_total')
+                current_app.logger.warning("Live feed broker publish failed: %s", str(e))
+
+    def stream(self, subscription, keepalive=15.0, max_seconds=300.0):
+        """
+        Server-Sent Events for one subscription. Comment lines keep idle
+        proxies open and reveal closed connections; after max_seconds the
+        stream ends and the browser reconnects, which re-checks the login.
+        """
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                data = subscription.get(min(keepalive, remaining))
+                if subscription.dropped:
+                    yield 'event: dropped\ndata: {}\n\n'
+                    return
+                if data is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: diagnostics\ndata: {data}\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def _owners_of(self, device_ids):
+        owners, missing = {}, []
+        for device_id in device_ids:
+            user_id = self._owners.get(device_id)
+            if user_id is None:
+                missing.append(device_id)
+            else:
+                owners[device_id] = user_id
+        if missing:
+            for device_id, user_id in db.session.execute(
+                select(Device.id, Device.user_id).where(Device.id.in_(missing))
+            ):
+                owners[device_id] = user_id
+                self._owners.set(device_id, user_id)
+        return owners
+
+    def _on_broker_message(self, message):
+        user_id, data = message.decode().split(' ', 1)
+        self._deliver(int(user_id), data)
+
+    def _deliver(self, user_id, data):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(data)
+                registry.inc('live_feed_messages_total', (('result', 'delivered'),))
+            except queue.Full:
+                # A slow client must not hold memory for everyone else: close its stream
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                registry.inc('live_feed_messages_total', (('result', 'dropped'),))
+                registry.inc('live_feed_dropped_subscribers_total')
+
+
+# ----------------------
+# App Wiring
+# ----------------------
+def live_feed():
+    return current_app.extensions['live_feed']
+
+
+def init_live_feed(app):
+    feed = LiveFeed(
+        queue_size=app.config['LIVE_FEED_QUEUE_SIZE'],
+        max_subscribers=app.config['LIVE_FEED_MAX_SUBSCRIBERS'],
+        broker=make_broker(app.config['LIVE_FEED_BROKER']),
+    )
+    app.extensions['live_feed'] = feed
+
+    def on_added(sender, rows, **kwargs):
+        try:
+            feed.publish(rows)
+        except Exception as e:
+            # The samples are committed; only the live view misses them
+            app.logger.warning("Live feed publish failed: %s", str(e))
+
+    diagnostics_added.connect(on_added, sender=app, weak=False)
@@ -0,0 +1,352 @@
+import atexit
+import glob
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+# Other workers' snapshots older than this many flush intervals are left out of /metrics
+STALE_FLUSH_INTERVALS = 3
+
+
+# ----------------------
+# Registry
+# ----------------------
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms kept in process memory. Updates are a dict
+    lookup under a lock. With a shared directory configured, each process
+    periodically writes a JSON snapshot there and /metrics sums all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}          # name -> (type, help, buckets)
+        self._counters = {}      # (name, labels) -> float
+        self._gauges = {}        # (name, labels) -> float
+        self._histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+
+    def describe(self, name, metric_type, help_text, buckets=None):
+        self._meta[name] = (metric_type, help_text, tuple(buckets) if buckets else None)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, labels=(), value=0):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def observe(self, name, labels, value):
+        buckets = self._meta[name][2]
+        key = (name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[n, list(l), v] for (n, l), v in self._counters.items()],
+                'gauges': [[n, list(l), v] for (n, l), v in self._gauges.items()],
+                'histograms': [[n, list(l), list(v)] for (n, l), v in self._histograms.items()],
+            }
+
+    # -- exposition ---------------------------------------------------------
+    def render(self, snapshots):
+        """Prometheus text format for the sum of several snapshots."""
+        counters, gauges, histograms = _sum_snapshots(snapshots)
+
+        lines = []
+        for kind, series in (('counter', counters), ('gauge', gauges), ('histogram', histograms)):
+            for name in sorted({n for n, _ in series}):
+                metric_type, help_text, buckets = self._meta.get(name, (kind, '', None))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name != name:
+                        continue
+                    if kind != 'histogram':
+                        lines.append(f"{name}{_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(buckets, value):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _sum_snapshots(snapshots):
+    """(counters, gauges, histograms) dicts keyed by (name, labels), summed over snapshots."""
+    counters, gauges, histograms = {}, {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snap['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, values in snap['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            current = histograms.get(key)
+            histograms[key] = values if current is None else [a + b for a, b in zip(current, values)]
+    return counters, gauges, histograms
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+registry = MetricsRegistry()
+registry.describe('http_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+registry.describe('http_request_duration_seconds', 'histogram', 'Request latency by endpoint.', LATENCY_BUCKETS)
+registry.describe('http_request_sql_statements', 'histogram', 'SQL statements executed per request.',
+                  QUERY_COUNT_BUCKETS)
+registry.describe('sql_statements_total', 'counter', 'SQL statements executed, by endpoint.')
+
+
+# ----------------------
+# Multi-process Aggregation
+# ----------------------
+# Snapshot files are named by host and pid, so workers of several hosts can share
+# one directory: metrics-<host>-<pid>.json, plus metrics-<host>-retired.json
+# holding the counters and histograms of that host's exited workers.
+_HOST = socket.gethostname().replace(os.sep, '_')
+RETIRED = 'retired'
+
+
+def _snapshot_path(metrics_dir, worker=None):
+    return os.path.join(metrics_dir, f"metrics-{_HOST}-{worker or os.getpid()}.json")
+
+
+def _parse_snapshot_name(path):
+    """(host, pid or RETIRED) of a snapshot file name; ValueError for other files."""
+    host, _, worker = os.path.basename(path)[len('metrics-'):-len('.json')].rpartition('-')
+    if not host:
+        raise ValueError(f"Not a metrics snapshot: {path}")
+    return host, worker if worker == RETIRED else int(worker)
+
+
+def _write_json(path, document):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f)
+    os.replace(tmp_path, path)
+
+
+def _write_snapshot(metrics_dir):
+    _write_json(_snapshot_path(metrics_dir), registry.snapshot())
+
+
+def _retire(metrics_dir, path):
+    """
+    Add an exited worker's counters and histograms to this host's retired
+    snapshot and delete its file, so totals at /metrics do not go backwards
+    when a worker is replaced. Its gauges described the worker and are dropped.
+    """
+    import fcntl
+
+    claimed = f"{path}.retiring"
+    try:
+        os.rename(path, claimed)  # Only one scraping worker gets to fold it
+    except OSError:
+        return
+    try:
+        with open(claimed) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        snapshot = None
+
+    if snapshot is not None:
+        retired_path = _snapshot_path(metrics_dir, RETIRED)
+        with open(f"{retired_path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(retired_path) as f:
+                    retired = json.load(f)
+            except (OSError, ValueError):
+                retired = {'counters': [], 'gauges': [], 'histograms': []}
+            counters, _, histograms = _sum_snapshots([retired, snapshot])
+            _write_json(retired_path, {
+                'counters': [[n, list(l), v] for (n, l), v in counters.items()],
+                'gauges': [],
+                'histograms': [[n, list(l), list(v)] for (n, l), v in histograms.items()],
+            })
+    os.remove(claimed)
+
+
+def _stop_flusher(state, metrics_dir):
+    state['stop'].set()
+    try:
+        os.remove(_snapshot_path(metrics_dir))
+    except OSError:
+        pass
+
+
+def _run_flusher(app, metrics_dir, interval, stop):
+    while True:
+        try:
+            _write_snapshot(metrics_dir)
+        except OSError as e:
+            app.logger.warning("Metrics snapshot failed: %s", str(e))
+        if stop.wait(interval):
+            return
+
+
+def _start_flusher(app):
+    """
+    Write this process's snapshot every METRICS_FLUSH_INTERVAL seconds, busy or
+    idle, so a snapshot's age tells whether its worker is still alive. Started
+    on the first request, so forked workers get their own thread.
+    """
+    metrics_dir = app.config.get('METRICS_DIR')
+    state = app.extensions['metrics']
+    if not metrics_dir or state['flusher_pid'] == os.getpid():
+        return
+    with state['lock']:
+        if state['flusher_pid'] == os.getpid():
+            return
+        state['flusher_pid'] = os.getpid()
+        threading.Thread(
+            target=_run_flusher, args=(app, metrics_dir, app.config['METRICS_FLUSH_INTERVAL'], state['stop']),
+            name='metrics-flusher', daemon=True,
+        ).start()
+        # A clean exit removes the snapshot at once instead of leaving it to go stale
+        atexit.register(_stop_flusher, state, metrics_dir)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(app):
+    """
+    Snapshots for every worker: this process live, the others from the shared
+    directory. Exited workers of this host are folded into its retired
+    snapshot (other hosts' pids cannot be checked from here), and snapshots
+    not rewritten for STALE_FLUSH_INTERVALS intervals (a hung worker, or a
+    host that went away) are left out, so their gauges do not linger.
+    """
+    snapshots = [registry.snapshot()]
+    metrics_dir = app.config.get('METRICS_DIR')
+    if metrics_dir:
+        own = _snapshot_path(metrics_dir)
+        stale_before = time.time() - STALE_FLUSH_INTERVALS * app.config['METRICS_FLUSH_INTERVAL']
+        paths = []
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                host, worker = _parse_snapshot_name(path)
+                if worker == RETIRED:
+                    continue  # Read below, with what this scrape folds into it
+                if host == _HOST and not _pid_alive(worker):
+                    _retire(metrics_dir, path)
+                elif os.path.getmtime(path) >= stale_before:
+                    paths.append(path)
+            except (OSError, ValueError):
+                continue
+        paths += glob.glob(os.path.join(metrics_dir, f'metrics-*-{RETIRED}.json'))
+        for path in paths:
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Partially written or removed: skip this scrape
+    return snapshots
+
+
+# ----------------------
+# Request Instrumentation
+# ----------------------
+def _before_request():
+    _start_flusher(current_app._get_current_object())
+    g._metrics_started = time.perf_counter()
+    g._metrics_sql = 0
+    g._metrics_recorded = False
+
+
+def _record(status):
+    started = g.pop('_metrics_started', None)
+    if started is None or g.get('_metrics_recorded'):
+        return
+    g._metrics_recorded = True
+    endpoint = request.endpoint or 'unmatched'
+    labels = (('endpoint', endpoint),)
+    registry.inc('http_requests_total', labels + (('method', request.method), ('status', str(status))))
+    registry.observe('http_request_duration_seconds', labels, time.perf_counter() - started)
+    sql = g.get('_metrics_sql', 0)
+    registry.observe('http_request_sql_statements', labels, sql)
+    registry.inc('sql_statements_total', labels, sql)
+
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exception):
+    # Only reached without a recorded response if after_request itself failed
+    if exception is not None:
+        _record(500)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_metrics_sql' in g:
+        g._metrics_sql += 1
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                         f'Bearer {token}'.encode()):
+        return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    body = registry.render(collect(current_app))
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    metrics_dir = app.config.get('METRICS_DIR')
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    app.extensions['metrics'] = {'flusher_pid': None, 'lock': threading.Lock(), 'stop': threading.Event()}
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    # Per-route traffic is not for everyone: served with a token, or when made public explicitly
+    if app.config.get('METRICS_TOKEN') or app.config.get('METRICS_PUBLIC'):
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    from app import db
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count_statement)
@@ -1,7 +1,19 @@
 from datetime import datetime
+from functools import lru_cache
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import declared_attr
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.search import create_search_index
+
+
+@lru_cache(maxsize=None)
+def _hash_prefix(method, salt_length):
+    """Method string as werkzeug stores it (defaults filled in, e.g. 'pbkdf2:sha256:1000000')."""
+    return generate_password_hash('', method=method, salt_length=salt_length).split('$', 1)[0]
+
 
 # ----------------------
 # User Model
@@ -11,15 +23,31 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
 
+    # Bumped after every write to the user's devices or diagnostics (ETag / Last-Modified)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    data_modified_at = db.Column(db.DateTime, nullable=True)
+
     # Relationships
     devices = db.relationship('Device', backref='owner', lazy=True)
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = generate_password_hash(
+            password,
+            method=current_app.config['PASSWORD_HASH_METHOD'],
+            salt_length=current_app.config['PASSWORD_SALT_LENGTH'],
+        )
 
     def check_password(self, password):
         return check_password_hash(self.password, password)
 
+    def password_needs_rehash(self):
+        """True if the stored hash was made with a method/cost other than the configured one."""
+        method = current_app.config['PASSWORD_HASH_METHOD']
+        salt_length = current_app.config['PASSWORD_SALT_LENGTH']
+        stored_method, _, rest = self.password.partition('$')
+        stored_salt = rest.partition('$')[0]
+        return stored_method != _hash_prefix(method, salt_length) or len(stored_salt) != salt_length
+
     def __repr__(self):
         return f"<User {self.username}>"
 
@@ -28,6 +56,16 @@ class User(db.Model):
 # Device Model
 # ----------------------
 class Device(db.Model):
+    __table_args__ = (
+        db.Index('ix_device_user_id_status', 'user_id', 'status'),
+        # (user_id, rowid): keyset pages of a user's devices in id order without a sort
+        db.Index('ix_device_user_id', 'user_id'),
+        # Partial: only deleted devices are indexed, so "deleted_at IS NULL" listings never pick it
+        db.Index('ix_device_deleted_at', 'deleted_at',
+                 sqlite_where=db.text('deleted_at IS NOT NULL'),
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     device_type = db.Column(db.String(50), nullable=False)
@@ -35,22 +73,91 @@ class Device(db.Model):
     location = db.Column(db.String(100), nullable=False)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Consider ondelete='CASCADE' for PostgreSQL
+    retention_days = db.Column(db.Integer, nullable=True)  # None = global DIAGNOSTICS_RETENTION_DAYS, 0 = keep forever
+    # Raw samples older than this were deleted by the retention purge; hour and day rollups
+    # that start earlier are kept as history and never rebuilt from the remaining raw rows
+    purged_before = db.Column(db.DateTime, nullable=True)
+
+    # Soft delete: set when the user deletes the device; its diagnostics are then purged in the background
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    purged_rows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    diagnostics = db.relationship('DeviceDiagnostics', backref='device', lazy='dynamic')
+    diagnostics = db.relationship('DeviceDiagnostics', backref='device', lazy='dynamic', passive_deletes=True)
 
     def __repr__(self):
         return f"<Device {self.name} (Type: {self.device_type})>"
 
 
+# Substring search index (SQLite FTS5) and its sync triggers, created with the table
+event.listen(Device.__table__, 'after_create', create_search_index)
+
+
 # ----------------------
 # Device Diagnostics Model
 # ----------------------
 class DeviceDiagnostics(db.Model):
+    __table_args__ = (
+        db.Index('ix_device_diagnostics_device_id_timestamp', 'device_id', 'timestamp'),
+        db.Index('ix_device_diagnostics_device_id_cpu_usage', 'device_id', 'cpu_usage'),
+        db.Index('ix_device_diagnostics_device_id_memory_usage', 'device_id', 'memory_usage'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.Integer, db.ForeignKey('device.id'), nullable=False)
+    device_id = db.Column(db.Integer, db.ForeignKey('device.id', ondelete='CASCADE'), nullable=False)
     cpu_usage = db.Column(db.Float, nullable=False)
     memory_usage = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return f"<Diagnostics Device ID: {self.device_id} | CPU: {self.cpu_usage}% | Mem: {self.memory_usage}%>"
+
+
+# ----------------------
+# Diagnostics Rollup Models
+# ----------------------
+class DiagnosticsRollupMixin:
+    """Count/min/max/sum of cpu and memory usage for one device over one time bucket."""
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            # (bucket, device_id): the listing over all of a user's devices reads a bucket range in order
+            db.PrimaryKeyConstraint('bucket', 'device_id'),
+            # Per-device reads: charts, count estimates, refreshes and the retention purge
+            db.Index(f'ix_{cls.__tablename__}_device_id_bucket', 'device_id', 'bucket'),
+        )
+
+    @declared_attr
+    def device_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('device.id', ondelete='CASCADE'), nullable=False)
+
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the bucket (UTC)
+    sample_count = db.Column(db.Integer, nullable=False)
+    cpu_min = db.Column(db.Float, nullable=False)
+    cpu_max = db.Column(db.Float, nullable=False)
+    cpu_sum = db.Column(db.Float, nullable=False)
+    memory_min = db.Column(db.Float, nullable=False)
+    memory_max = db.Column(db.Float, nullable=False)
+    memory_sum = db.Column(db.Float, nullable=False)
+
+    @property
+    def cpu_avg(self):
+        return self.cpu_sum / self.sample_count if self.sample_count else None
+
+    @property
+    def memory_avg(self):
+        return self.memory_sum / self.sample_count if self.sample_count else None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} Device ID: {self.device_id} | {self.bucket} | n={self.sample_count}>"
+
+
+class DiagnosticsMinuteRollup(DiagnosticsRollupMixin, db.Model):
+    __tablename__ = 'diagnostics_rollup_minute'
+
+
+class DiagnosticsHourRollup(DiagnosticsRollupMixin, db.Model):
+    __tablename__ = 'diagnostics_rollup_hour'
+
+
+class DiagnosticsDayRollup(DiagnosticsRollupMixin, db.Model):
+    __tablename__ = 'diagnostics_rollup_day'
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g
+from sqlalchemy import select
+from app.models import Device, db
+
+
+# ----------------------
+# Bounded TTL Cache
+# ----------------------
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_matching(self, predicate):
+        """Drop every entry whose key satisfies predicate(key). Returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _cache():
+    cache = current_app.extensions.get('ownership_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('ownership_cache', TTLCache(
+            maxsize=current_app.config['OWNERSHIP_CACHE_SIZE'],
+            ttl=current_app.config['OWNERSHIP_CACHE_TTL'],
+        ))
+    return cache
+
+
+# ----------------------
+# Ownership Lookups
+# ----------------------
+def owned_device_ids(user_id, refresh=False):
+    """
+    Ids of the user's devices as a frozenset. Memoized for the current request and
+    in a per-process TTL cache; only the id column is fetched on a miss.
+    """
+    user_id = int(user_id)
+    memo = g.setdefault('_owned_device_ids', {})
+    if not refresh and user_id in memo:
+        return memo[user_id]
+
+    ids = None if refresh else _cache().get(user_id)
+    if ids is None:
+        ids = frozenset(i for (i,) in db.session.query(Device.id).filter(
+            Device.user_id == user_id, Device.deleted_at.is_(None)
+        ))
+        _cache().set(user_id, ids)
+
+    memo[user_id] = ids
+    return ids
+
+
+def owns_device(user_id, device_id):
+    """
+    True if the device belongs to the user. A miss is re-checked against the
+    database once per request, so devices added by another worker are never
+    rejected because of a stale cache entry.
+    """
+    try:
+        device_id = int(device_id)
+    except (TypeError, ValueError):
+        return False
+
+    if device_id in owned_device_ids(user_id):
+        return True
+
+    refreshed = g.setdefault('_owned_device_ids_refreshed', set())
+    if int(user_id) in refreshed:
+        return False
+    refreshed.add(int(user_id))
+    return device_id in owned_device_ids(user_id, refresh=True)
+
+
+def live_device_ids_select(device_ids):
+    """Shared with the query-plan checks."""
+    return select(Device.id).where(Device.id.in_(device_ids), Device.deleted_at.is_(None))
+
+
+def live_device_ids(device_ids):
+    """
+    The ids among `device_ids` whose device is not soft-deleted, read from the
+    database. Write paths confirm cached ownership with it: a device deleted by
+    another worker stays in this worker's cache until the entry expires.
+    """
+    if not device_ids:
+        return frozenset()
+    return frozenset(db.session.execute(live_device_ids_select(device_ids)).scalars())
+
+
+def invalidate_owner(user_id):
+    """Drop cached ids after the user's devices were added or deleted."""
+    user_id = int(user_id)
+    _cache().pop(user_id)
+    g.get('_owned_device_ids', {}).pop(user_id, None)
@@ -0,0 +1,148 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, literal, select, tuple_
+from sqlalchemy.orm import aliased
+
+
+# ----------------------
+# Cursor Tokens
+# ----------------------
+def encode_cursor(direction, sort_name, sort_value, row_id):
+    """Opaque, URL-safe token pointing just after ('next') or before ('prev') a row."""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([direction, sort_name, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(). Returns None for anything malformed (treated as page 1)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, sort_name, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(row_id, int):
+        return None
+    return direction, sort_name, sort_value, row_id
+
+
+# ----------------------
+# Keyset Pagination
+# ----------------------
+class KeysetPage:
+    """One page of a keyset-paginated query, with opaque next/prev cursors."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, sort_column, id_column, per_page, cursor=None, partition_column=None, partitions=None):
+    """
+    Page through `query` ordered by (sort_column, id_column) ascending without OFFSET.
+    Each page is a range seek past the cursor row, so page N costs the same as page 1.
+    Rows whose sort value is NULL are not reachable by a cursor and are skipped.
+
+    With partition_column and partitions (e.g. device_id and a select of the
+    user's device ids), the seek runs once per partition value and the results
+    are merged, so a page over many devices costs one short index range per
+    device instead of a sort of their whole history. `query` must not filter on
+    partition_column itself.
+    """
+    sort_name = sort_column.key
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded and decoded[1] != sort_name:
+        decoded = None  # Cursor from a different sort order: start over
+
+    direction = 'next'
+    if decoded:
+        direction, _, sort_value, row_id = decoded
+        if isinstance(sort_column.type, DateTime) and sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        key = tuple_(sort_column, id_column)
+        bound = tuple_(literal(sort_value, sort_column.type), literal(row_id, id_column.type))
+        query = query.filter(key > bound if direction == 'next' else key < bound)
+
+    if direction == 'next':
+        query = query.order_by(None).order_by(sort_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(None).order_by(sort_column.desc(), id_column.desc())
+
+    if partitions is None:
+        rows = query.limit(per_page + 1).all()
+    else:
+        rows = _merged_rows(query, sort_column, id_column, per_page + 1, partition_column, partitions,
+                            descending=direction == 'prev')
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    def cursor_for(new_direction, row):
+        return encode_cursor(new_direction, sort_name, getattr(row, sort_name), getattr(row, id_column.key))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # Moving forwards there is a previous page whenever we started from a cursor;
+        # moving backwards there is always a next page (the one we came from).
+        if direction == 'next':
+            next_cursor = cursor_for('next', rows[-1]) if has_more else None
+            prev_cursor = cursor_for('prev', rows[0]) if decoded else None
+        else:
+            next_cursor = cursor_for('next', rows[-1])
+            prev_cursor = cursor_for('prev', rows[0]) if has_more else None
+
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+# ----------------------
+# Partitioned Seek
+# ----------------------
+def partitioned_seek(query, sort_column, id_column, limit, partition_column, partitions):
+    """
+    (sort, id) of the first `limit` rows of `query` (filters and ordering
+    included) for every value of the one-column select `partitions`. The seek
+    is a correlated `ORDER BY ... LIMIT` subquery per value, served by a
+    (partition, sort) index without sorting. Shared with the query-plan checks.
+    """
+    source = partitions.subquery()
+    seek = (
+        query.filter(partition_column == source.c[0])
+        .with_entities(id_column).limit(limit)
+        .statement.correlate(source)
+    )
+    listed = aliased(query.column_descriptions[0]['entity'])
+    listed_id = getattr(listed, id_column.key)
+    return (
+        select(getattr(listed, sort_column.key), listed_id)
+        .select_from(source)
+        .join(listed, listed_id.in_(seek))
+    )
+
+
+def _merged_rows(query, sort_column, id_column, limit, partition_column, partitions, descending=False):
+    """First `limit` rows of the per-partition seeks in (sort, id) order, as entities."""
+    keys = query.session.execute(
+        partitioned_seek(query, sort_column, id_column, limit, partition_column, partitions)
+    ).all()
+    # At most `limit` rows per partition, merged here; NULL sorts first ascending, as in SQLite
+    keys.sort(key=lambda key: (key[0] is not None, key[0], key[1]), reverse=descending)
+    ids = [key[1] for key in keys[:limit]]
+    if not ids:
+        return []
+    by_id = {getattr(row, id_column.key): row for row in query.order_by(None).filter(id_column.in_(ids))}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
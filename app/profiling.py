@@ -0,0 +1,98 @@
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Expanded IN lists differ only in their number of placeholders; treat them as one shape
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_NOT_EXPLAINABLE = ('EXPLAIN', 'PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def statement_shape(statement):
+    """Normalize a statement so repeats with different parameters compare equal."""
+    return _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def _explain(cursor, statement, parameters, dialect_name):
+    """Query plan of a statement, run on the same DBAPI connection."""
+    if statement.lstrip().upper().startswith(_NOT_EXPLAINABLE):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect_name == 'sqlite' else 'EXPLAIN '
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+    except Exception as e:
+        return [f"(EXPLAIN failed: {e})"]
+    finally:
+        explain_cursor.close()
+    # SQLite rows are (id, parent, notused, detail); other engines return one text column
+    return [row[-1] for row in rows]
+
+
+def init_profiling(app):
+    """
+    Opt-in SQL profiling (SQL_PROFILING=1): logs statements slower than
+    SQL_SLOW_QUERY_MS with their parameters and query plan, and warns when a
+    request runs the same statement shape more than SQL_NPLUS1_THRESHOLD times.
+    """
+    if not app.config.get('SQL_PROFILING'):
+        return
+
+    from app import db
+
+    logger = app.logger
+    slow_seconds = app.config['SQL_SLOW_QUERY_MS'] / 1000.0
+    explain_slow = app.config['SQL_EXPLAIN_SLOW']
+    nplus1_threshold = app.config['SQL_NPLUS1_THRESHOLD']
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_profiling_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_profiling_started'].pop()
+
+        if has_request_context():
+            shapes = g.setdefault('_sql_shapes', Counter())
+            shapes[statement_shape(statement)] += 1
+
+        if elapsed < slow_seconds:
+            return
+        plan = None
+        if explain_slow and not executemany:
+            plan = _explain(cursor, statement, parameters, conn.dialect.name)
+        logger.warning(
+            "Slow query (%.1f ms)%s: %s | params=%r%s",
+            elapsed * 1000,
+            f" in {request.endpoint}" if has_request_context() else "",
+            _WHITESPACE.sub(' ', statement).strip(),
+            parameters if not executemany else f"<{len(parameters)} rows>",
+            "".join(f"\n    {line}" for line in plan) if plan else "",
+            extra={'rate_limit': False},
+        )
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        started = conn.info.get('_profiling_started') if conn is not None else None
+        if started:
+            started.pop()
+
+    def report_repeated_statements(response):
+        shapes = g.pop('_sql_shapes', None)
+        if shapes:
+            for shape, count in shapes.items():
+                if count > nplus1_threshold:
+                    logger.warning(
+                        "Possible N+1 in %s: same statement ran %d times: %s",
+                        request.endpoint, count, shape,
+                        extra={'rate_limit': False},
+                    )
+        return response
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(db.engine, 'handle_error', handle_error)
+    app.after_request(report_repeated_statements)
@@ -0,0 +1,162 @@
+import re
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, literal, tuple_
+from app.models import User, Device, DeviceDiagnostics, db
+from app import rollups, stats
+from app.hotstore import HotStore
+from app.ownership import live_device_ids_select
+
+# "SCAN device" / "SCAN device USING INDEX ..." means every row (or index entry) is visited.
+# Constrained lookups are reported as "SEARCH ..." instead.
+_SCAN_PATTERN = re.compile(r'^SCAN (\w+)')
+# A paged listing must read rows in index order; a temp B-tree sorts every matching row on each page
+_SORT_PATTERN = re.compile(r'^USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+
+
+def _plain(value):
+    # EXPLAIN never evaluates parameters, it only needs values the driver accepts
+    return str(value) if isinstance(value, (date, datetime)) else value
+
+
+def explain(statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query or Core select (SQLite only)."""
+    statement = getattr(statement, 'statement', statement)
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(_plain(compiled.params[name]) for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    return [row[3] for row in rows]
+
+
+def full_scans(plan):
+    """Plan lines that walk an entire application table."""
+    tables = set(db.metadata.tables)
+    return [line for line in plan if (m := _SCAN_PATTERN.match(line)) and m.group(1) in tables]
+
+
+def sorts(plan):
+    """Plan lines that sort the result instead of reading it in index order."""
+    return [line for line in plan if _SORT_PATTERN.match(line)]
+
+
+def route_queries(user_id=1, device_id=1, diagnostic_id=1):
+    """
+    The queries built by each route, keyed by a readable name. Names in the
+    returned `listings` set are paged listings, which must not sort either.
+    """
+    from app.routes.api import build_api_devices_query, build_api_diagnostics_query
+    from app.pagination import partitioned_seek
+    from app.routes.device import build_device_query
+    from app.routes.diagnostics import build_diagnostics_query, build_rollup_query
+
+    device_ids = [device_id, device_id + 1, device_id + 2]
+    start = datetime.utcnow() - timedelta(days=30)
+    now = datetime.utcnow()
+
+    queries = {
+        'auth.login: user by username': User.query.filter_by(username='alice'),
+        # Device pages are walked by id (see app.pagination.keyset_paginate)
+        'device.list_devices: owner': build_device_query(user_id).order_by(Device.id).limit(6),
+        'device.list_devices: owner + status': build_device_query(user_id, status='online').order_by(
+            Device.id
+        ).limit(6),
+        'device.list_devices: owner + location + status': build_device_query(
+            user_id, location='lab', status='online'
+        ).order_by(Device.id).limit(6),
+        'device.list_devices: owner + id': build_device_query(user_id, search_id=device_id),
+        'device.list_devices: owner + text search': build_device_query(user_id, search='sensor').order_by(
+            Device.id
+        ).limit(6),
+        'api.api_devices: page': build_api_devices_query(user_id).order_by(Device.id).limit(101),
+        'api.api_devices: status page': build_api_devices_query(user_id, status='online').filter(
+            Device.id > 1000
+        ).order_by(Device.id).limit(101),
+        'api.api_device_diagnostics: page': build_api_diagnostics_query(device_id, start, now).order_by(
+            DeviceDiagnostics.timestamp, DeviceDiagnostics.id
+        ).limit(1001),
+        'device.update_device: by id': Device.query.filter_by(id=device_id, deleted_at=None),
+        'ownership.owned_device_ids': db.session.query(Device.id).filter(
+            Device.user_id == user_id, Device.deleted_at.is_(None)
+        ),
+        'ownership.live_device_ids': live_device_ids_select(device_ids),
+        'deletion.purge_next_batch: next device': db.session.query(Device.id, Device.user_id).filter(
+            Device.deleted_at.isnot(None)
+        ).order_by(Device.deleted_at, Device.id).limit(1),
+        'deletion.purge_next_batch: batch': db.session.query(DeviceDiagnostics.id).filter(
+            DeviceDiagnostics.device_id == device_id
+        ).limit(5000),
+        'diagnostics.update_diagnostics: by id': DeviceDiagnostics.query.filter_by(id=diagnostic_id),
+        'device.delete_device: diagnostics of device': DeviceDiagnostics.query.filter_by(device_id=device_id),
+        'diagnostics.diagnostics_stats: window columns': stats.window_select(device_ids, start, now),
+        'hotstore.HotStore: load device windows': HotStore().load_select(device_ids, now),
+        'rollups.refresh_buckets: bucket window': rollups._aggregate_select(
+            'hour',
+            DeviceDiagnostics.device_id == device_id,
+            DeviceDiagnostics.timestamp >= start,
+            DeviceDiagnostics.timestamp < now,
+        ),
+    }
+
+    owned = db.session.query(Device.id).filter(Device.id.in_(device_ids)).statement
+    listings = {
+        'device.list_devices: owner', 'device.list_devices: owner + status',
+        'device.list_devices: owner + location + status', 'device.list_devices: owner + text search',
+        'api.api_devices: page', 'api.api_devices: status page', 'api.api_device_diagnostics: page',
+    }
+
+    queries['diagnostics.list_diagnostics: count'] = (
+        build_diagnostics_query(device_ids).order_by(None).with_entities(func.count())
+    )
+    queries['diagnostics.list_diagnostics: page rows by id'] = DeviceDiagnostics.query.filter(
+        DeviceDiagnostics.id.in_([diagnostic_id, diagnostic_id + 1])
+    )
+    for sort_by in ('timestamp', 'cpu_usage', 'memory_usage'):
+        sort_column = getattr(DeviceDiagnostics, sort_by)
+        seek_value = start if sort_by == 'timestamp' else 50.0
+        ordered = DeviceDiagnostics.query.order_by(sort_column, DeviceDiagnostics.id)
+        # The keyset seek issued for page N > 1 (see app.pagination.keyset_paginate)
+        seek = ordered.filter(
+            tuple_(sort_column, DeviceDiagnostics.id) > tuple_(literal(seek_value, sort_column.type), literal(1000))
+        )
+        page_queries = {
+            # All of the user's devices: one seek per device, merged (app.pagination.partitioned_seek)
+            f'all devices sort={sort_by}': partitioned_seek(
+                ordered, sort_column, DeviceDiagnostics.id, 6, DeviceDiagnostics.device_id, owned
+            ),
+            f'all devices keyset seek sort={sort_by}': partitioned_seek(
+                seek, sort_column, DeviceDiagnostics.id, 6, DeviceDiagnostics.device_id, owned
+            ),
+            f'one device sort={sort_by}': ordered.filter(DeviceDiagnostics.device_id == device_id).limit(6),
+            f'one device keyset seek sort={sort_by}': seek.filter(DeviceDiagnostics.device_id == device_id).limit(6),
+        }
+        for name, query in page_queries.items():
+            queries[f'diagnostics.list_diagnostics: {name}'] = query
+            listings.add(f'diagnostics.list_diagnostics: {name}')
+
+    for resolution in rollups.RESOLUTIONS:
+        queries[f'diagnostics.list_diagnostics: resolution={resolution}'] = (
+            build_rollup_query(resolution, device_ids, start).limit(5)
+        )
+        listings.add(f'diagnostics.list_diagnostics: resolution={resolution}')
+        model = rollups.RESOLUTIONS[resolution].model
+        queries[f'rollups.series: resolution={resolution}'] = (
+            rollups.rollup_query(resolution, device_ids, start, now).order_by(model.device_id, model.bucket)
+        )
+        listings.add(f'rollups.series: resolution={resolution}')
+
+    return queries, listings
+
+
+def check_query_plans(**kwargs):
+    """
+    Explain every route query. Returns {name: (plan, offending_lines)}: full
+    table scans, plus sorts for paged listings.
+    """
+    queries, listings = route_queries(**kwargs)
+    results = {}
+    for name, query in queries.items():
+        plan = explain(query)
+        problems = full_scans(plan)
+        if name in listings:
+            problems += sorts(plan)
+        results[name] = (plan, problems)
+    return results
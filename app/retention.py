@@ -0,0 +1,147 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, or_, select, update
+from app import archive, rollups
+from app.conditional import touch_data_versions
+from app.models import Device, DeviceDiagnostics, db
+from app.signals import diagnostics_changed
+
+PurgeResult = namedtuple('PurgeResult', 'device_id cutoff rows batches seconds')
+
+
+# ----------------------
+# Policy
+# ----------------------
+def retention_days(device_retention_days, default_days):
+    """Effective retention for a device: its own setting, else the global one. 0 means keep forever."""
+    return default_days if device_retention_days is None else device_retention_days
+
+
+def purge_plan(default_days, device_id=None, now=None):
+    """
+    [(device_id, cutoff)] for every device whose samples expire. With an archive
+    configured, the cutoff never passes the device's archive horizon, so only
+    samples that are already archived are deleted.
+    """
+    now = now or datetime.utcnow()
+    query = select(Device.id, Device.retention_days).where(Device.deleted_at.is_(None)).order_by(Device.id)
+    if device_id is not None:
+        query = query.where(Device.id == device_id)
+    plan = []
+    for device, days in db.session.execute(query):
+        days = retention_days(days, default_days)
+        if not days or days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        if archive.archive_dir():
+            device_horizon = archive.horizon(device)
+            if device_horizon is None:
+                continue
+            cutoff = min(cutoff, device_horizon)
+        plan.append((device, cutoff))
+    return plan
+
+
+# ----------------------
+# Batched Delete
+# ----------------------
+def purge_device(device_id, cutoff, batch_size=2000, pause=0.05, dry_run=False, on_batch=None):
+    """
+    Delete one device's samples older than `cutoff`, batch_size rows per
+    transaction. Each batch is located through the (device_id, timestamp) index
+    and deleted by primary key, then the write lock is released for `pause`
+    seconds so request handlers can commit in between. Hour and day rollups
+    are kept: they are the long-term history once raw samples expire; minute
+    rollups are deleted with the raw rows they summarize. With an archive
+    configured, only samples before the device's horizon are deleted, and
+    only after they are in their month's partition.
+    """
+    started = time.perf_counter()
+    rows = batches = 0
+    root = archive.archive_dir()
+    if root:
+        device_horizon = archive.horizon(device_id, root)
+        if device_horizon is None:
+            return PurgeResult(device_id, cutoff, 0, 0, time.perf_counter() - started)
+        cutoff = min(cutoff, device_horizon)
+    expired = (DeviceDiagnostics.device_id == device_id, DeviceDiagnostics.timestamp < cutoff)
+
+    if dry_run:
+        count = db.session.execute(select(func.count()).select_from(DeviceDiagnostics).where(*expired)).scalar()
+        return PurgeResult(device_id, cutoff, count, 0, time.perf_counter() - started)
+
+    if root:
+        # Samples back-dated into archived months since the last `archive run` are merged
+        # into their partitions first. Only rows up to last_id, which all existed before the
+        # archive read them, are deleted: a row inserted meanwhile gets a higher id and stays.
+        last_id = db.session.execute(select(func.max(DeviceDiagnostics.id)).where(*expired)).scalar()
+        if last_id is not None:
+            month = archive.month_start(cutoff)
+            archive.archive_device(device_id, cutoff if month == cutoff else archive.next_month(month), root)
+        expired += (DeviceDiagnostics.id <= (last_id or 0),)
+
+    # Committed with the first batch: rollup buckets before the cutoff become history
+    # (see rollups.backfill), and minute ones are dropped
+    db.session.execute(
+        update(Device)
+        .where(Device.id == device_id, or_(Device.purged_before.is_(None), Device.purged_before < cutoff))
+        .values(purged_before=cutoff)
+    )
+    rollups.prune_minute_rollups(device_id, cutoff)
+
+    while True:
+        ids = db.session.execute(
+            select(DeviceDiagnostics.id).where(*expired).order_by(DeviceDiagnostics.timestamp).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(delete(DeviceDiagnostics).where(DeviceDiagnostics.id.in_(ids)))
+        touch_data_versions(device_ids={device_id})
+        db.session.commit()
+        rows += len(ids)
+        batches += 1
+        if on_batch:
+            on_batch(device_id, rows, time.perf_counter() - started)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    db.session.commit()
+
+    if rows:
+        diagnostics_changed.send(current_app._get_current_object(), device_ids={device_id})
+    return PurgeResult(device_id, cutoff, rows, batches, time.perf_counter() - started)
+
+
+# ----------------------
+# Space Reclaim (SQLite)
+# ----------------------
+def incremental_vacuum(pages_per_step=2000, pause=0.05):
+    """
+    Return free pages to the filesystem in short steps. Only works when the
+    database uses auto_vacuum=INCREMENTAL; returns None otherwise, else the
+    number of pages released.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+
+    raw = db.engine.raw_connection()
+    try:
+        if raw.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return None
+        released = 0
+        while True:
+            free = raw.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                break
+            step = min(free, pages_per_step)
+            # executescript steps the pragma to completion; execute() would free a single page
+            raw.driver_connection.executescript(f'PRAGMA incremental_vacuum({step})')
+            released += step
+            if pause:
+                time.sleep(pause)
+        return released
+    finally:
+        raw.close()
@@ -0,0 +1,266 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, delete, func, insert, select
+from app.models import (
+    Device, DeviceDiagnostics, DiagnosticsMinuteRollup, DiagnosticsHourRollup, DiagnosticsDayRollup, db
+)
+
+# ----------------------
+# Resolutions
+# ----------------------
+Resolution = namedtuple('Resolution', 'name model step sqlite_format pg_unit')
+
+RESOLUTIONS = {
+    'minute': Resolution('minute', DiagnosticsMinuteRollup, timedelta(minutes=1), '%Y-%m-%d %H:%M:00.000000', 'minute'),
+    'hour': Resolution('hour', DiagnosticsHourRollup, timedelta(hours=1), '%Y-%m-%d %H:00:00.000000', 'hour'),
+    'day': Resolution('day', DiagnosticsDayRollup, timedelta(days=1), '%Y-%m-%d 00:00:00.000000', 'day'),
+}
+
+# Aim for at most this many buckets per device when picking a resolution automatically
+MAX_POINTS = 1500
+
+
+def bucket_start(timestamp, resolution):
+    """Truncate a datetime to the start of its bucket."""
+    if resolution == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_resolution(start, end):
+    """Finest resolution that keeps a window under MAX_POINTS buckets (30 days -> hour)."""
+    span = (end or datetime.utcnow()) - start
+    for resolution in RESOLUTIONS.values():
+        if span / resolution.step <= MAX_POINTS:
+            return resolution.name
+    return 'day'
+
+
+def _bucket_expr(resolution, column):
+    """SQL expression truncating `column` the same way bucket_start() does."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Matches SQLAlchemy's SQLite DateTime storage format so bucket keys compare equal
+        return func.strftime(RESOLUTIONS[resolution].sqlite_format, column)
+    if dialect == 'postgresql':
+        return func.date_trunc(RESOLUTIONS[resolution].pg_unit, column)
+    raise NotImplementedError(f"Rollups are not supported on the '{dialect}' dialect.")
+
+
+def _upsert_insert(model):
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Rollups are not supported on the '{dialect}' dialect.")
+    return dialect_insert(model)
+
+
+# ----------------------
+# Incremental Updates
+# ----------------------
+def apply_samples(rows):
+    """
+    Fold newly inserted samples (dicts with device_id/cpu_usage/memory_usage/timestamp)
+    into every rollup table. Runs in the caller's transaction; the caller commits.
+    """
+    for resolution in RESOLUTIONS.values():
+        buckets = {}
+        for row in rows:
+            if row.get('timestamp') is None:
+                continue
+            key = (row['device_id'], bucket_start(row['timestamp'], resolution.name))
+            cpu, memory = row['cpu_usage'], row['memory_usage']
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, cpu, cpu, cpu, memory, memory, memory]
+            else:
+                agg[0] += 1
+                agg[1] = min(agg[1], cpu)
+                agg[2] = max(agg[2], cpu)
+                agg[3] += cpu
+                agg[4] = min(agg[4], memory)
+                agg[5] = max(agg[5], memory)
+                agg[6] += memory
+
+        if not buckets:
+            continue
+
+        model = resolution.model
+        stmt = _upsert_insert(model)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['device_id', 'bucket'],
+            set_={
+                'sample_count': model.sample_count + excluded.sample_count,
+                'cpu_min': case((excluded.cpu_min < model.cpu_min, excluded.cpu_min), else_=model.cpu_min),
+                'cpu_max': case((excluded.cpu_max > model.cpu_max, excluded.cpu_max), else_=model.cpu_max),
+                'cpu_sum': model.cpu_sum + excluded.cpu_sum,
+                'memory_min': case((excluded.memory_min < model.memory_min, excluded.memory_min), else_=model.memory_min),
+                'memory_max': case((excluded.memory_max > model.memory_max, excluded.memory_max), else_=model.memory_max),
+                'memory_sum': model.memory_sum + excluded.memory_sum,
+            },
+        )
+        db.session.execute(stmt, [
+            {
+                'device_id': device_id, 'bucket': bucket, 'sample_count': agg[0],
+                'cpu_min': agg[1], 'cpu_max': agg[2], 'cpu_sum': agg[3],
+                'memory_min': agg[4], 'memory_max': agg[5], 'memory_sum': agg[6],
+            }
+            for (device_id, bucket), agg in buckets.items()
+        ])
+
+
+def _aggregate_select(resolution, *criteria):
+    bucket = _bucket_expr(resolution, DeviceDiagnostics.timestamp)
+    return (
+        select(
+            DeviceDiagnostics.device_id, bucket, func.count(),
+            func.min(DeviceDiagnostics.cpu_usage), func.max(DeviceDiagnostics.cpu_usage),
+            func.sum(DeviceDiagnostics.cpu_usage),
+            func.min(DeviceDiagnostics.memory_usage), func.max(DeviceDiagnostics.memory_usage),
+            func.sum(DeviceDiagnostics.memory_usage),
+        )
+        .where(DeviceDiagnostics.timestamp.isnot(None), *criteria)
+        .group_by(DeviceDiagnostics.device_id, bucket)
+    )
+
+
+_ROLLUP_COLUMNS = [
+    'device_id', 'bucket', 'sample_count', 'cpu_min', 'cpu_max', 'cpu_sum',
+    'memory_min', 'memory_max', 'memory_sum',
+]
+
+
+def refresh_buckets(samples):
+    """
+    Recompute the buckets touched by (device_id, timestamp) pairs from raw rows.
+    Used after updates and deletes, where min/max cannot be adjusted incrementally.
+    A bucket that starts before its device's purged_before has lost raw rows to the
+    retention purge and keeps its value. Runs in the caller's transaction; the caller commits.
+    """
+    purged_before = dict(db.session.execute(
+        select(Device.id, Device.purged_before)
+        .where(Device.id.in_({device_id for device_id, _ in samples}), Device.purged_before.isnot(None))
+    ).all())
+    for resolution in RESOLUTIONS.values():
+        model = resolution.model
+        keys = {
+            (device_id, bucket_start(timestamp, resolution.name))
+            for device_id, timestamp in samples if timestamp is not None
+        }
+        for device_id, bucket in keys:
+            if device_id in purged_before and bucket < purged_before[device_id]:
+                continue
+            window = (
+                DeviceDiagnostics.device_id == device_id,
+                DeviceDiagnostics.timestamp >= bucket,
+                DeviceDiagnostics.timestamp < bucket + resolution.step,
+            )
+            db.session.execute(delete(model).where(model.device_id == device_id, model.bucket == bucket))
+            db.session.execute(
+                insert(model).from_select(_ROLLUP_COLUMNS, _aggregate_select(resolution.name, *window))
+            )
+
+
+def delete_device_rollups(device_id):
+    for resolution in RESOLUTIONS.values():
+        db.session.execute(delete(resolution.model).where(resolution.model.device_id == device_id))
+
+
+def prune_minute_rollups(device_id, cutoff):
+    """
+    Delete a device's minute buckets that end at or before `cutoff`, the raw
+    retention cutoff: charts over purged ranges use hour and day rollups.
+    Runs in the caller's transaction; the caller commits.
+    """
+    model = DiagnosticsMinuteRollup
+    return db.session.execute(
+        delete(model).where(model.device_id == device_id, model.bucket < bucket_start(cutoff, 'minute'))
+    ).rowcount
+
+
+def backfill(device_id=None, device_ids=None):
+    """
+    Rebuild every rollup table (or only these devices' rows) from raw diagnostics.
+    Buckets that start before a device's purged_before are history whose raw rows
+    are gone: they are kept as they are, and only added when missing. Returns buckets written.
+    """
+    if device_id is not None:
+        device_ids = [device_id]
+    written = 0
+    for resolution in RESOLUTIONS.values():
+        model = resolution.model
+        criteria = []
+        purged = (
+            select(Device.id)
+            .where(Device.id == model.device_id, Device.purged_before > model.bucket)
+            .exists()
+        )
+        clear = delete(model).where(~purged)
+        if device_ids is not None:
+            criteria.append(DeviceDiagnostics.device_id.in_(device_ids))
+            clear = clear.where(model.device_id.in_(device_ids))
+        db.session.execute(clear)
+        result = db.session.execute(
+            _upsert_insert(model)
+            .from_select(_ROLLUP_COLUMNS, _aggregate_select(resolution.name, *criteria))
+            .on_conflict_do_nothing(index_elements=['device_id', 'bucket'])
+        )
+        written += result.rowcount
+    db.session.commit()
+    return written
+
+
+# ----------------------
+# Reads
+# ----------------------
+def rollup_query(resolution, device_ids, start=None, end=None):
+    """Query over one rollup table, filtered to the given devices and [start, end)."""
+    model = RESOLUTIONS[resolution].model
+    query = model.query.filter(model.device_id.in_(device_ids))
+    if start is not None:
+        query = query.filter(model.bucket >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.filter(model.bucket < end)
+    return query
+
+
+def estimated_count(device_ids):
+    """
+    Raw sample count for the devices from the day rollups (one small row per
+    device-day). Day rollups outlive the retention purge, so only days from each
+    device's oldest remaining raw sample on are counted.
+    """
+    if not device_ids:
+        return 0
+    # Correlated MIN per device: one (device_id, timestamp) index seek each
+    oldest = (
+        select(func.min(DeviceDiagnostics.timestamp))
+        .where(DeviceDiagnostics.device_id == Device.id)
+        .scalar_subquery()
+    )
+    starts = (
+        select(Device.id.label('device_id'), _bucket_expr('day', oldest).label('first_day'))
+        .where(Device.id.in_(device_ids))
+        .subquery()
+    )
+    total = db.session.execute(
+        select(func.sum(DiagnosticsDayRollup.sample_count))
+        .join_from(starts, DiagnosticsDayRollup, and_(
+            DiagnosticsDayRollup.device_id == starts.c.device_id,
+            DiagnosticsDayRollup.bucket >= starts.c.first_day,
+        ))
+    ).scalar()
+    return int(total or 0)
+
+
+def series(device_ids, start, end=None, resolution=None):
+    """Chart-ready rollup rows for a window, at an automatically chosen resolution if none given."""
+    resolution = resolution or choose_resolution(start, end)
+    model = RESOLUTIONS[resolution].model
+    return rollup_query(resolution, device_ids, start, end).order_by(model.device_id, model.bucket).all()
@@ -0,0 +1,94 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.conditional import conditional_get
+from app.models import Device, DeviceDiagnostics, db
+from app.ownership import owns_device
+from app.pagination import keyset_paginate
+from app.routes.device import build_device_query
+from app.routes.diagnostics import _parse_timestamp
+from app.serializers import DEVICE_ENCODER, DIAGNOSTIC_ENCODER, envelope
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Column tuples only: no ORM objects, so no relationship can ever be lazy-loaded
+DEVICE_COLUMNS = tuple(getattr(Device, name) for name in DEVICE_ENCODER.names)
+DIAGNOSTIC_COLUMNS = tuple(getattr(DeviceDiagnostics, name) for name in DIAGNOSTIC_ENCODER.names)
+
+
+def _limit(default, maximum):
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+
+def _json_page(encoder, page):
+    body = envelope(encoder.encode_rows(page.items), next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+    return Response(body, mimetype='application/json')
+
+
+def build_api_devices_query(user_id, status=None, location=None, search=None):
+    """Device listing as column tuples; shared with the query-plan checks."""
+    return build_device_query(user_id, location=location, status=status, search=search).with_entities(*DEVICE_COLUMNS)
+
+
+def build_api_diagnostics_query(device_id, start=None, end=None):
+    """One device's samples as column tuples, walked by (timestamp, id); shared with the query-plan checks."""
+    query = db.session.query(*DIAGNOSTIC_COLUMNS).filter(DeviceDiagnostics.device_id == device_id)
+    if start is not None:
+        query = query.filter(DeviceDiagnostics.timestamp >= start)
+    if end is not None:
+        query = query.filter(DeviceDiagnostics.timestamp < end)
+    return query
+
+
+# -------------------------------
+#  Devices
+# -------------------------------
+@api_bp.route('/devices')
+@jwt_required()
+@conditional_get()
+def api_devices():
+    """The user's devices, ?limit= per page (keyset by id), optional ?status=, ?location=, ?q=."""
+    user_id = get_jwt_identity()
+    try:
+        query = build_api_devices_query(
+            user_id, request.args.get('status'), request.args.get('location'), request.args.get('q')
+        )
+        page = keyset_paginate(query, Device.id, Device.id, per_page=_limit(100, 1000),
+                               cursor=request.args.get('cursor'))
+    except Exception as e:
+        current_app.logger.error("API device listing failed: %s", str(e))
+        return jsonify(error="Failed to load devices."), 500
+    return _json_page(DEVICE_ENCODER, page)
+
+
+# -------------------------------
+#  Diagnostics of One Device
+# -------------------------------
+@api_bp.route('/devices/<int:device_id>/diagnostics')
+@jwt_required()
+@conditional_get()
+def api_device_diagnostics(device_id):
+    """
+    A device's samples in time order, ?limit= per page, optional ?start= / ?end= (ISO 8601).
+    Reads DeviceDiagnostics only: samples the retention purge moved to the cold
+    archive are not listed (/diagnostics/export and /diagnostics/stats include them).
+    """
+    user_id = get_jwt_identity()
+    if not owns_device(user_id, device_id):
+        return jsonify(error="Device not found."), 404
+
+    try:
+        start = _parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = _parse_timestamp(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify(error="start and end must be ISO 8601 datetimes."), 400
+
+    try:
+        page = keyset_paginate(
+            build_api_diagnostics_query(device_id, start, end), DeviceDiagnostics.timestamp, DeviceDiagnostics.id,
+            per_page=_limit(1000, 10000), cursor=request.args.get('cursor'),
+        )
+    except Exception as e:
+        current_app.logger.error("API diagnostics listing failed (device %s): %s", device_id, str(e))
+        return jsonify(error="Failed to load diagnostics."), 500
+    return _json_page(DIAGNOSTIC_ENCODER, page)
@@ -1,7 +1,6 @@
 import re
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
 from flask_jwt_extended import create_access_token, unset_jwt_cookies, set_access_cookies
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.models import User, db
 
 auth_bp = Blueprint('auth', __name__, template_folder='../templates')
@@ -24,6 +23,16 @@ def is_valid_password(password):
     )
 
 
+def _rehash_password(user, password):
+    """Upgrade a hash made with outdated parameters; login still succeeds if this fails."""
+    try:
+        user.set_password(password)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Password rehash failed for user %s: %s", user.id, str(e))
+
+
 # -------------------------------
 #  Register
 # -------------------------------
@@ -47,8 +56,8 @@ def register():
                 return redirect(url_for('auth.register'))
 
             # Save user
-            hashed_password = generate_password_hash(password)
-            new_user = User(username=username, password=hashed_password)
+            new_user = User(username=username)
+            new_user.set_password(password)
             db.session.add(new_user)
             db.session.commit()
 
@@ -76,7 +85,10 @@ def login():
 
             user = User.query.filter_by(username=username).first()
 
-            if user and check_password_hash(user.password, password):
+            if user and user.check_password(password):
+                if user.password_needs_rehash():
+                    _rehash_password(user, password)
+
                 access_token = create_access_token(identity=str(user.id))
                 session['username'] = user.username
 
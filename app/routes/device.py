@@ -1,7 +1,20 @@
+import csv
+import io
+import json
 import re
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from collections import namedtuple
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Device, DeviceDiagnostics, db
+from sqlalchemy import or_
+from app.models import Device, db
+from app.deletion import deletion_progress, mark_deleted, start_purger
+from app.hotstore import hot_store
+from app.cache import cached_fragment
+from app.conditional import conditional_get, touch_data_versions
+from app.ownership import invalidate_owner
+from app.signals import devices_changed
+from app.search import SEARCH_COLUMNS, bulk_insert_indexing, matching_ids, uses_search_index
+from app.pagination import keyset_paginate
 
 device_bp = Blueprint('device', __name__, url_prefix='/devices')
 
@@ -9,51 +22,127 @@ device_bp = Blueprint('device', __name__, url_prefix='/devices')
 # -------------------------------
 #  Input Validation Helper
 # -------------------------------
-def is_valid_device_input(name, device_type, location, status):
-    name_pattern = r'^[a-zA-Z0-9\s\-_.]{2,}$'
-    location_pattern = r'^[a-zA-Z0-9\s\-_,.]{2,}$'
-    status_values = ['online', 'offline', 'error']
+# Compiled once; the bulk import runs them for every row
+NAME_PATTERN = re.compile(r'^[a-zA-Z0-9\s\-_.]{2,}$')
+LOCATION_PATTERN = re.compile(r'^[a-zA-Z0-9\s\-_,.]{2,}$')
+STATUS_VALUES = ('online', 'offline', 'error')
+
 
-    if not re.match(name_pattern, name):
+def is_valid_device_input(name, device_type, location, status):
+    if not NAME_PATTERN.match(name):
         return False, "Invalid name. Use letters, numbers, space, dash, underscore, or dot."
 
-    if not re.match(name_pattern, device_type):
+    if not NAME_PATTERN.match(device_type):
         return False, "Invalid device type."
 
-    if not re.match(location_pattern, location):
+    if not LOCATION_PATTERN.match(location):
         return False, "Invalid location."
 
-    if status.lower() not in status_values:
+    if status.lower() not in STATUS_VALUES:
         return False, "Status must be: online, offline, or error."
 
     return True, ""
 
 
+# field, pattern, max length (the column size), message
+IMPORT_FIELDS = (
+    ('name', NAME_PATTERN, 120, "Invalid name. Use letters, numbers, space, dash, underscore, or dot."),
+    ('device_type', NAME_PATTERN, 50, "Invalid device type."),
+    ('location', LOCATION_PATTERN, 100, "Invalid location."),
+)
+
+
+def validate_device_row(record):
+    """
+    Validate one imported device with the same rules as the form, without
+    building an ORM object. Returns (row, None) or (None, {field: [messages]}).
+    """
+    if not isinstance(record, dict):
+        return None, {"row": ["Expected an object."]}
+
+    row, errors = {}, {}
+    for field, pattern, max_length, message in IMPORT_FIELDS:
+        value = record.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            errors[field] = ["Missing data for required field."]
+        elif not isinstance(value, str) or not pattern.match(value.strip()):
+            errors[field] = [message]
+        elif len(value.strip()) > max_length:
+            errors[field] = [f"Longer than maximum length {max_length}."]
+        else:
+            row[field] = value.strip()
+
+    status = record.get('status')
+    if not isinstance(status, str) or status.strip().lower() not in STATUS_VALUES:
+        errors['status'] = ["Status must be: online, offline, or error."]
+    else:
+        row['status'] = status.strip().lower()
+
+    return (None, errors) if errors else (row, None)
+
+
+# -------------------------------
+#  Query Builder
+# -------------------------------
+def _substring_filter(value, columns):
+    """Case-insensitive substring match on `columns`: the FTS5 index when possible, else ILIKE."""
+    if uses_search_index(db.session, value):
+        return Device.id.in_(matching_ids(value, columns))
+    return or_(*(getattr(Device, name).ilike(f'%{value.strip()}%') for name in columns))
+
+
+def build_device_query(user_id, search_id=None, location=None, status=None, search=None):
+    """Filtered device listing query; shared with the query-plan checks."""
+    query = Device.query.filter_by(user_id=user_id, deleted_at=None)
+
+    if search_id:
+        query = query.filter(Device.id == int(search_id))
+    if search:
+        query = query.filter(_substring_filter(search, SEARCH_COLUMNS))
+    if location:
+        query = query.filter(_substring_filter(location, ('location',)))
+    if status:
+        # Exact value, so the (user_id, status) index applies
+        query = query.filter(Device.status == status.strip().lower())
+
+    return query
+
+
 # -------------------------------
 #  List Devices (with filters)
 # -------------------------------
 @device_bp.route('/home')
 @jwt_required()
+@conditional_get(clock_dependent=True)  # "Last Hour" sparklines move with the clock
 def list_devices():
     try:
         user_id = get_jwt_identity()
         search_id = request.args.get('id')
         location = request.args.get('location')
         status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
+        search = request.args.get('q')
+        cursor = request.args.get('cursor')
 
-        query = Device.query.filter_by(user_id=user_id)
+        def render_table():
+            query = build_device_query(user_id, search_id, location, status, search)
+            pagination = keyset_paginate(query, Device.id, Device.id, per_page=5, cursor=cursor)
+            if request.args.get('count'):
+                pagination.total = query.order_by(None).count()
 
-        if search_id:
-            query = query.filter(Device.id == int(search_id))
-        if location:
-            query = query.filter(Device.location.ilike(f'%{location}%'))
-        if status:
-            query = query.filter(Device.status.ilike(f'%{status}%'))
+            # Latest reading and last-hour trend from the in-process store (no per-device queries)
+            hot = hot_store().windows([device.id for device in pagination.items])
+            return render_template('_device_table.html', devices=pagination.items, hot=hot,
+                                   pagination=pagination, request=request)
 
-        pagination = query.paginate(page=page, per_page=5, error_out=False)
+        # Rows are re-rendered only after this user's data changes (or the cache TTL passes)
+        device_table = cached_fragment('devices', user_id, render_table)
 
-        return render_template('devices.html', devices=pagination.items, pagination=pagination, request=request)
+        # Devices still being purged; resume the purge if no thread in this process is running it
+        deleting = deletion_progress(user_id)
+        if deleting:
+            start_purger(current_app._get_current_object())
+
+        return render_template('devices.html', device_table=device_table, deleting=deleting, request=request)
 
     except Exception as e:
         current_app.logger.error("Device listing failed: %s", str(e))
@@ -89,7 +178,10 @@ def add_device():
                 user_id=user_id
             )
             db.session.add(device)
+            touch_data_versions(user_ids={user_id})
             db.session.commit()
+            invalidate_owner(user_id)
+            devices_changed.send(current_app._get_current_object(), user_ids={int(user_id)})
 
             flash('Device added successfully!', 'success')
             return redirect(url_for('device.list_devices'))
@@ -109,7 +201,7 @@ def add_device():
 @jwt_required()
 def update_device(id):
     user_id = get_jwt_identity()
-    device = Device.query.get_or_404(id)
+    device = Device.query.filter_by(id=id, deleted_at=None).first_or_404()
 
     if int(device.user_id) != int(user_id):
         flash("Unauthorized access to this device.", "danger")
@@ -131,7 +223,9 @@ def update_device(id):
             device.location = location
             device.device_type = device_type
             device.status = status.lower()
+            touch_data_versions(user_ids={user_id})
             db.session.commit()
+            devices_changed.send(current_app._get_current_object(), user_ids={int(user_id)})
 
             flash('Device updated successfully!', 'success')
             return redirect(url_for('device.list_devices'))
@@ -145,24 +239,23 @@ def update_device(id):
 
 
 # -------------------------------
-#  Delete Device (with diagnostics)
+#  Delete Device (diagnostics purged in background)
 # -------------------------------
 @device_bp.route('/delete/<int:id>')
 @jwt_required()
 def delete_device(id):
     user_id = get_jwt_identity()
-    device = Device.query.get_or_404(id)
+    device = Device.query.filter_by(id=id, deleted_at=None).first_or_404()
 
     if int(device.user_id) != int(user_id):
         flash("Unauthorized to delete this device.", "danger")
         return redirect(url_for('device.list_devices'))
 
     try:
-        DeviceDiagnostics.query.filter_by(device_id=device.id).delete()
-        db.session.delete(device)
-        db.session.commit()
+        # Hidden at once; its diagnostics are deleted in the background (progress on the device list)
+        mark_deleted(device)
 
-        flash('Device and its diagnostics deleted successfully!', 'success')
+        flash('Device deleted. Its diagnostics are being removed in the background.', 'success')
 
     except Exception as e:
         db.session.rollback()
@@ -172,6 +265,159 @@ def delete_device(id):
     return redirect(url_for('device.list_devices'))
 
 
+# -------------------------------
+#  Bulk Import (CSV / NDJSON)
+# -------------------------------
+ImportResult = namedtuple('ImportResult', 'inserted rejected errors')
+
+
+class ImportTooLarge(ValueError):
+    """More rows than the limit. The batches committed before it was reached are kept."""
+
+    def __init__(self, message, inserted=0):
+        super().__init__(message)
+        self.inserted = inserted
+
+
+def import_format(mimetype, filename=None, requested=None):
+    """'csv' or 'ndjson', from an explicit ?format=, the content type, or the file extension."""
+    if requested:
+        if requested not in ('csv', 'ndjson'):
+            raise ValueError("Format must be csv or ndjson.")
+        return requested
+    if mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_device_rows(stream, fmt):
+    """
+    Yield (line, row, errors) for each record of a binary stream, validating as
+    it reads so the file is never held in memory. A CSV file must have a header
+    with the name, device_type, location and status columns.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = [field for field in ('name', 'device_type', 'location', 'status')
+                   if field not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}.")
+        for record in reader:
+            yield (reader.line_num, *validate_device_row(record))
+        return
+
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            yield line, None, {"row": ["Not valid JSON."]}
+            continue
+        yield (line, *validate_device_row(record))
+
+
+def _insert_batch(user_id, batch):
+    # One short write transaction per batch, so other writers get in between
+    with bulk_insert_indexing(db.session):
+        db.session.execute(Device.__table__.insert(), batch)
+    touch_data_versions(user_ids={user_id})
+    db.session.commit()
+
+
+def import_devices(user_id, rows, batch_size=1000, max_rows=None, dry_run=False, max_errors=None):
+    """
+    Insert the valid rows of iter_device_rows() for a user, batch_size rows per
+    Core executemany (no per-row ORM bookkeeping) and commit. A failure, or a
+    file over max_rows, keeps the batches committed before it. Invalid rows are
+    counted, not raised, and the first max_errors of them are returned with
+    their line. Returns ImportResult(inserted, rejected, errors).
+    """
+    user_id = int(user_id)
+    inserted, rejected, errors, batch = 0, 0, [], []
+    try:
+        for count, (line, row, row_errors) in enumerate(rows, 1):
+            if max_rows and count > max_rows:
+                raise ImportTooLarge(f"Import too large: more than {max_rows} rows.", inserted)
+            if row_errors:
+                rejected += 1
+                if max_errors is None or len(errors) < max_errors:
+                    errors.append({"line": line, "errors": row_errors})
+                continue
+            row['user_id'] = user_id
+            batch.append(row)
+            if len(batch) >= batch_size:
+                if not dry_run:
+                    _insert_batch(user_id, batch)
+                inserted += len(batch)
+                batch = []
+        if batch and not dry_run:
+            _insert_batch(user_id, batch)
+        inserted += len(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if inserted and not dry_run:
+            invalidate_owner(user_id)
+            devices_changed.send(current_app._get_current_object(), user_ids={user_id})
+    return ImportResult(inserted, rejected, errors)
+
+
+@device_bp.route('/import', methods=['GET', 'POST'])
+@jwt_required()
+def import_devices_route():
+    if request.method == 'GET':
+        return render_template('import_devices.html')
+
+    user_id = get_jwt_identity()
+    upload = request.files.get('file')
+    batch_size = current_app.config['DEVICE_IMPORT_BATCH_SIZE']
+    max_rows = current_app.config['DEVICE_IMPORT_MAX_ROWS']
+    max_errors = current_app.config['DEVICE_IMPORT_MAX_ERRORS']
+
+    # Form upload: summary page. Raw CSV / NDJSON body: JSON, like the diagnostics batch
+    if upload is not None:
+        try:
+            fmt = import_format(upload.mimetype, upload.filename, request.form.get('format') or None)
+            result = import_devices(user_id, iter_device_rows(upload.stream, fmt), batch_size, max_rows,
+                                    max_errors=max_errors)
+        except ImportTooLarge as e:
+            flash(f"{e} The first {e.inserted} devices were imported.", "danger")
+            return redirect(url_for('device.import_devices_route'))
+        except (ValueError, csv.Error) as e:
+            flash(str(e), "danger")
+            return redirect(url_for('device.import_devices_route'))
+        except Exception as e:
+            current_app.logger.error("Device import error: %s", str(e))
+            flash("Error importing devices.", "danger")
+            return redirect(url_for('device.import_devices_route'))
+
+        flash(f"Imported {result.inserted} devices, rejected {result.rejected} rows.",
+              "success" if result.inserted else "warning")
+        return render_template('import_devices.html', inserted=result.inserted, rejected=result.rejected,
+                               errors=result.errors, shown_errors=result.errors[:200])
+
+    try:
+        fmt = import_format(request.mimetype, requested=request.args.get('format'))
+        result = import_devices(user_id, iter_device_rows(request.stream, fmt), batch_size, max_rows,
+                                max_errors=max_errors)
+    except ImportTooLarge as e:
+        return jsonify(error=str(e), inserted=e.inserted), 413
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify(error=f"Malformed import body: {e}"), 400
+    except Exception as e:
+        current_app.logger.error("Device import error: %s", str(e))
+        return jsonify(error="Error importing devices."), 500
+
+    status = 201 if result.inserted else 422
+    return jsonify(inserted=result.inserted, rejected=result.rejected, errors=result.errors), status
+
+
 # -------------------------------
 #  Catch-All for /devices/*
 # -------------------------------
@@ -1,35 +1,219 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+import csv
+import io
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify,
+    Response, stream_with_context
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import insert, select
 from app.models import DeviceDiagnostics, Device, db
+from app import archive, rollups, stats
+from app.cache import cached_fragment
+from app.conditional import conditional_get, touch_data_versions
+from app.live import TooManySubscribers, live_feed
+from app.ownership import live_device_ids, owned_device_ids, owns_device
+from app.pagination import keyset_paginate
+from app.signals import diagnostics_added, diagnostics_changed
+from app.writebehind import QueueFull, write_behind
 
 diagnostics_bp = Blueprint('diagnostics', __name__, url_prefix='/diagnostics')
 
 
+# -------------------------------
+#  Batch Validation Helpers
+# -------------------------------
+def _parse_usage(value, maximum=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("Not a valid number.")
+    try:
+        number = float(value)
+    except (ValueError, OverflowError):
+        # OverflowError: an integer beyond the float range
+        raise ValueError("Not a valid number.")
+    if not math.isfinite(number) or number < 0:
+        raise ValueError("Must be a non-negative number.")
+    if maximum is not None and number > maximum:
+        raise ValueError(f"Must be at most {maximum}.")
+    return number
+
+
+def _form_usage():
+    """(cpu_usage, memory_usage) of the submitted form, validated like batch samples."""
+    values = []
+    for field, label, maximum in (('cpu_usage', 'CPU usage', 100.0), ('memory_usage', 'Memory usage', None)):
+        try:
+            values.append(_parse_usage(request.form.get(field), maximum))
+        except ValueError as e:
+            raise ValueError(f"{label}: {e}")
+    return values
+
+
+def _parse_timestamp(value):
+    """ISO 8601 string -> naive UTC datetime (the format stored by the model)."""
+    if not isinstance(value, str):
+        raise ValueError("Not a valid datetime.")
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        try:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        except OverflowError:
+            # An offset that moves the time past year 1 or 9999
+            raise ValueError(f"Invalid isoformat string: {value!r}")
+    return parsed
+
+
+def validate_diagnostic_sample(sample, default_timestamp):
+    """
+    Validate one batch sample without building an ORM object.
+    Returns (row, errors); errors uses the same {field: [messages]} shape as
+    DeviceDiagnosticsSchema so clients get identical error payloads.
+    """
+    if sample is _MALFORMED_LINE:
+        return None, {"_schema": ["Not valid JSON."]}
+    if not isinstance(sample, dict):
+        return None, {"_schema": ["Invalid input type."]}
+
+    row, errors = {}, {}
+
+    device_id = sample.get('device_id')
+    if device_id is None:
+        errors['device_id'] = ["Missing data for required field."]
+    elif isinstance(device_id, bool) or not isinstance(device_id, (int, str)):
+        errors['device_id'] = ["Not a valid integer."]
+    else:
+        try:
+            row['device_id'] = int(device_id)
+        except ValueError:
+            errors['device_id'] = ["Not a valid integer."]
+
+    for field, maximum in (('cpu_usage', 100.0), ('memory_usage', None)):
+        if sample.get(field) is None:
+            errors[field] = ["Missing data for required field."]
+            continue
+        try:
+            row[field] = _parse_usage(sample[field], maximum)
+        except ValueError as e:
+            errors[field] = [str(e)]
+
+    timestamp = sample.get('timestamp')
+    if timestamp is None:
+        row['timestamp'] = default_timestamp
+    else:
+        try:
+            row['timestamp'] = _parse_timestamp(timestamp)
+        except ValueError:
+            errors['timestamp'] = ["Not a valid datetime."]
+
+    return (None, errors) if errors else (row, None)
+
+
+# Stands in for an NDJSON line that is not JSON, so it is rejected on its own
+_MALFORMED_LINE = object()
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _MALFORMED_LINE
+
+
+def _read_batch_body():
+    """Parse the request body as a JSON array / {"samples": [...]} or as NDJSON."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [_parse_line(line) for line in lines if line.strip()]
+
+    payload = request.get_json(force=True, silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('samples')
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of samples.")
+    return payload
+
+
+# -------------------------------
+#  Query Builders
+# -------------------------------
+def build_diagnostics_query(device_ids, sort_by='timestamp'):
+    """Raw diagnostics listing query; shared with the query-plan checks."""
+    return (
+        DeviceDiagnostics.query
+        .filter(DeviceDiagnostics.device_id.in_(device_ids))
+        .order_by(getattr(DeviceDiagnostics, sort_by).asc())
+    )
+
+
+def build_rollup_query(resolution, device_ids, start, sort_by='timestamp'):
+    """Rollup listing query for one resolution; shared with the query-plan checks."""
+    model = rollups.RESOLUTIONS[resolution].model
+    sort_column = {'timestamp': model.bucket, 'cpu_usage': model.cpu_max, 'memory_usage': model.memory_max}[sort_by]
+    # Walks the (bucket, device_id) primary key in bucket order. "+ 0" keeps SQLite off the
+    # per-device (device_id, bucket) index, which reads each device in turn and sorts every page.
+    return model.query.filter(
+        (model.device_id + 0).in_(device_ids), model.bucket >= rollups.bucket_start(start, resolution)
+    ).order_by(sort_column.asc())
+
+
 # -------------------------------
 #  List Diagnostics
 # -------------------------------
 @diagnostics_bp.route('/home')
 @jwt_required()
+@conditional_get(clock_dependent=lambda: request.args.get('resolution', 'raw') != 'raw')
 def list_diagnostics():
     try:
         user_id = get_jwt_identity()
         sort_by = request.args.get('sort', 'timestamp')
         page = request.args.get('page', 1, type=int)
         search_id = request.args.get('id')
+        resolution = request.args.get('resolution', 'raw')
+        days = request.args.get('days', 30, type=int)
 
         if sort_by not in ['cpu_usage', 'memory_usage', 'timestamp']:
             sort_by = 'timestamp'
+        if resolution not in rollups.RESOLUTIONS and resolution != 'auto':
+            resolution = 'raw'
+
+        start = datetime.utcnow() - timedelta(days=days)
+        if resolution == 'auto':
+            resolution = rollups.choose_resolution(start, None)
+
+        def render_table():
+            user_device_ids = sorted(owned_device_ids(user_id))
+            if search_id:
+                user_device_ids = [i for i in user_device_ids if i == int(search_id)]
+
+            if resolution != 'raw':
+                # Aggregated history: read the rollup table for the window instead of raw rows
+                rollup_query = build_rollup_query(resolution, user_device_ids, start, sort_by)
+                pagination = rollup_query.paginate(page=page, per_page=5, error_out=False)
+                return render_template('_diagnostics_table.html', rollup_rows=pagination.items,
+                                       resolution=resolution, pagination=pagination, request=request)
+
+            # One index seek per device, merged: never a sort of the user's whole history
+            pagination = keyset_paginate(
+                DeviceDiagnostics.query, getattr(DeviceDiagnostics, sort_by), DeviceDiagnostics.id,
+                per_page=5, cursor=request.args.get('cursor'),
+                partition_column=DeviceDiagnostics.device_id,
+                partitions=select(Device.id).where(Device.id.in_(user_device_ids))
+            )
+            if request.args.get('count'):
+                pagination.total = build_diagnostics_query(user_device_ids, sort_by).order_by(None).count()
+            else:
+                pagination.total = rollups.estimated_count(user_device_ids)
+                pagination.total_is_estimate = True
 
-        user_device_ids = [d.id for d in Device.query.filter_by(user_id=user_id)]
-        diagnostics_query = DeviceDiagnostics.query.filter(DeviceDiagnostics.device_id.in_(user_device_ids))
-
-        if search_id:
-            diagnostics_query = diagnostics_query.filter(DeviceDiagnostics.device_id == int(search_id))
-
-        diagnostics_query = diagnostics_query.order_by(getattr(DeviceDiagnostics, sort_by).asc())
-        pagination = diagnostics_query.paginate(page=page, per_page=5, error_out=False)
+            return render_template('_diagnostics_table.html', diagnostics=pagination.items, resolution='raw',
+                                   pagination=pagination, request=request)
 
-        return render_template('diagnostics.html', diagnostics=pagination.items, pagination=pagination, request=request)
+        # Rows are re-rendered only after this user's data changes (or the cache TTL passes)
+        diagnostics_table = cached_fragment('diagnostics', user_id, render_table)
+        return render_template('diagnostics.html', diagnostics_table=diagnostics_table, resolution=resolution,
+                               request=request)
 
     except Exception as e:
         current_app.logger.error("Error listing diagnostics: %s", str(e))
@@ -37,6 +221,35 @@ def list_diagnostics():
         return redirect(url_for('main.home'))
 
 
+# -------------------------------
+#  Live Stream (Server-Sent Events)
+# -------------------------------
+@diagnostics_bp.route('/stream')
+@jwt_required()
+def stream_diagnostics():
+    user_id = get_jwt_identity()
+    feed = live_feed()
+
+    try:
+        subscription = feed.subscribe(user_id)
+    except TooManySubscribers as e:
+        response = jsonify(error=f"{e} Retry later.")
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    # Holds a worker thread for as long as the page is open
+    events = feed.stream(
+        subscription,
+        keepalive=current_app.config['LIVE_FEED_KEEPALIVE'],
+        max_seconds=current_app.config['LIVE_FEED_MAX_SECONDS'],
+    )
+    response = Response(events, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also covers a client that disconnects before the first event is sent
+    response.call_on_close(lambda: feed.unsubscribe(subscription))
+    return response
+
+
 # -------------------------------
 #  Add Diagnostic
 # -------------------------------
@@ -45,33 +258,45 @@ def list_diagnostics():
 def add_diagnostics():
     try:
         user_id = get_jwt_identity()
-        devices = Device.query.filter_by(user_id=user_id).all()
 
-        if not devices:
+        if not owned_device_ids(user_id):
             flash("Please add a device before adding diagnostics.", "warning")
             return redirect(url_for('device.add_device'))
 
         if request.method == 'POST':
             device_id = request.form.get('device_id')
-            cpu_usage = request.form.get('cpu_usage')
-            memory_usage = request.form.get('memory_usage')
 
-            device = Device.query.filter_by(id=device_id, user_id=user_id).first()
-            if not device:
+            if not owns_device(user_id, device_id) or not live_device_ids({int(device_id)}):
                 flash("Invalid device selection.", "danger")
                 return redirect(url_for('diagnostics.add_diagnostics'))
+            try:
+                cpu_usage, memory_usage = _form_usage()
+            except ValueError as e:
+                flash(str(e), "danger")
+                return redirect(url_for('diagnostics.add_diagnostics'))
 
             diagnostic = DeviceDiagnostics(
-                device_id=device.id,
+                device_id=int(device_id),
                 cpu_usage=cpu_usage,
-                memory_usage=memory_usage
+                memory_usage=memory_usage,
+                timestamp=datetime.utcnow()
             )
+            sample = {
+                'device_id': diagnostic.device_id,
+                'cpu_usage': diagnostic.cpu_usage,
+                'memory_usage': diagnostic.memory_usage,
+                'timestamp': diagnostic.timestamp,
+            }
             db.session.add(diagnostic)
+            rollups.apply_samples([sample])
+            touch_data_versions(user_ids={user_id})
             db.session.commit()
+            diagnostics_added.send(current_app._get_current_object(), rows=[sample])
 
             flash('Diagnostic added successfully!', 'success')
             return redirect(url_for('diagnostics.list_diagnostics'))
 
+        devices = Device.query.filter_by(user_id=user_id, deleted_at=None).all()
         return render_template('add_diagnostics.html', devices=devices)
 
     except Exception as e:
@@ -81,6 +306,79 @@ def add_diagnostics():
         return redirect(url_for('diagnostics.add_diagnostics'))
 
 
+# -------------------------------
+#  Batch Ingest (JSON / NDJSON)
+# -------------------------------
+@diagnostics_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def ingest_diagnostics_batch():
+    user_id = get_jwt_identity()
+
+    try:
+        samples = _read_batch_body()
+    except ValueError as e:
+        return jsonify(error=f"Malformed batch body: {e}"), 400
+
+    max_rows = current_app.config['DIAGNOSTICS_BATCH_MAX_ROWS']
+    if len(samples) > max_rows:
+        return jsonify(error=f"Batch too large: {len(samples)} samples (max {max_rows})."), 413
+
+    now = datetime.utcnow()
+    rows, indexes, errors = [], [], []
+    for index, sample in enumerate(samples):
+        row, row_errors = validate_diagnostic_sample(sample, now)
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+        else:
+            rows.append(row)
+            indexes.append(index)
+
+    try:
+        # At most one ownership query per batch (none when the ids are cached), and one
+        # primary-key lookup of the requested devices
+        requested_ids = {row['device_id'] for row in rows}
+        owned_ids = owned_device_ids(user_id)
+        if not requested_ids <= owned_ids:
+            owned_ids = owned_device_ids(user_id, refresh=True)
+        # The cache may still list a device another worker soft-deleted since
+        owned_ids = live_device_ids(requested_ids & owned_ids)
+
+        accepted = []
+        for index, row in zip(indexes, rows):
+            if row['device_id'] in owned_ids:
+                accepted.append(row)
+            else:
+                errors.append({"index": index, "errors": {"device_id": ["Invalid device selection."]}})
+
+        queue = write_behind()
+        if accepted and queue is not None:
+            # Written by the background flusher with other requests' rows
+            queue.submit(accepted)
+        elif accepted:
+            db.session.execute(insert(DeviceDiagnostics), accepted)
+            rollups.apply_samples(accepted)
+            touch_data_versions(user_ids={user_id})
+            db.session.commit()
+            diagnostics_added.send(current_app._get_current_object(), rows=accepted)
+
+    except QueueFull as e:
+        response = jsonify(error=f"{e} Retry later.")
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Error ingesting diagnostics batch: %s", str(e))
+        return jsonify(error="Error ingesting diagnostics batch."), 500
+
+    errors.sort(key=lambda error: error['index'])
+    if not accepted:
+        return jsonify(inserted=0, rejected=len(errors), errors=errors), 422
+    if queue is not None:
+        return jsonify(queued=len(accepted), rejected=len(errors), errors=errors), 202
+    return jsonify(inserted=len(accepted), rejected=len(errors), errors=errors), 201
+
+
 # -------------------------------
 #  Update Diagnostic
 # -------------------------------
@@ -91,33 +389,37 @@ def update_diagnostics(id):
         user_id = get_jwt_identity()
         diagnostic = DeviceDiagnostics.query.get_or_404(id)
 
-        device = Device.query.filter_by(id=diagnostic.device_id, user_id=user_id).first()
-        if not device:
-            user_device_ids = [d.id for d in Device.query.filter_by(user_id=user_id)]
-            if diagnostic.device_id not in user_device_ids:
-                flash("Unauthorized access to this diagnostic.", "danger")
-                return redirect(url_for('diagnostics.list_diagnostics'))
-
-        devices = Device.query.filter_by(user_id=user_id).all()
+        if not owns_device(user_id, diagnostic.device_id):
+            flash("Unauthorized access to this diagnostic.", "danger")
+            return redirect(url_for('diagnostics.list_diagnostics'))
 
         if request.method == 'POST':
             new_device_id = request.form.get('device_id')
-            cpu_usage = request.form.get('cpu_usage')
-            memory_usage = request.form.get('memory_usage')
 
-            new_device = Device.query.filter_by(id=new_device_id, user_id=user_id).first()
-            if not new_device:
+            if not owns_device(user_id, new_device_id) or not live_device_ids({int(new_device_id)}):
                 flash("Invalid device_id selection.", "danger")
                 return redirect(url_for('diagnostics.update_diagnostics', id=id))
+            try:
+                cpu_usage, memory_usage = _form_usage()
+            except ValueError as e:
+                flash(str(e), "danger")
+                return redirect(url_for('diagnostics.update_diagnostics', id=id))
 
-            diagnostic.device_id = new_device.id
+            new_device_id = int(new_device_id)
+            touched = [(diagnostic.device_id, diagnostic.timestamp), (new_device_id, diagnostic.timestamp)]
+            diagnostic.device_id = new_device_id
             diagnostic.cpu_usage = cpu_usage
             diagnostic.memory_usage = memory_usage
+            db.session.flush()
+            rollups.refresh_buckets(touched)
+            touch_data_versions(user_ids={user_id})
             db.session.commit()
+            diagnostics_changed.send(current_app._get_current_object(), device_ids={d for d, _ in touched})
 
             flash('Diagnostic updated successfully!', 'success')
             return redirect(url_for('diagnostics.list_diagnostics'))
 
+        devices = Device.query.filter_by(user_id=user_id, deleted_at=None).all()
         return render_template('update_diagnostics.html', diagnostic=diagnostic, devices=devices)
 
     except Exception as e:
@@ -137,15 +439,17 @@ def delete_diagnostics(id):
         user_id = get_jwt_identity()
         diagnostic = DeviceDiagnostics.query.get_or_404(id)
 
-        device = Device.query.filter_by(id=diagnostic.device_id, user_id=user_id).first()
-        if not device:
-            user_device_ids = [d.id for d in Device.query.filter_by(user_id=user_id)]
-            if diagnostic.device_id not in user_device_ids:
-                flash("Unauthorized access to delete.", "danger")
-                return redirect(url_for('diagnostics.list_diagnostics'))
+        if not owns_device(user_id, diagnostic.device_id):
+            flash("Unauthorized access to delete.", "danger")
+            return redirect(url_for('diagnostics.list_diagnostics'))
 
+        touched = [(diagnostic.device_id, diagnostic.timestamp)]
         db.session.delete(diagnostic)
+        db.session.flush()
+        rollups.refresh_buckets(touched)
+        touch_data_versions(user_ids={user_id})
         db.session.commit()
+        diagnostics_changed.send(current_app._get_current_object(), device_ids={diagnostic.device_id})
 
         flash('Diagnostic deleted successfully!', 'success')
         return redirect(url_for('diagnostics.list_diagnostics'))
@@ -157,6 +461,147 @@ def delete_diagnostics(id):
         return redirect(url_for('diagnostics.list_diagnostics'))
 
 
+# -------------------------------
+#  Window Statistics (JSON)
+# -------------------------------
+@diagnostics_bp.route('/stats')
+@jwt_required()
+@conditional_get(clock_dependent=lambda: not request.args.get('end'))
+def diagnostics_stats():
+    """avg/min/max/p50/p95/p99 of cpu and memory per device over ?window=24h or ?start=&end=."""
+    user_id = get_jwt_identity()
+    device_id = request.args.get('device_id', type=int)
+
+    try:
+        end = _parse_timestamp(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        if request.args.get('start'):
+            start = _parse_timestamp(request.args['start'])
+        else:
+            start = end - stats.parse_window(request.args.get('window', '24h'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except OverflowError:
+        return jsonify(error="The window starts before the earliest supported date."), 400
+    if start >= end:
+        return jsonify(error="start must be before end."), 400
+
+    device_ids = sorted(owned_device_ids(user_id))
+    if device_id is not None:
+        if not owns_device(user_id, device_id):
+            return jsonify(error="Invalid device selection."), 404
+        device_ids = [device_id]
+
+    try:
+        devices = stats.window_stats(device_ids, start, end)
+    except Exception as e:
+        current_app.logger.error("Error computing diagnostics stats: %s", str(e))
+        return jsonify(error="Error computing diagnostics stats."), 500
+
+    return jsonify(start=start.isoformat(), end=end.isoformat(), devices=devices)
+
+
+# -------------------------------
+#  Streaming Export (CSV / NDJSON)
+# -------------------------------
+EXPORT_COLUMNS = ('id', 'device_id', 'cpu_usage', 'memory_usage', 'timestamp')
+
+
+def _export_rows(device_ids, start, end, chunk_size):
+    """
+    Yield (id, device_id, cpu, mem, timestamp) tuples one device at a time, in
+    timestamp order. Each device is a range scan on (device_id, timestamp), so
+    no sort is needed and rows are fetched from the cursor chunk_size at a time.
+    Archived months come first, read from their partition files (without ids).
+    """
+    archived = bool(archive.archive_dir())
+    for device_id in device_ids:
+        live_start = start
+        if archived:
+            yield from archive.archived_rows(device_id, start, end, chunk_size)
+            device_horizon = archive.horizon(device_id)
+            if device_horizon is not None and (start is None or device_horizon > start):
+                live_start = device_horizon
+
+        stmt = select(*(getattr(DeviceDiagnostics, c) for c in EXPORT_COLUMNS)).where(
+            DeviceDiagnostics.device_id == device_id
+        )
+        if live_start is not None:
+            stmt = stmt.where(DeviceDiagnostics.timestamp >= live_start)
+        if end is not None:
+            stmt = stmt.where(DeviceDiagnostics.timestamp < end)
+        stmt = stmt.order_by(DeviceDiagnostics.timestamp, DeviceDiagnostics.id)
+
+        result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield partition
+
+
+def _format_csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (row_id, device_id, cpu, mem, ts.isoformat() if ts else '')
+            for row_id, device_id, cpu, mem, ts in rows
+        )
+        yield buffer.getvalue()
+
+
+def _format_ndjson(partitions):
+    for rows in partitions:
+        yield ''.join(
+            json.dumps({
+                'id': row_id, 'device_id': device_id, 'cpu_usage': cpu, 'memory_usage': mem,
+                'timestamp': ts.isoformat() if ts else None,
+            }, separators=(',', ':')) + '\n'
+            for row_id, device_id, cpu, mem, ts in rows
+        )
+
+
+@diagnostics_bp.route('/export')
+@jwt_required()
+@conditional_get()
+def export_diagnostics():
+    user_id = get_jwt_identity()
+    export_format = request.args.get('format', 'csv')
+    device_id = request.args.get('device_id', type=int)
+
+    try:
+        start = _parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = _parse_timestamp(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        flash("Invalid export time range. Use ISO 8601 timestamps.", "danger")
+        return redirect(url_for('diagnostics.list_diagnostics'))
+
+    if export_format not in ('csv', 'ndjson'):
+        flash("Export format must be csv or ndjson.", "danger")
+        return redirect(url_for('diagnostics.list_diagnostics'))
+
+    device_ids = sorted(owned_device_ids(user_id))
+    if device_id is not None:
+        if not owns_device(user_id, device_id):
+            flash("Invalid device selection.", "danger")
+            return redirect(url_for('diagnostics.list_diagnostics'))
+        device_ids = [device_id]
+
+    partitions = _export_rows(device_ids, start, end, current_app.config['DIAGNOSTICS_EXPORT_CHUNK_SIZE'])
+    if export_format == 'csv':
+        body, mimetype = _format_csv(partitions), 'text/csv'
+    else:
+        body, mimetype = _format_ndjson(partitions), 'application/x-ndjson'
+
+    filename = f"diagnostics.{export_format}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
 # -------------------------------
 #  Catch-All for /diagnostics/*
 # -------------------------------
@@ -34,4 +34,4 @@ class DeviceDiagnosticsSchema(SQLAlchemyAutoSchema):
     device_id = fields.Int(required=True)
     cpu_usage = fields.Float(required=True)
     memory_usage = fields.Float(required=True)
-    timestamp = fields.DateTime(allow_none=True, missing=None)
+    timestamp = fields.DateTime(allow_none=True, load_default=None)
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from sqlalchemy import column, literal_column, select, table
+
+# SQLite FTS5 index over device name / location / device_type, using the trigram
+# tokenizer so any substring of 3+ characters is an index lookup instead of a
+# '%...%' scan. It is an external-content table (it stores only the index, the
+# text stays in `device`), kept in sync by the triggers below.
+SEARCH_TABLE = 'device_search'
+SEARCH_COLUMNS = ('name', 'location', 'device_type')
+MIN_QUERY_LENGTH = 3  # Shorter strings have no trigram; those fall back to ILIKE
+
+SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS device_search USING fts5(
+        name, location, device_type, content='device', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS device_search_ai AFTER INSERT ON device BEGIN
+        INSERT INTO device_search(rowid, name, location, device_type)
+        VALUES (new.id, new.name, new.location, new.device_type);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS device_search_ad AFTER DELETE ON device BEGIN
+        INSERT INTO device_search(device_search, rowid, name, location, device_type)
+        VALUES ('delete', old.id, old.name, old.location, old.device_type);
+    END""",
+    # Only the indexed columns: soft delete and purge progress updates leave the index alone
+    """CREATE TRIGGER IF NOT EXISTS device_search_au AFTER UPDATE OF name, location, device_type ON device BEGIN
+        INSERT INTO device_search(device_search, rowid, name, location, device_type)
+        VALUES ('delete', old.id, old.name, old.location, old.device_type);
+        INSERT INTO device_search(rowid, name, location, device_type)
+        VALUES (new.id, new.name, new.location, new.device_type);
+    END""",
+)
+
+_search = table(SEARCH_TABLE, column('rowid'))
+
+
+# ----------------------
+# Index Maintenance
+# ----------------------
+def install_search_index(connection, rebuild=False):
+    """Create the index and its triggers if missing (SQLite only). `rebuild` re-reads every device."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        connection.exec_driver_sql("INSERT INTO device_search(device_search) VALUES ('rebuild')")
+    return True
+
+
+def create_search_index(target, connection, **kwargs):
+    """after_create listener for the device table (`flask init-db` / create_all)."""
+    install_search_index(connection)
+
+
+@contextmanager
+def bulk_insert_indexing(session):
+    """
+    Index devices inserted inside this block with one INSERT ... SELECT instead of
+    the per-row trigger, which is several times slower for large imports. The
+    trigger is dropped and recreated inside the caller's transaction (SQLite DDL
+    is transactional), so other connections never see it missing. Relies on new
+    ids being above the current max(id), which holds for INTEGER PRIMARY KEY.
+    """
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite' or not connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'device_search_ai'"
+    ).scalar():
+        yield
+        return
+
+    # pysqlite only opens a transaction before DML; take the write lock now so the
+    # DROP TRIGGER is not autocommitted and max(id) cannot move under us
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    last_id = connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM device").scalar()
+    connection.exec_driver_sql("DROP TRIGGER device_search_ai")
+    yield
+    connection.exec_driver_sql(
+        "INSERT INTO device_search(rowid, name, location, device_type) "
+        "SELECT id, name, location, device_type FROM device WHERE id > ?", (last_id,)
+    )
+    connection.exec_driver_sql(SEARCH_DDL[1])
+
+
+# ----------------------
+# Queries
+# ----------------------
+def uses_search_index(session, value):
+    return session.get_bind().dialect.name == 'sqlite' and len(value.strip()) >= MIN_QUERY_LENGTH
+
+
+def match_query(value, columns=SEARCH_COLUMNS):
+    """FTS5 query for `value` as a literal substring of any of `columns`."""
+    phrase = '"' + value.strip().replace('"', '""') + '"'
+    return f"{{{' '.join(columns)}}} : {phrase}"
+
+
+def matching_ids(value, columns=SEARCH_COLUMNS):
+    """SELECT of device ids whose `columns` contain `value` (case-insensitive), through the index."""
+    return select(_search.c.rowid).where(literal_column(SEARCH_TABLE).op('MATCH')(match_query(value, columns)))
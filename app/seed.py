@@ -0,0 +1,99 @@
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+from app import rollups
+from app.models import Device, DeviceDiagnostics, User, db
+from app.search import bulk_insert_indexing
+
+SEED_PASSWORD = 'Seed-pass1!'
+DEVICE_TYPES = ('sensor', 'gateway', 'camera', 'thermostat', 'router')
+LOCATIONS = ('Lab A', 'Lab B', 'Warehouse', 'Office', 'Data Center', 'Roof')
+
+SeedResult = namedtuple('SeedResult', 'users devices diagnostics seconds')
+
+
+def seed_usernames(prefix, users):
+    return [f'{prefix}_{n:04d}' for n in range(1, users + 1)]
+
+
+# ----------------------
+# Synthetic Data
+# ----------------------
+def seed(users=10, devices=50, diagnostics=1000, random_seed=42, end=None, interval=60,
+         prefix='seed', password=SEED_PASSWORD, batch_size=10000):
+    """
+    Insert `users` users with `devices` devices each and `diagnostics` samples
+    per device, one every `interval` seconds up to `end` (default: the current
+    minute). The same random_seed and end always produce the same rows.
+    Everything is written with Core executemany in one transaction; the rollups are
+    rebuilt once at the end. All users share one password (hashed once).
+    """
+    started = time.perf_counter()
+    rng = random.Random(random_seed)
+    end = end or datetime.utcnow().replace(second=0, microsecond=0)
+    first_sample = end - timedelta(seconds=interval * (diagnostics - 1))
+    usernames = seed_usernames(prefix, users)
+
+    if db.session.execute(select(User.id).where(User.username.in_(usernames)).limit(1)).first():
+        raise ValueError(f"Users named {prefix}_NNNN already exist; use another prefix or a new database.")
+
+    password_hash = generate_password_hash(
+        password,
+        method=current_app.config['PASSWORD_HASH_METHOD'],
+        salt_length=current_app.config['PASSWORD_SALT_LENGTH'],
+    )
+    # The search index is filled once after the device inserts (see bulk_insert_indexing)
+    with bulk_insert_indexing(db.session):
+        db.session.execute(User.__table__.insert(), [
+            {'username': name, 'password': password_hash} for name in usernames
+        ])
+        user_ids = db.session.execute(
+            select(User.id).where(User.username.in_(usernames)).order_by(User.id)
+        ).scalars().all()
+
+        device_rows = []
+        for user_number, user_id in enumerate(user_ids, start=1):
+            for device_number in range(1, devices + 1):
+                device_rows.append({
+                    'name': f'{DEVICE_TYPES[device_number % len(DEVICE_TYPES)]}-{user_number}-{device_number}',
+                    'device_type': rng.choice(DEVICE_TYPES),
+                    'location': f'{rng.choice(LOCATIONS)} {rng.randint(1, 20)}',
+                    'status': 'online' if rng.random() < 0.8 else 'offline',
+                    'user_id': user_id,
+                })
+        for offset in range(0, len(device_rows), batch_size):
+            db.session.execute(Device.__table__.insert(), device_rows[offset:offset + batch_size])
+
+    device_ids = db.session.execute(
+        select(Device.id).where(Device.user_id.in_(user_ids)).order_by(Device.id)
+    ).scalars().all()
+
+    # A bounded random walk per device, so charts and percentiles look like real load.
+    # Core inserts skip the ORM bulk path's per-row bookkeeping.
+    diagnostics_insert = DeviceDiagnostics.__table__.insert()
+    batch, written = [], 0
+    step = timedelta(seconds=interval)
+    for device_id in device_ids:
+        cpu, memory = rng.uniform(5, 60), rng.uniform(100, 4000)
+        timestamp = first_sample
+        for _ in range(diagnostics):
+            cpu = min(100.0, max(0.0, cpu + rng.gauss(0, 4)))
+            memory = max(0.0, memory + rng.gauss(0, 40))
+            batch.append({'device_id': device_id, 'cpu_usage': round(cpu, 1),
+                          'memory_usage': round(memory, 1), 'timestamp': timestamp})
+            timestamp += step
+            if len(batch) >= batch_size:
+                db.session.execute(diagnostics_insert, batch)
+                written += len(batch)
+                batch = []
+    if batch:
+        db.session.execute(diagnostics_insert, batch)
+        written += len(batch)
+
+    # Commits the whole seed
+    rollups.backfill(device_ids=device_ids)
+    return SeedResult(len(user_ids), len(device_ids), written, time.perf_counter() - started)
@@ -0,0 +1,103 @@
+import json
+import math
+from json.encoder import encode_basestring_ascii
+
+# ----------------------
+# Precompiled Row Encoders
+# ----------------------
+# Each field is (name, kind, nullable). Kinds: int, float, str, datetime.
+_VALUE_EXPRESSIONS = {
+    'int': "{r[%d]!r}",
+    'float': "{_float(r[%d])}",
+    'str': "{_str(r[%d])}",
+    'datetime': '"{r[%d].isoformat()}"',
+}
+_NULLABLE_EXPRESSIONS = {
+    'int': "{_nullable_repr(r[%d])}",
+    'float': "{_nullable_float(r[%d])}",
+    'str': "{_nullable_str(r[%d])}",
+    'datetime': "{_nullable_isoformat(r[%d])}",
+}
+
+
+def _nullable_repr(value):
+    return 'null' if value is None else repr(value)
+
+
+def _float(value):
+    # repr() would write inf / nan, which are not JSON
+    return repr(value) if math.isfinite(value) else 'null'
+
+
+def _nullable_float(value):
+    return 'null' if value is None else _float(value)
+
+
+def _nullable_str(value):
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
+def _nullable_isoformat(value):
+    return 'null' if value is None else '"' + value.isoformat() + '"'
+
+
+class RowEncoder:
+    """
+    Turns row tuples (as returned by a column select, in `fields` order) into a
+    JSON array of objects. The per-row formatting is compiled once into a single
+    f-string, so encoding costs one string build per row: no dict, schema or
+    ORM object in between. Output is the same as json.dumps() of the dicts
+    with compact separators, except that non-finite floats are written as
+    null (json.dumps would write NaN / Infinity, which JSON does not allow).
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        parts = []
+        for index, (name, kind, nullable) in enumerate(self.fields):
+            expression = (_NULLABLE_EXPRESSIONS if nullable else _VALUE_EXPRESSIONS)[kind] % index
+            parts.append(encode_basestring_ascii(name).replace('{', '{{').replace('}', '}}') + ':' + expression)
+        source = (
+            "def encode_rows(rows):\n"
+            "    return '[' + ','.join([f'{{" + ','.join(parts) + "}}' for r in rows]) + ']'\n"
+        )
+        namespace = {
+            '_str': encode_basestring_ascii,
+            '_nullable_repr': _nullable_repr,
+            '_float': _float,
+            '_nullable_float': _nullable_float,
+            '_nullable_str': _nullable_str,
+            '_nullable_isoformat': _nullable_isoformat,
+        }
+        exec(compile(source, f"<RowEncoder {','.join(f[0] for f in self.fields)}>", 'exec'), namespace)
+        self.encode_rows = namespace['encode_rows']
+
+    @property
+    def names(self):
+        return tuple(field[0] for field in self.fields)
+
+
+def envelope(data_json, **meta):
+    """{"data": <pre-encoded array>, **meta} without decoding the array again."""
+    tail = ''.join(f',{json.dumps(key)}:{json.dumps(value)}' for key, value in meta.items())
+    return '{"data":' + data_json + tail + '}'
+
+
+# ----------------------
+# API Resources
+# ----------------------
+DEVICE_ENCODER = RowEncoder([
+    ('id', 'int', False),
+    ('name', 'str', False),
+    ('device_type', 'str', False),
+    ('status', 'str', False),
+    ('location', 'str', False),
+])
+
+DIAGNOSTIC_ENCODER = RowEncoder([
+    ('id', 'int', False),
+    ('device_id', 'int', False),
+    ('cpu_usage', 'float', False),
+    ('memory_usage', 'float', False),
+    ('timestamp', 'datetime', True),
+])
@@ -0,0 +1,16 @@
+from blinker import Namespace
+
+# Sent by the write paths after their transaction commits, with the Flask app as sender.
+_signals = Namespace()
+
+# New samples: rows=[{'device_id', 'cpu_usage', 'memory_usage', 'timestamp'}, ...]
+diagnostics_added = _signals.signal('diagnostics-added')
+
+# Existing samples edited or removed, or a device deleted: device_ids={...}
+diagnostics_changed = _signals.signal('diagnostics-changed')
+
+# Devices added, edited or deleted (including purge progress): user_ids={...}
+devices_changed = _signals.signal('devices-changed')
+
+# A user's data version moved (after any of the above): user_ids={...}
+user_data_changed = _signals.signal('user-data-changed')
@@ -0,0 +1,132 @@
+import re
+from datetime import timedelta
+from sqlalchemy import select
+from app import archive
+from app.models import DeviceDiagnostics, db
+
+PERCENTILES = (50, 95, 99)
+METRICS = ('cpu_usage', 'memory_usage')
+
+_WINDOW_PATTERN = re.compile(r'^\s*(\d{1,9})\s*([mhdw])\s*$')
+_WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+MAX_WINDOW = timedelta(weeks=520)
+
+
+def parse_window(value):
+    """
+    '90m', '24h', '7d' or '2w' as a timedelta, at most MAX_WINDOW. Raises
+    ValueError for anything else.
+    """
+    match = _WINDOW_PATTERN.match(value or '')
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid window {value!r}. Use e.g. 30m, 24h, 7d or 2w.")
+    try:
+        window = timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+    except OverflowError:
+        window = None
+    if window is None or window > MAX_WINDOW:
+        raise ValueError(f"Window {value!r} is too long (at most {MAX_WINDOW.days // 7}w).")
+    return window
+
+
+# ----------------------
+# Columnar Fetch
+# ----------------------
+def window_select(device_ids, start, end):
+    return select(DeviceDiagnostics.device_id, DeviceDiagnostics.cpu_usage, DeviceDiagnostics.memory_usage).where(
+        DeviceDiagnostics.device_id.in_(device_ids),
+        DeviceDiagnostics.timestamp >= start,
+        DeviceDiagnostics.timestamp < end,
+    )
+
+
+def _fetch_live(device_ids, start, end):
+    import numpy as np
+
+    cursor = db.session.connection().execute(window_select(device_ids, start, end)).cursor
+    try:
+        return np.fromiter(cursor, dtype=np.dtype((np.float64, 3)))
+    finally:
+        cursor.close()
+
+
+def fetch_columns(device_ids, start, end):
+    """
+    (device_id, cpu_usage, memory_usage) for the window as an (n, 3) float64 array.
+    Rows are read straight from the DBAPI cursor into NumPy, skipping ORM and Row
+    objects; the (device_id, timestamp) index serves the range. Samples before a
+    device's archive horizon come from its memory-mapped archive partitions.
+    """
+    import numpy as np
+
+    if not archive.archive_dir():
+        return _fetch_live(device_ids, start, end)
+
+    blocks = [archive.archived_columns(device_ids, start, end)]
+    for live_start, ids in archive.live_ranges(device_ids, start):
+        if live_start < end:
+            blocks.append(_fetch_live(ids, live_start, end))
+    return np.concatenate(blocks)
+
+
+# ----------------------
+# Grouped Aggregates
+# ----------------------
+def _group_percentiles(np, sorted_values, starts, counts, percentile):
+    # Linear interpolation between closest ranks, same as numpy.percentile's default
+    position = starts + (counts - 1) * (percentile / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, starts + counts - 1)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def grouped_stats(columns):
+    """
+    avg/min/max and PERCENTILES of each metric per device, from the output of
+    fetch_columns. Each metric is ordered within devices by one lexsort on
+    (device, value), after which every aggregate for every device is a
+    vectorized gather.
+    Returns {device_id: {'samples': n, 'cpu_usage': {...}, 'memory_usage': {...}}}.
+    """
+    import numpy as np
+
+    if len(columns) == 0:
+        return {}
+
+    groups = columns[:, 0].astype(np.int64)
+    device_ids = np.unique(groups)
+    ranks = np.searchsorted(device_ids, groups)
+    counts = np.bincount(ranks, minlength=len(device_ids))
+    starts = np.cumsum(counts) - counts
+
+    results = {int(device_id): {'samples': int(count)} for device_id, count in zip(device_ids, counts)}
+    for index, metric in enumerate(METRICS, start=1):
+        values = columns[:, index]
+        # Exact for any value range (folding the device into the float key loses precision)
+        sorted_values = values[np.lexsort((values, ranks))]
+
+        aggregates = {
+            'avg': np.bincount(ranks, weights=values) / counts,
+            'min': sorted_values[starts],
+            'max': sorted_values[starts + counts - 1],
+        }
+        for percentile in PERCENTILES:
+            aggregates[f'p{percentile}'] = _group_percentiles(np, sorted_values, starts, counts, percentile)
+
+        rounded = {name: np.round(column, 2).tolist() for name, column in aggregates.items()}
+        for position, device_id in enumerate(device_ids.tolist()):
+            results[device_id][metric] = {name: values[position] for name, values in rounded.items()}
+
+    return results
+
+
+def window_stats(device_ids, start, end):
+    """Per-device statistics for [start, end); devices without samples report samples=0."""
+    stats = grouped_stats(fetch_columns(device_ids, start, end)) if device_ids else {}
+    empty = {name: None for name in ('avg', 'min', 'max', *(f'p{p}' for p in PERCENTILES))}
+    rows = []
+    for device_id in device_ids:
+        device_stats = stats.get(device_id) or {'samples': 0, **{metric: dict(empty) for metric in METRICS}}
+        rows.append({'device_id': device_id, **device_stats})
+    return rows
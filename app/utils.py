@@ -1,46 +1,227 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
 import sys
 
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """Creates the log directory and file on the first write rather than at startup."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class JSONFormatter(logging.Formatter):
+    """Compact one-line JSON log records."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'module': record.module,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `burst` records per message template per `window` seconds.
+    Keyed on the unformatted message, so '404 Not Found: %s' counts as one message
+    no matter which path a scanner requests. The first record after a window that
+    dropped anything reports how many similar records were suppressed. Records
+    logged with extra={'rate_limit': False} are always let through. At most
+    `max_keys` messages are tracked; past that, expired windows are forgotten
+    first, then the oldest ones.
+    """
+
+    def __init__(self, burst=10, window=60.0, max_keys=1000):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0 or not getattr(record, 'rate_limit', True):
+            return True
+        key = (record.levelno, record.pathname, record.lineno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                if len(self._state) >= self.max_keys:
+                    self._evict(now)
+                state = (now, 0, 0)
+            started, count, suppressed = state
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.burst:
+                self._state[key] = (started, count, suppressed + 1)
+                return False
+            self._state[key] = (started, count + 1, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+        return True
+
+    def _evict(self, now):
+        # Called with the lock held. Frees a tenth of the keys at least, so
+        # a stream of distinct messages does not sweep the dict on every record
+        for key in [key for key, (started, _, _) in self._state.items() if now - started >= self.window]:
+            del self._state[key]
+        target = self.max_keys - max(1, self.max_keys // 10)
+        while len(self._state) > target:
+            del self._state[next(iter(self._state))]  # oldest first: dicts keep insertion order
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: records are dropped when the queue
+    is full. Records go to this process's queue (see _process_log_queue).
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            _process_log_queue().put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# One log queue and listener thread per process, shared by every app it creates
+# (scratch apps in benchmarks and tests included). Both are created on the first
+# record of each process: a worker forked after create_app() inherits neither
+# the parent's listener thread nor the records waiting in its queue.
+_log_queue = None
+_log_queue_size = 10000
+_log_output = None          # (log_file, json) of the most recently set up app
+_log_listener = None
+_log_listener_key = None
+_log_pid = None
+_log_lock = threading.Lock()
+
+
+def _stop_log_listener():
+    """Write out what is queued and stop; the next record starts a new listener."""
+    global _log_listener, _log_pid
+    with _log_lock:
+        if _log_listener is not None and _log_pid == os.getpid():
+            _log_listener.stop()
+            for handler in _log_listener.handlers:
+                handler.close()
+        _log_listener = None
+        _log_pid = None
+
+
+def _start_log_listener():
+    """Called with _log_lock held: (re)start this process's listener with the handlers of _log_output."""
+    global _log_listener, _log_listener_key
+    log_file, as_json = _log_output
+
+    # Rotating file handler (writes to file; directory is created on the first write)
+    file_handler = LazyRotatingFileHandler(
+        log_file, maxBytes=1 * 1024 * 1024, backupCount=3, delay=True
+    )
+    file_handler.setLevel(logging.INFO)
+    if as_json:
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
+        )
+    file_handler.setFormatter(formatter)
+
+    # Stream handler (writes to terminal)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(formatter)
+
+    if _log_listener is not None:
+        # stop() drains what is already queued to the old handlers
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+    _log_listener = QueueListener(_log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    _log_listener_key = _log_output
+
+
+def _process_log_queue():
+    """This process's queue, creating it and starting its listener on first use."""
+    global _log_queue, _log_listener, _log_pid
+    if _log_pid == os.getpid():
+        return _log_queue
+    with _log_lock:
+        if _log_pid != os.getpid():
+            if _log_queue is None:
+                atexit.register(_stop_log_listener)
+            # After a fork the inherited queue may hold the parent's records (and its
+            # lock), and the listener thread did not survive: start over
+            _log_queue = queue.Queue(maxsize=_log_queue_size)
+            _log_listener = None
+            _start_log_listener()
+            _log_pid = os.getpid()
+        return _log_queue
+
+
+def _set_log_output(app, log_file):
+    """
+    Point the process-wide listener at `log_file` in this app's format. The
+    first app sizes the queue; a later app that logs elsewhere or in another
+    format restarts a running listener with its own handlers instead of
+    starting a second one.
+    """
+    global _log_queue_size, _log_output
+    key = (log_file, bool(app.config.get('LOG_JSON')))
+    with _log_lock:
+        if _log_output is None:
+            _log_queue_size = app.config.get('LOG_QUEUE_SIZE', 10000)
+        _log_output = key
+        if _log_pid == os.getpid() and _log_listener_key != key:
+            _start_log_listener()
+
+
 def setup_logging(app):
     """
     Set up application logging to write INFO-level and higher logs to logs/app.log,
     with rotation (1MB per file, max 3 files), and also show logs in terminal.
-    Safe for multiple calls.
+    Request threads only enqueue records; a background QueueListener, started
+    by the first record of each process, does the file and terminal I/O. Safe
+    for multiple calls, and for many apps in one process: they share one queue
+    and listener.
     """
     if hasattr(app, '_logging_configured'):
         return
 
     try:
-        # Ensure logs directory exists
-        log_dir = os.path.join(os.getcwd(), 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-
-        # Log file path
-        log_file = os.path.join(log_dir, 'app.log')
-
-        # Rotating file handler (writes to file)
-        file_handler = RotatingFileHandler(
-            log_file, maxBytes=1 * 1024 * 1024, backupCount=3
-        )
-        file_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
-        )
-        file_handler.setFormatter(formatter)
+        log_file = os.path.join(os.getcwd(), 'logs', 'app.log')
 
-        # Stream handler (writes to terminal)
-        stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setLevel(logging.INFO)
-        stream_handler.setFormatter(formatter)
+        # Queue in front of the real handlers, drained by the process-wide listener thread
+        _set_log_output(app, log_file)
+        queue_handler = DroppingQueueHandler()
+        queue_handler.addFilter(RateLimitFilter(
+            burst=app.config.get('LOG_RATE_LIMIT_BURST', 10),
+            window=app.config.get('LOG_RATE_LIMIT_WINDOW', 60.0),
+            max_keys=app.config.get('LOG_RATE_LIMIT_MAX_KEYS', 1000),
+        ))
 
         # Clear existing handlers
         app.logger.handlers = []
 
         # Add handlers
-        app.logger.addHandler(file_handler)
-        app.logger.addHandler(stream_handler)
+        app.logger.addHandler(queue_handler)
 
         # Set logger level for app
         app.logger.setLevel(logging.INFO)
@@ -0,0 +1,203 @@
+import atexit
+import threading
+import time
+from collections import deque
+from flask import current_app
+from sqlalchemy import insert, select
+from app import rollups
+from app.conditional import touch_data_versions
+from app.metrics import LATENCY_BUCKETS, registry
+from app.models import Device, DeviceDiagnostics, db
+from app.signals import diagnostics_added
+
+FLUSH_ROWS_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+
+registry.describe('diagnostics_write_behind_queue_depth', 'gauge', 'Diagnostics rows waiting to be written.')
+registry.describe('diagnostics_write_behind_flush_seconds', 'histogram', 'Time to write one group of rows.',
+                  LATENCY_BUCKETS)
+registry.describe('diagnostics_write_behind_flush_rows', 'histogram', 'Rows written per group commit.',
+                  FLUSH_ROWS_BUCKETS)
+registry.describe('diagnostics_write_behind_rows_total', 'counter',
+                  'Diagnostics rows by outcome: written, dropped (write failed) or rejected (queue full).')
+
+
+class QueueFull(Exception):
+    """The write-behind queue stayed full for the whole put timeout (or is shutting down)."""
+
+
+# ----------------------
+# Queue + Flusher
+# ----------------------
+class WriteBehindQueue:
+    """
+    Bounded in-process queue of validated diagnostics rows. A flusher thread
+    writes them in groups of up to flush_rows, as soon as that many are waiting
+    or the oldest has waited flush_interval seconds: one executemany INSERT,
+    the rollup upsert and one commit per group, instead of one commit per
+    request. Producers block for up to put_timeout while the queue is full,
+    then get QueueFull.
+    """
+
+    def __init__(self, app, max_rows=50000, flush_rows=1000, flush_interval=0.2, put_timeout=1.0):
+        self.app = app
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._rows = deque()
+        self._oldest = None         # monotonic time the oldest waiting row was queued
+        self._in_flight = 0         # rows taken by the flusher and not yet committed
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._rows) + self._in_flight
+
+    def submit(self, rows):
+        """Queue rows for writing; they are visible once the next group commits."""
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            while not self._closed and len(self._rows) + len(rows) > self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._closed or len(self._rows) + len(rows) > self.max_rows:
+                registry.inc('diagnostics_write_behind_rows_total', (('result', 'rejected'),), len(rows))
+                raise QueueFull("Diagnostics ingest queue is full.")
+
+            was_empty = not self._rows
+            if was_empty:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            registry.set_gauge('diagnostics_write_behind_queue_depth', value=len(self._rows))
+            # An idle flusher waits without a timeout: wake it to start the flush_interval clock
+            if was_empty or len(self._rows) >= self.flush_rows:
+                self._cond.notify_all()
+            self._start_flusher()
+
+    def close(self, timeout=30.0):
+        """Stop accepting rows, write everything still queued and stop the flusher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _start_flusher(self):
+        # Called with the lock held. Started lazily so forked workers get their own thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='diagnostics-write-behind', daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        """Block until a group is due; returns it, or None once closed and drained."""
+        with self._cond:
+            while True:
+                if self._rows and (
+                    self._closed
+                    or len(self._rows) >= self.flush_rows
+                    or time.monotonic() - self._oldest >= self.flush_interval
+                ):
+                    break
+                if self._closed:
+                    return None
+                timeout = None if not self._rows else self._oldest + self.flush_interval - time.monotonic()
+                self._cond.wait(timeout)
+
+            count = min(self.flush_rows, len(self._rows))
+            batch = [self._rows.popleft() for _ in range(count)]
+            self._in_flight = count
+            if not self._rows:
+                self._oldest = None
+            registry.set_gauge('diagnostics_write_behind_queue_depth', value=len(self._rows))
+            # Room was made for blocked producers
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._take()
+                if batch is None:
+                    return
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    self.app.logger.error("Write-behind flush failed: %s", str(e))
+                finally:
+                    db.session.remove()
+                    with self._cond:
+                        self._in_flight = 0
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            _write(batch)
+        except Exception as e:
+            db.session.rollback()
+            # The driver error only; str(e) would include every bound row
+            self.app.logger.warning("Write-behind group of %d rows failed, retrying: %s",
+                                    len(batch), str(getattr(e, 'orig', e)))
+            # Usually a device deleted after its rows were accepted: the foreign key
+            # fails the whole group, so retry once without that device's rows
+            try:
+                written = _live_rows(batch)
+                if written:
+                    _write(written)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error("Write-behind dropped %d rows: %s", len(batch), str(getattr(e, 'orig', e)))
+                written = []
+            dropped = len(batch) - len(written)
+            if dropped:
+                registry.inc('diagnostics_write_behind_rows_total', (('result', 'dropped'),), dropped)
+            batch = written
+
+        registry.observe('diagnostics_write_behind_flush_seconds', (), time.perf_counter() - started)
+        registry.observe('diagnostics_write_behind_flush_rows', (), len(batch))
+        if batch:
+            registry.inc('diagnostics_write_behind_rows_total', (('result', 'written'),), len(batch))
+            diagnostics_added.send(self.app, rows=batch)
+
+
+def _write(rows):
+    db.session.execute(insert(DeviceDiagnostics), rows)
+    rollups.apply_samples(rows)
+    touch_data_versions(device_ids={row['device_id'] for row in rows})
+    db.session.commit()
+
+
+def _live_rows(rows):
+    device_ids = {row['device_id'] for row in rows}
+    live = set(db.session.execute(
+        select(Device.id).where(Device.id.in_(device_ids), Device.deleted_at.is_(None))
+    ).scalars())
+    return [row for row in rows if row['device_id'] in live]
+
+
+# ----------------------
+# App Wiring
+# ----------------------
+def write_behind():
+    """This app's queue, or None when DIAGNOSTICS_WRITE_BEHIND is off."""
+    return current_app.extensions.get('write_behind')
+
+
+def init_write_behind(app):
+    if not app.config['DIAGNOSTICS_WRITE_BEHIND']:
+        return
+
+    queue = WriteBehindQueue(
+        app,
+        max_rows=app.config['DIAGNOSTICS_WRITE_BEHIND_MAX_ROWS'],
+        flush_rows=app.config['DIAGNOSTICS_WRITE_BEHIND_FLUSH_ROWS'],
+        flush_interval=app.config['DIAGNOSTICS_WRITE_BEHIND_FLUSH_MS'] / 1000.0,
+        put_timeout=app.config['DIAGNOSTICS_WRITE_BEHIND_PUT_TIMEOUT'],
+    )
+    app.extensions['write_behind'] = queue
+    # Runs before the log listener stops (atexit is last-in, first-out)
+    atexit.register(queue.close)
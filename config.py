@@ -14,3 +14,122 @@ class Config:
     # JWT configuration
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "jwt-secret-key")  # Secure key for JWT encoding
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)  # Token validity duration
+
+    # Diagnostics batch ingest: maximum samples accepted per request
+    DIAGNOSTICS_BATCH_MAX_ROWS = int(os.environ.get("DIAGNOSTICS_BATCH_MAX_ROWS", 5000))
+
+    # Diagnostics export: rows fetched from the database cursor per chunk
+    DIAGNOSTICS_EXPORT_CHUNK_SIZE = int(os.environ.get("DIAGNOSTICS_EXPORT_CHUNK_SIZE", 5000))
+
+    # Per-process cache of user -> owned device ids (seconds / max users)
+    OWNERSHIP_CACHE_TTL = float(os.environ.get("OWNERSHIP_CACHE_TTL", 30))
+    OWNERSHIP_CACHE_SIZE = int(os.environ.get("OWNERSHIP_CACHE_SIZE", 1024))
+
+    # Password hashing (werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000").
+    # Hashes made with other parameters are upgraded on the user's next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+
+    # Logging: JSON output, queue size, and per-message rate limit (records per window seconds,
+    # tracking at most LOG_RATE_LIMIT_MAX_KEYS distinct messages)
+    LOG_JSON = os.environ.get("LOG_JSON", "false").lower() in ("1", "true", "yes")
+    LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+    LOG_RATE_LIMIT_BURST = int(os.environ.get("LOG_RATE_LIMIT_BURST", 10))
+    LOG_RATE_LIMIT_WINDOW = float(os.environ.get("LOG_RATE_LIMIT_WINDOW", 60))
+    LOG_RATE_LIMIT_MAX_KEYS = int(os.environ.get("LOG_RATE_LIMIT_MAX_KEYS", 1000))
+
+    # Request metrics at /metrics. Set METRICS_DIR to a directory shared by all
+    # worker processes to aggregate them; snapshots are written every few seconds.
+    # Counters of exited workers are kept; snapshots not rewritten for 3 intervals are ignored.
+    # /metrics is only served with METRICS_TOKEN (sent as "Authorization: Bearer <token>")
+    # or, without one, when METRICS_PUBLIC is set.
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+    # SQL profiling (opt-in): slow-query log with EXPLAIN and repeated-statement (N+1) warnings
+    SQL_PROFILING = os.environ.get("SQL_PROFILING", "false").lower() in ("1", "true", "yes")
+    SQL_SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_QUERY_MS", 100))
+    SQL_EXPLAIN_SLOW = os.environ.get("SQL_EXPLAIN_SLOW", "true").lower() in ("1", "true", "yes")
+    SQL_NPLUS1_THRESHOLD = int(os.environ.get("SQL_NPLUS1_THRESHOLD", 5))
+
+    # Connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))
+
+    # SQLite engine profile, applied to every new connection
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))  # Negative = KiB
+    SQLITE_TEMP_STORE = os.environ.get("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_FOREIGN_KEYS = os.environ.get("SQLITE_FOREIGN_KEYS", "ON")  # Enforce FKs and ON DELETE CASCADE
+    SQLITE_AUTO_VACUUM = os.environ.get("SQLITE_AUTO_VACUUM", "INCREMENTAL")  # Takes effect on new databases
+    SQLITE_BUSY_WAIT_THRESHOLD_MS = float(os.environ.get("SQLITE_BUSY_WAIT_THRESHOLD_MS", 2))
+
+    # Startup schema check against the migration head: "warn", "strict" or "off" (skip in production)
+    DB_SCHEMA_CHECK = os.environ.get("DB_SCHEMA_CHECK", "warn")
+
+    # In-process hot window for the device listing: newest samples per device (float32 ring buffers),
+    # for at most HOT_WINDOW_MAX_DEVICES devices. Reloaded after HOT_WINDOW_REFRESH seconds (0 = never)
+    # so samples written by other worker processes show up.
+    HOT_WINDOW_SAMPLES = int(os.environ.get("HOT_WINDOW_SAMPLES", 120))
+    HOT_WINDOW_SECONDS = int(os.environ.get("HOT_WINDOW_SECONDS", 3600))
+    HOT_WINDOW_MAX_DEVICES = int(os.environ.get("HOT_WINDOW_MAX_DEVICES", 10000))
+    HOT_WINDOW_REFRESH = float(os.environ.get("HOT_WINDOW_REFRESH", 30))
+
+    # Diagnostics retention (`flask retention purge`): days of raw samples to keep, 0 = forever.
+    # Devices can override it with their own retention_days. Deletes run in short batches.
+    DIAGNOSTICS_RETENTION_DAYS = int(os.environ.get("DIAGNOSTICS_RETENTION_DAYS", 0))
+    RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 2000))
+    RETENTION_BATCH_PAUSE = float(os.environ.get("RETENTION_BATCH_PAUSE", 0.05))
+
+    # Cold archive of closed months (`flask archive run`), one columnar file per device per month.
+    # When set, exports and stats read archived months from here and the retention purge only
+    # deletes samples that have been archived.
+    DIAGNOSTICS_ARCHIVE_DIR = os.environ.get("DIAGNOSTICS_ARCHIVE_DIR")
+
+    # Device deletion: the device is hidden at once, then its diagnostics are deleted by a
+    # background thread in batches of DEVICE_PURGE_BATCH_SIZE rows, pausing between batches
+    DEVICE_PURGE_BATCH_SIZE = int(os.environ.get("DEVICE_PURGE_BATCH_SIZE", 5000))
+    DEVICE_PURGE_BATCH_PAUSE = float(os.environ.get("DEVICE_PURGE_BATCH_PAUSE", 0.05))
+
+    # Bulk device import (CSV / NDJSON): rows per INSERT executemany and commit, the most rows
+    # per file, and the most rejected rows reported with their errors (all are counted)
+    DEVICE_IMPORT_BATCH_SIZE = int(os.environ.get("DEVICE_IMPORT_BATCH_SIZE", 1000))
+    DEVICE_IMPORT_MAX_ROWS = int(os.environ.get("DEVICE_IMPORT_MAX_ROWS", 100000))
+    DEVICE_IMPORT_MAX_ERRORS = int(os.environ.get("DEVICE_IMPORT_MAX_ERRORS", 1000))
+
+    # Conditional GET: pages that depend on the clock (relative windows, "last hour") get a new
+    # ETag at least this often, even when the user's data has not changed
+    CONDITIONAL_GET_CLOCK_SECONDS = int(os.environ.get("CONDITIONAL_GET_CLOCK_SECONDS", 60))
+
+    # Rendered device / diagnostics list fragments: per-process LRU (entries, seconds; TTL 0 disables)
+    # plus an optional shared tier: "" (none), "memory" (in-process stand-in) or a redis:// URL
+    PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 512))
+    PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", 30))
+    PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "")
+
+    # Write-behind diagnostics ingest (opt-in): /diagnostics/batch queues validated samples and answers
+    # 202; a background thread commits them in groups of FLUSH_ROWS or every FLUSH_MS milliseconds.
+    # When MAX_ROWS are waiting, requests wait up to PUT_TIMEOUT seconds for room, then get 503.
+    # Keep MAX_ROWS above DIAGNOSTICS_BATCH_MAX_ROWS.
+    DIAGNOSTICS_WRITE_BEHIND = os.environ.get("DIAGNOSTICS_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    DIAGNOSTICS_WRITE_BEHIND_MAX_ROWS = int(os.environ.get("DIAGNOSTICS_WRITE_BEHIND_MAX_ROWS", 50000))
+    DIAGNOSTICS_WRITE_BEHIND_FLUSH_ROWS = int(os.environ.get("DIAGNOSTICS_WRITE_BEHIND_FLUSH_ROWS", 1000))
+    DIAGNOSTICS_WRITE_BEHIND_FLUSH_MS = float(os.environ.get("DIAGNOSTICS_WRITE_BEHIND_FLUSH_MS", 200))
+    DIAGNOSTICS_WRITE_BEHIND_PUT_TIMEOUT = float(os.environ.get("DIAGNOSTICS_WRITE_BEHIND_PUT_TIMEOUT", 1.0))
+
+    # Live diagnostics stream (/diagnostics/stream, Server-Sent Events). Each open stream holds a
+    # worker thread and a queue of QUEUE_SIZE messages (a client that falls further behind is
+    # dropped). Streams end after MAX_SECONDS and the browser reconnects. LIVE_FEED_BROKER:
+    # "" (streams only see samples written by the same process), "memory" or a redis:// URL.
+    LIVE_FEED_QUEUE_SIZE = int(os.environ.get("LIVE_FEED_QUEUE_SIZE", 100))
+    LIVE_FEED_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_FEED_MAX_SUBSCRIBERS", 100))
+    LIVE_FEED_KEEPALIVE = float(os.environ.get("LIVE_FEED_KEEPALIVE", 15))
+    LIVE_FEED_MAX_SECONDS = float(os.environ.get("LIVE_FEED_MAX_SECONDS", 300))
+    LIVE_FEED_BROKER = os.environ.get("LIVE_FEED_BROKER", "")
@@ -45,6 +45,13 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_name(name, type_, parent_names):
+    # The device search index (FTS5 table and its shadow tables) is managed by hand
+    if type_ == 'table' and name and name.startswith('device_search'):
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -97,6 +104,13 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Batch migrations rebuild tables (copy, drop, rename). With foreign key
+            # enforcement on, dropping a parent table would cascade into its children.
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
+        conf_args.setdefault('include_name', include_name)
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
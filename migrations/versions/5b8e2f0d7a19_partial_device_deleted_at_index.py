@@ -0,0 +1,34 @@
+"""Make the device deleted_at index partial, index device user_id
+
+Revision ID: 5b8e2f0d7a19
+Revises: 0a6e4b91c2f5
+Create Date: 2026-10-18 21:12:40.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f0d7a19'
+down_revision = '0a6e4b91c2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A full index on deleted_at matched "deleted_at IS NULL" and was picked for
+    # ORDER BY id device listings, walking every live device of every user
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_deleted_at')
+        batch_op.create_index('ix_device_user_id', ['user_id'], unique=False)
+    op.create_index('ix_device_deleted_at', 'device', ['deleted_at'], unique=False,
+                    sqlite_where=sa.text('deleted_at IS NOT NULL'),
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_device_deleted_at', table_name='device')
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_user_id')
+        batch_op.create_index('ix_device_deleted_at', ['deleted_at'], unique=False)
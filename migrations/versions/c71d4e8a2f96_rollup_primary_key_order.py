@@ -0,0 +1,62 @@
+"""Rollup tables: primary key (bucket, device_id) plus a (device_id, bucket) index
+
+Revision ID: c71d4e8a2f96
+Revises: 9e6c3b2f1a84
+Create Date: 2026-10-19 09:41:26.085517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d4e8a2f96'
+down_revision = '9e6c3b2f1a84'
+branch_labels = None
+depends_on = None
+
+
+ROLLUP_TABLES = ('diagnostics_rollup_minute', 'diagnostics_rollup_hour', 'diagnostics_rollup_day')
+
+
+def _rollup_table(table_name, primary_key):
+    """The rollup table as it is after e3a7c1d94b08, with the given primary key column order."""
+    return sa.Table(
+        table_name, sa.MetaData(),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('cpu_min', sa.Float(), nullable=False),
+        sa.Column('cpu_max', sa.Float(), nullable=False),
+        sa.Column('cpu_sum', sa.Float(), nullable=False),
+        sa.Column('memory_min', sa.Float(), nullable=False),
+        sa.Column('memory_max', sa.Float(), nullable=False),
+        sa.Column('memory_sum', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['device.id'], name=f'fk_{table_name}_device_id_device',
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(*primary_key),
+    )
+
+
+def _set_primary_key(table_name, primary_key):
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite cannot alter a primary key: batch mode copies the rows into a rebuilt table
+        with op.batch_alter_table(table_name, recreate='always',
+                                  copy_from=_rollup_table(table_name, primary_key)):
+            pass
+    else:
+        op.drop_constraint(f'{table_name}_pkey', table_name, type_='primary')
+        op.create_primary_key(f'{table_name}_pkey', table_name, list(primary_key))
+
+
+def upgrade():
+    # Databases migrated before 3c9e1f7a5b42 declared (bucket, device_id) have (device_id, bucket)
+    for table_name in ROLLUP_TABLES:
+        _set_primary_key(table_name, ('bucket', 'device_id'))
+        op.create_index(f'ix_{table_name}_device_id_bucket', table_name, ['device_id', 'bucket'], unique=False)
+
+
+def downgrade():
+    for table_name in reversed(ROLLUP_TABLES):
+        op.drop_index(f'ix_{table_name}_device_id_bucket', table_name=table_name)
+        _set_primary_key(table_name, ('device_id', 'bucket'))
@@ -0,0 +1,60 @@
+"""Soft-delete devices and cascade device foreign keys
+
+Revision ID: e3a7c1d94b08
+Revises: b5f0a9c2d7e1
+Create Date: 2026-10-18 21:04:55.130962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7c1d94b08'
+down_revision = 'b5f0a9c2d7e1'
+branch_labels = None
+depends_on = None
+
+CHILD_TABLES = (
+    'device_diagnostics',
+    'diagnostics_rollup_minute',
+    'diagnostics_rollup_hour',
+    'diagnostics_rollup_day',
+)
+
+# SQLite foreign keys have no names; batch mode reflects them under this convention
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _fk_name(table_name):
+    return f'fk_{table_name}_device_id_device'
+
+
+def _original_fk_name(table_name):
+    if op.get_bind().dialect.name == 'sqlite':
+        return _fk_name(table_name)
+    return f'{table_name}_device_id_fkey'  # PostgreSQL's default name
+
+
+def upgrade():
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('purged_rows', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_device_deleted_at', ['deleted_at'], unique=False)
+
+    for table_name in CHILD_TABLES:
+        with op.batch_alter_table(table_name, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(_original_fk_name(table_name), type_='foreignkey')
+            batch_op.create_foreign_key(_fk_name(table_name), 'device', ['device_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for table_name in reversed(CHILD_TABLES):
+        with op.batch_alter_table(table_name, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(_fk_name(table_name), type_='foreignkey')
+            batch_op.create_foreign_key(_fk_name(table_name), 'device', ['device_id'], ['id'])
+
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_deleted_at')
+        batch_op.drop_column('purged_rows')
+        batch_op.drop_column('deleted_at')
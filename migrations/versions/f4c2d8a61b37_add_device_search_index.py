@@ -0,0 +1,54 @@
+"""Add FTS5 trigram search index over device name, location and type
+
+Revision ID: f4c2d8a61b37
+Revises: e3a7c1d94b08
+Create Date: 2026-10-18 20:04:51.308214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c2d8a61b37'
+down_revision = 'e3a7c1d94b08'
+branch_labels = None
+depends_on = None
+
+
+# Same statements as app.search.SEARCH_DDL at the time of this revision
+SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS device_search USING fts5(
+        name, location, device_type, content='device', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS device_search_ai AFTER INSERT ON device BEGIN
+        INSERT INTO device_search(rowid, name, location, device_type)
+        VALUES (new.id, new.name, new.location, new.device_type);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS device_search_ad AFTER DELETE ON device BEGIN
+        INSERT INTO device_search(device_search, rowid, name, location, device_type)
+        VALUES ('delete', old.id, old.name, old.location, old.device_type);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS device_search_au AFTER UPDATE OF name, location, device_type ON device BEGIN
+        INSERT INTO device_search(device_search, rowid, name, location, device_type)
+        VALUES ('delete', old.id, old.name, old.location, old.device_type);
+        INSERT INTO device_search(rowid, name, location, device_type)
+        VALUES (new.id, new.name, new.location, new.device_type);
+    END""",
+)
+
+
+def upgrade():
+    # SQLite only; on other databases device search keeps using ILIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in SEARCH_DDL:
+        op.execute(statement)
+    op.execute("INSERT INTO device_search(device_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('device_search_au', 'device_search_ad', 'device_search_ai'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS device_search")
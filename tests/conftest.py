@@ -0,0 +1,81 @@
+import sqlite3
+import pytest
+from app import create_app, db
+from app.dbcheck import migrations_dir
+from app.seed import SEED_PASSWORD, seed, seed_usernames
+
+# The tables as they were before the first migration (a8d4ee5bad2b), which alters them
+PRE_MIGRATION_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, password VARCHAR(200) NOT NULL
+);
+CREATE TABLE device (
+    id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(120) NOT NULL, device_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL, location VARCHAR(100) NOT NULL
+);
+CREATE TABLE device_diagnostics (
+    id INTEGER NOT NULL PRIMARY KEY, device_id INTEGER NOT NULL REFERENCES device (id),
+    cpu_usage FLOAT NOT NULL, memory_usage FLOAT NOT NULL, timestamp DATETIME
+);
+"""
+
+
+def _make_app(tmp_path, monkeypatch, database, **config):
+    # logs/ is created under the working directory
+    monkeypatch.chdir(tmp_path)
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / database}",
+        'DB_SCHEMA_CHECK': 'off',
+        'PAGE_CACHE_TTL': 0,
+        'METRICS_DIR': None,
+        'DIAGNOSTICS_ARCHIVE_DIR': None,
+        **config,
+    })
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a fresh SQLite file with the schema created; runs inside an app context."""
+    app = _make_app(tmp_path, monkeypatch, 'test.db')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Factory for a second app with config overrides (settings read once by create_app)."""
+    return lambda database, **config: _make_app(tmp_path, monkeypatch, database, **config)
+
+
+@pytest.fixture
+def migrated_app(tmp_path, monkeypatch):
+    """Like `app`, but the schema is built by the Alembic migrations, as `flask db upgrade` does."""
+    from flask_migrate import Migrate, upgrade
+
+    with sqlite3.connect(tmp_path / 'migrated.db') as connection:
+        connection.executescript(PRE_MIGRATION_SCHEMA)
+    app = _make_app(tmp_path, monkeypatch, 'migrated.db')
+    Migrate(app, db, directory=migrations_dir(app))
+    with app.app_context():
+        upgrade(directory=migrations_dir(app))
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def seeded(app):
+    """One user with three devices of 50 samples each."""
+    return seed(users=1, devices=3, diagnostics=50)
+
+
+@pytest.fixture
+def client(app, seeded):
+    """Test client logged in as the seeded user."""
+    client = app.test_client()
+    client.post('/auth/login', data={'username': seed_usernames('seed', 1)[0], 'password': SEED_PASSWORD})
+    return client
@@ -0,0 +1,53 @@
+from datetime import datetime
+from sqlalchemy import event, select
+from app.conditional import touch_data_versions
+from app.hotstore import hot_store
+from app.models import Device, User, db
+from app.signals import diagnostics_added, user_data_changed
+from app.writebehind import _write
+
+
+def _version(user_id):
+    return db.session.execute(select(User.data_version).where(User.id == user_id)).scalar()
+
+
+def _samples():
+    device_id, user_id = db.session.execute(select(Device.id, Device.user_id).order_by(Device.id)).first()
+    rows = [{'device_id': device_id, 'cpu_usage': 10.0 + n, 'memory_usage': 20.0, 'timestamp': datetime.utcnow()}
+            for n in range(3)]
+    return rows, user_id
+
+
+def test_write_bumps_data_version_in_its_own_commit(app, seeded):
+    rows, user_id = _samples()
+    before = _version(user_id)
+    db.session.rollback()
+
+    commits, announced = [], []
+    event.listen(db.engine, 'commit', commits.append)
+    user_data_changed.connect(lambda sender, user_ids: announced.append(user_ids), sender=app, weak=False)
+    _write(rows)
+
+    assert len(commits) == 1
+    assert announced == [{user_id}]
+    assert _version(user_id) == before + 1
+
+
+def test_rolled_back_write_keeps_data_version(app, seeded):
+    rows, user_id = _samples()
+    before = _version(user_id)
+    touch_data_versions(device_ids={rows[0]['device_id']})
+    db.session.rollback()
+    db.session.commit()
+
+    assert _version(user_id) == before
+
+
+def test_failing_receiver_does_not_fail_the_write(app, seeded, monkeypatch):
+    rows, _ = _samples()
+
+    def broken(rows):
+        raise RuntimeError("hot store unavailable")
+
+    monkeypatch.setattr(hot_store(), 'add', broken)
+    diagnostics_added.send(app, rows=rows)
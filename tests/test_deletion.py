@@ -0,0 +1,63 @@
+from sqlalchemy import func, select
+from app import deletion
+from app.routes import device as device_routes
+from app.models import Device, DeviceDiagnostics, db
+
+
+def _first_device():
+    return db.session.execute(select(Device).order_by(Device.id).limit(1)).scalar_one()
+
+
+def _stored(device_id):
+    return db.session.execute(
+        select(func.count()).select_from(DeviceDiagnostics).where(DeviceDiagnostics.device_id == device_id)
+    ).scalar()
+
+
+def test_deleted_device_is_hidden_before_its_rows_are_purged(client, monkeypatch):
+    # The device list also restarts the purger for pending deletions
+    for module in (deletion, device_routes):
+        monkeypatch.setattr(module, 'start_purger', lambda app: None)
+    device_id = _first_device().id
+    link = f'/devices/update/{device_id}"'
+    assert link in client.get('/devices/home').get_data(as_text=True)
+
+    client.get(f'/devices/delete/{device_id}')
+
+    assert link not in client.get('/devices/home').get_data(as_text=True)
+    # Not found: the error handler sends the user back to the device list
+    assert client.get(f'/devices/update/{device_id}').status_code == 302
+    assert _stored(device_id) == 50
+
+
+def test_purge_reports_progress_batch_by_batch(app, seeded):
+    device = _first_device()
+    device.deleted_at = db.func.now()
+    db.session.commit()
+    user_id = device.user_id
+
+    purged, percents = [], []
+    while (result := deletion.purge_next_batch(20)) is not None and result[1]:
+        [progress] = deletion.deletion_progress(user_id)
+        purged.append(progress.purged_rows)
+        percents.append(progress.percent)
+
+    assert purged == [20, 40, 50]
+    assert percents == sorted(percents) and percents[-1] < 100
+    assert deletion.deletion_progress(user_id) == []
+
+
+def test_purge_resumes_after_a_restart(app, seeded):
+    device = _first_device()
+    device_id = device.id
+    device.deleted_at = db.func.now()
+    db.session.commit()
+    assert deletion.purge_next_batch(20) == (device_id, 20)
+    # A new process finds the pending deletion in the database
+    db.session.remove()
+
+    deletion.start_purger(app).join(10)
+
+    assert _stored(device_id) == 0
+    assert db.session.get(Device, device_id) is None
+    assert 'device_purger' not in app.extensions
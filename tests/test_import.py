@@ -0,0 +1,75 @@
+import json
+from sqlalchemy import func, select
+from app.models import Device, db
+from app.search import matching_ids
+
+
+def _ndjson(count, start=0, name='imported'):
+    return '\n'.join(
+        json.dumps({'name': f'{name}-{n}', 'device_type': 'sensor', 'location': 'Bench 2', 'status': 'online'})
+        for n in range(start, start + count)
+    )
+
+
+def _post(client, body):
+    return client.post('/devices/import', data=body, content_type='application/x-ndjson')
+
+
+def _devices(*criteria):
+    return db.session.execute(select(func.count()).select_from(Device).where(*criteria)).scalar()
+
+
+def _trigger_installed():
+    return db.session.connection().exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'device_search_ai'"
+    ).scalar() == 1
+
+
+def test_import_inserts_in_batches_and_indexes_them(app, client):
+    app.config['DEVICE_IMPORT_BATCH_SIZE'] = 100
+    before = _devices()
+
+    response = _post(client, _ndjson(250, name='zebrafish'))
+
+    assert response.status_code == 201
+    assert response.json == {'inserted': 250, 'rejected': 0, 'errors': []}
+    assert _devices() == before + 250
+    # Indexed by the INSERT ... SELECT of each batch, and the per-row trigger is back
+    assert _devices(Device.id.in_(matching_ids('zebrafish'))) == 250
+    assert _trigger_installed()
+    db.session.execute(Device.__table__.insert(), [
+        {'name': 'zebrafish-late', 'device_type': 'sensor', 'location': 'Bench 2', 'status': 'online', 'user_id': 1}
+    ])
+    assert _devices(Device.id.in_(matching_ids('zebrafish'))) == 251
+
+
+def test_import_reports_rejected_rows_up_to_the_limit(app, client):
+    app.config['DEVICE_IMPORT_MAX_ERRORS'] = 2
+    body = '\n'.join([
+        _ndjson(1),
+        'not json',
+        json.dumps({'name': 'x', 'device_type': 'sensor', 'location': 'Bench 2', 'status': 'online'}),
+        json.dumps({'name': 'ok-name', 'device_type': 'sensor', 'location': 'Bench 2', 'status': 'melted'}),
+        _ndjson(1, start=1),
+    ])
+
+    response = _post(client, body)
+
+    assert response.status_code == 201
+    assert response.json['inserted'] == 2
+    assert response.json['rejected'] == 3
+    assert [error['line'] for error in response.json['errors']] == [2, 3]
+    assert response.json['errors'][0]['errors'] == {'row': ['Not valid JSON.']}
+
+
+def test_import_over_the_limit_keeps_committed_batches(app, client):
+    app.config['DEVICE_IMPORT_BATCH_SIZE'] = 100
+    app.config['DEVICE_IMPORT_MAX_ROWS'] = 250
+    before = _devices()
+
+    response = _post(client, _ndjson(300))
+
+    assert response.status_code == 413
+    assert response.json['inserted'] == 200
+    assert _devices() == before + 200
+    assert _trigger_installed()
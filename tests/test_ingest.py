@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+from sqlalchemy import func, select, update
+from app.models import Device, DeviceDiagnostics, db
+
+
+def _device_id():
+    return db.session.execute(select(Device.id).order_by(Device.id)).scalars().first()
+
+
+def _stored():
+    return db.session.execute(select(func.count()).select_from(DeviceDiagnostics)).scalar()
+
+
+def test_batch_rejects_non_finite_and_overflowing_values(client):
+    device_id = _device_id()
+    body = '[' + ','.join([
+        json.dumps({'device_id': device_id, 'cpu_usage': 10, 'memory_usage': 20}),
+        json.dumps({'device_id': device_id, 'cpu_usage': 'inf', 'memory_usage': 20}),
+        '{"device_id": %d, "cpu_usage": 10, "memory_usage": 1e400}' % device_id,
+        '{"device_id": %d, "cpu_usage": 10, "memory_usage": %d}' % (device_id, 10 ** 400),
+        '{"device_id": %d, "cpu_usage": NaN, "memory_usage": 20}' % device_id,
+    ]) + ']'
+
+    response = client.post('/diagnostics/batch', data=body, content_type='application/json')
+
+    assert response.status_code == 201
+    assert response.json['inserted'] == 1
+    assert {error['index']: error['errors'] for error in response.json['errors']} == {
+        1: {'cpu_usage': ['Must be a non-negative number.']},
+        2: {'memory_usage': ['Must be a non-negative number.']},
+        3: {'memory_usage': ['Not a valid number.']},
+        4: {'cpu_usage': ['Must be a non-negative number.']},
+    }
+
+
+def test_malformed_ndjson_line_is_rejected_on_its_own(client):
+    device_id = _device_id()
+    before = _stored()
+    body = '\n'.join([
+        json.dumps({'device_id': device_id, 'cpu_usage': 10, 'memory_usage': 20}),
+        '{"device_id": 1, "cpu_usage": ',
+        '',
+        json.dumps({'device_id': device_id, 'cpu_usage': 30, 'memory_usage': 40}),
+    ])
+
+    response = client.post('/diagnostics/batch', data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    assert response.json['inserted'] == 2
+    assert response.json['errors'] == [{'index': 1, 'errors': {'_schema': ['Not valid JSON.']}}]
+    assert _stored() == before + 2
+
+
+def test_form_rejects_non_finite_usage(client):
+    device_id = _device_id()
+    before = _stored()
+
+    for cpu_usage, memory_usage in (('inf', '20'), ('10', 'nan'), ('10', '1e999')):
+        response = client.post('/diagnostics/add', data={
+            'device_id': device_id, 'cpu_usage': cpu_usage, 'memory_usage': memory_usage,
+        })
+        assert response.status_code == 302
+        assert response.location.endswith('/diagnostics/add')
+
+    assert _stored() == before
+
+
+def test_update_form_rejects_non_finite_usage(client):
+    diagnostic_id, device_id, cpu_usage = db.session.execute(
+        select(DeviceDiagnostics.id, DeviceDiagnostics.device_id, DeviceDiagnostics.cpu_usage).limit(1)
+    ).one()
+    db.session.rollback()
+
+    response = client.post(f'/diagnostics/update/{diagnostic_id}', data={
+        'device_id': device_id, 'cpu_usage': 'inf', 'memory_usage': '20',
+    })
+
+    assert response.location.endswith(f'/diagnostics/update/{diagnostic_id}')
+    assert db.session.get(DeviceDiagnostics, diagnostic_id).cpu_usage == cpu_usage
+
+
+def test_device_deleted_by_another_worker_rejects_samples(client):
+    device_id = _device_id()
+    sample = [{'device_id': device_id, 'cpu_usage': 10, 'memory_usage': 20}]
+    assert client.post('/diagnostics/batch', json=sample).status_code == 201
+    # Soft-deleted elsewhere: this worker's ownership cache still lists the device
+    db.session.execute(update(Device).where(Device.id == device_id).values(deleted_at=datetime.utcnow()))
+    db.session.commit()
+    before = _stored()
+
+    response = client.post('/diagnostics/batch', json=sample)
+
+    assert response.status_code == 422
+    assert response.json['errors'] == [{'index': 0, 'errors': {'device_id': ['Invalid device selection.']}}]
+    assert _stored() == before
@@ -0,0 +1,68 @@
+from datetime import datetime
+from sqlalchemy import select
+from app.live import LiveFeed
+from app.models import Device, db
+from app.seed import seed
+
+
+def _rows(device_id):
+    return [{'device_id': device_id, 'cpu_usage': 10.0, 'memory_usage': 20.0, 'timestamp': datetime.utcnow()}]
+
+
+def _devices():
+    """{user_id: device_id} of two users' first devices."""
+    seed(users=2, devices=1, diagnostics=1)
+    owners = dict(db.session.execute(select(Device.user_id, Device.id).order_by(Device.id)).all())
+    assert len(owners) == 2
+    return owners
+
+
+def _events(feed, subscription, count):
+    stream = feed.stream(subscription, keepalive=0.01, max_seconds=1)
+    assert next(stream) == 'retry: 3000\n\n'
+    events = [next(stream) for _ in range(count)]
+    stream.close()
+    return events
+
+
+def test_samples_reach_every_stream_of_the_owner_only(app):
+    owners = _devices()
+    owner, other = owners
+    feed = LiveFeed()
+    first, second = feed.subscribe(owner), feed.subscribe(owner)
+    bystander = feed.subscribe(other)
+
+    feed.publish(_rows(owners[owner]))
+
+    for subscription in (first, second):
+        [event] = _events(feed, subscription, 1)
+        assert event.startswith('event: diagnostics\n')
+        assert f'"device_id": {owners[owner]}' in event
+    assert _events(feed, bystander, 1) == [': keepalive\n\n']
+
+
+def test_slow_stream_is_dropped(app):
+    owners = _devices()
+    user_id = next(iter(owners))
+    feed = LiveFeed(queue_size=1)
+    slow, fast = feed.subscribe(user_id), feed.subscribe(user_id)
+
+    feed.publish(_rows(owners[user_id]))
+    assert fast.get(timeout=1) is not None
+    feed.publish(_rows(owners[user_id]))
+
+    assert slow.dropped and not fast.dropped
+    assert slow not in feed._subscribers[user_id]
+    assert _events(feed, slow, 1) == ['event: dropped\ndata: {}\n\n']
+
+
+def test_closed_stream_unsubscribes(app):
+    user_id = next(iter(_devices()))
+    feed = LiveFeed(max_subscribers=1)
+    subscription = feed.subscribe(user_id)
+
+    _events(feed, subscription, 1)
+
+    assert user_id not in feed._subscribers
+    # The slot is free again
+    feed.subscribe(user_id)
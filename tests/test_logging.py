@@ -0,0 +1,37 @@
+import logging
+import os
+from app import utils
+from app.utils import RateLimitFilter
+
+
+def _record(msg):
+    return logging.LogRecord('app', logging.WARNING, __file__, 1, msg, None, None)
+
+
+def test_rate_limit_state_is_bounded():
+    rate_limit = RateLimitFilter(burst=2, window=60.0, max_keys=10)
+
+    for n in range(100):
+        assert rate_limit.filter(_record(f"distinct message {n}"))
+    assert len(rate_limit._state) <= 10
+
+    results = [rate_limit.filter(_record("repeated")) for _ in range(4)]
+    assert results == [True, True, False, False]
+
+
+def test_forked_worker_starts_its_own_listener(app, tmp_path):
+    app.logger.warning("before fork")
+    pid = os.fork()
+    if pid == 0:
+        try:
+            app.logger.warning("from worker %d", os.getpid())
+            utils._stop_log_listener()  # drains the queue, as at exit
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    utils._stop_log_listener()
+
+    with open(tmp_path / 'logs' / 'app.log', encoding='utf-8') as fh:
+        lines = fh.read().splitlines()
+    assert any(f"from worker {pid}" in line for line in lines)
+    assert sum("before fork" in line for line in lines) == 1
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+import pytest
+from app.metrics import _HOST, STALE_FLUSH_INTERVALS, collect
+
+
+def _write(metrics_dir, pid, value, age=0.0, host=_HOST):
+    path = os.path.join(metrics_dir, f"metrics-{host}-{pid}.json")
+    with open(path, 'w') as f:
+        json.dump({'counters': [['worker_test_total', [], value]], 'gauges': [['worker_test_gauge', [], 1]],
+                   'histograms': []}, f)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def _collected(app, name='worker_test_total'):
+    return sorted(
+        value for snapshot in collect(app) for kind in ('counters', 'gauges')
+        for series, _, value in snapshot[kind] if series == name
+    )
+
+
+@pytest.fixture
+def metrics_dir(app, tmp_path):
+    metrics_dir = str(tmp_path / 'metrics')
+    os.makedirs(metrics_dir)
+    app.config['METRICS_DIR'] = metrics_dir
+    return metrics_dir
+
+
+def test_collect_skips_stale_workers_and_keeps_exited_counters(app, metrics_dir):
+    interval = app.config['METRICS_FLUSH_INTERVAL']
+
+    live = _write(metrics_dir, os.getppid(), 1)
+    stale = _write(metrics_dir, 1, 2, age=(STALE_FLUSH_INTERVALS + 1) * interval)
+    exited = _write(metrics_dir, 2 ** 22 + 1, 3)  # Above Linux's pid_max
+
+    assert _collected(app) == [1, 3]
+    # The exited worker's gauge went with it
+    assert _collected(app, 'worker_test_gauge') == [1]
+    assert os.path.exists(live) and os.path.exists(stale)
+    assert not os.path.exists(exited)
+
+    # A second exit adds to the retired counters instead of replacing them
+    _write(metrics_dir, 2 ** 22 + 2, 4)
+    assert _collected(app) == [1, 7]
+
+
+def test_collect_leaves_other_hosts_alone(app, metrics_dir):
+    # Not a pid of this host: only its age can tell whether it is still running
+    other = _write(metrics_dir, 2 ** 22 + 1, 5, host='other-host')
+
+    assert _collected(app) == [5]
+    assert os.path.exists(other)
+
+
+def test_metrics_endpoint_needs_a_token_or_public_switch(app, make_app):
+    assert app.test_client().get('/metrics').status_code != 200
+    assert make_app('public.db', METRICS_PUBLIC=True).test_client().get('/metrics').status_code == 200
+
+    client = make_app('token.db', METRICS_TOKEN='secret').test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert '# TYPE http_requests_total counter' in response.get_data(as_text=True)
+
+
+def test_snapshot_written_without_requests(app, metrics_dir):
+    app.config['METRICS_FLUSH_INTERVAL'] = 0.05
+
+    app.test_client().get('/auth/login')
+    path = os.path.join(metrics_dir, f"metrics-{_HOST}-{os.getpid()}.json")
+    deadline = time.monotonic() + 2
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    first = os.path.getmtime(path)
+    time.sleep(0.2)
+    # The flusher keeps rewriting the snapshot while the worker is idle
+    assert os.path.getmtime(path) > first
+    app.extensions['metrics']['stop'].set()
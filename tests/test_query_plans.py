@@ -0,0 +1,62 @@
+from app.models import DeviceDiagnostics, db
+from app.queryplans import check_query_plans, explain, full_scans, route_queries, sorts
+from app.routes.diagnostics import build_diagnostics_query
+from app.seed import seed
+
+
+def _schema(app):
+    """{table: (primary key columns in order, {(index columns, unique, partial)})} of the model tables."""
+    schema = {}
+    with app.app_context():
+        connection = db.session.connection()
+        for table in db.metadata.tables:
+            columns = connection.exec_driver_sql(f'PRAGMA table_info("{table}")').all()
+            primary_key = tuple(column[1] for column in sorted(columns, key=lambda column: column[5]) if column[5])
+            indexes = set()
+            for _, name, unique, _, partial in connection.exec_driver_sql(f'PRAGMA index_list("{table}")').all():
+                indexed = tuple(row[2] for row in connection.exec_driver_sql(f'PRAGMA index_info("{name}")'))
+                indexes.add((indexed, bool(unique), bool(partial)))
+            schema[table] = (primary_key, indexes)
+    return schema
+
+
+def test_route_queries_use_indexes(seeded):
+    failures = {name: problems for name, (plan, problems) in check_query_plans().items() if problems}
+    assert failures == {}
+
+
+def test_route_queries_use_indexes_on_migrated_schema(migrated_app):
+    seed(users=1, devices=3, diagnostics=50)
+    failures = {name: problems for name, (plan, problems) in check_query_plans().items() if problems}
+    assert failures == {}
+
+
+def test_migrations_build_the_model_schema(app, migrated_app):
+    # Key and index column order matter to the plans, and `flask db check` does not compare them
+    assert _schema(migrated_app) == _schema(app)
+
+
+def test_all_devices_listing_seeks_each_device(seeded):
+    queries, listings = route_queries()
+    for sort_by in ('timestamp', 'cpu_usage', 'memory_usage'):
+        for name in (f'all devices sort={sort_by}', f'all devices keyset seek sort={sort_by}'):
+            name = f'diagnostics.list_diagnostics: {name}'
+            plan = explain(queries[name])
+            assert name in listings
+            assert any(
+                line.startswith('SEARCH device_diagnostics USING COVERING INDEX '
+                                f'ix_device_diagnostics_device_id_{sort_by} (device_id=?')
+                for line in plan
+            ), plan
+            assert sorts(plan) == []
+
+
+def test_sorted_multi_device_listing_is_flagged(seeded):
+    # device_id IN (...) ORDER BY timestamp: every page sorts all of the devices' rows
+    plan = explain(build_diagnostics_query([1, 2, 3]).limit(6))
+    assert sorts(plan) == ['USE TEMP B-TREE FOR ORDER BY']
+
+
+def test_unindexed_filter_is_flagged(seeded):
+    plan = explain(DeviceDiagnostics.query.filter(DeviceDiagnostics.cpu_usage > 50))
+    assert full_scans(plan) == ['SCAN device_diagnostics']
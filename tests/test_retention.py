@@ -0,0 +1,146 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, func, insert, select, update
+from app import archive, retention
+from app.models import Device, DeviceDiagnostics, db
+from app.seed import seed
+from app.signals import diagnostics_added, diagnostics_changed
+
+
+@pytest.fixture
+def archived(app, tmp_path):
+    """One device with 90 days of samples up to last month, all archived."""
+    app.config['DIAGNOSTICS_ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    closed = archive.month_start(datetime.utcnow())
+    seed(users=1, devices=1, diagnostics=180, interval=12 * 3600, end=closed - timedelta(hours=1))
+    device_id = db.session.execute(select(Device.id)).scalar_one()
+    assert archive.archive_device(device_id, closed)
+    db.session.rollback()
+    return device_id
+
+
+def _late_sample(device_id):
+    first_month = archive.partitions(device_id)[0][0]
+    return {'device_id': device_id, 'cpu_usage': 12.5, 'memory_usage': 34.5,
+            'timestamp': first_month + timedelta(days=1, minutes=7)}
+
+
+def _in_archive(device_id, sample):
+    return any(row[4] == sample['timestamp'] for chunk in archive.archived_rows(device_id) for row in chunk)
+
+
+def _archived(device_id):
+    return [row for chunk in archive.archived_rows(device_id) for row in chunk]
+
+
+def _settle(app):
+    """Wait for the archiver thread to drain its queue."""
+    thread = app.extensions.get('archiver')
+    if thread is not None:
+        thread.join(timeout=10)
+    assert not app.extensions.get('archive_pending')
+
+
+def _purge(device_id):
+    """Purge with 30 days of retention; returns (result, rows that were expired before it ran)."""
+    [(device, cutoff)] = retention.purge_plan(30, device_id=device_id)
+    expired = _raw_count(device_id, DeviceDiagnostics.timestamp < cutoff)
+    return retention.purge_device(device, cutoff, pause=0), expired
+
+
+def _raw_count(device_id, *criteria):
+    return db.session.execute(
+        select(func.count()).select_from(DeviceDiagnostics)
+        .where(DeviceDiagnostics.device_id == device_id, *criteria)
+    ).scalar()
+
+
+def test_purge_archives_back_dated_samples_before_deleting(archived):
+    sample = _late_sample(archived)
+    # Written without diagnostics_added, as if the sample arrived after the last `archive run`
+    db.session.execute(insert(DeviceDiagnostics), [sample])
+    db.session.commit()
+    assert not _in_archive(archived, sample)
+
+    result, expired = _purge(archived)
+
+    assert result.rows == expired
+    assert _raw_count(archived, DeviceDiagnostics.timestamp < result.cutoff) == 0
+    assert _in_archive(archived, sample)
+
+
+def test_purge_keeps_samples_inserted_after_it_read_the_archive(archived, monkeypatch):
+    sample = _late_sample(archived)
+    archive_device = archive.archive_device
+
+    def archive_then_insert(*args, **kwargs):
+        written = archive_device(*args, **kwargs)
+        with db.engine.begin() as connection:
+            connection.execute(insert(DeviceDiagnostics), [sample])
+        return written
+
+    monkeypatch.setattr(archive, 'archive_device', archive_then_insert)
+    result, expired = _purge(archived)
+
+    assert result.rows == expired
+    assert _raw_count(archived, DeviceDiagnostics.timestamp < result.cutoff) == 1
+    assert not _in_archive(archived, sample)
+
+
+def test_back_dated_samples_are_archived_on_arrival(app, archived):
+    sample = _late_sample(archived)
+    db.session.execute(insert(DeviceDiagnostics), [sample])
+    db.session.commit()
+    diagnostics_added.send(app, rows=[sample])
+    _settle(app)
+
+    assert _in_archive(archived, sample)
+
+
+def test_archive_keeps_duplicate_samples(app, archived):
+    sample = _late_sample(archived)
+    db.session.execute(insert(DeviceDiagnostics), [sample, sample])
+    db.session.commit()
+    diagnostics_added.send(app, rows=[sample, sample])
+    _settle(app)
+
+    assert sum(row[4] == sample['timestamp'] for row in _archived(archived)) == 2
+
+
+def test_archive_follows_edits_and_deletes(app, archived):
+    first, second = db.session.execute(
+        select(DeviceDiagnostics.id).where(DeviceDiagnostics.device_id == archived)
+        .order_by(DeviceDiagnostics.timestamp).limit(2)
+    ).scalars()
+    count = len(_archived(archived))
+    db.session.execute(update(DeviceDiagnostics).where(DeviceDiagnostics.id == first).values(cpu_usage=99.5))
+    db.session.execute(delete(DeviceDiagnostics).where(DeviceDiagnostics.id == second))
+    db.session.commit()
+    diagnostics_changed.send(app, device_ids={archived})
+    _settle(app)
+
+    rows = {row[0]: row for row in _archived(archived)}
+    assert len(rows) == count - 1
+    assert rows[first][2] == 99.5
+    assert second not in rows
+
+
+def test_purged_samples_survive_a_rewrite(app, archived):
+    result, expired = _purge(archived)
+    assert result.rows == expired
+    count = len(_archived(archived))
+
+    diagnostics_changed.send(app, device_ids={archived})
+    _settle(app)
+
+    assert len(_archived(archived)) == count
+
+
+def test_late_samples_are_not_archived_in_the_request(app, archived, monkeypatch):
+    calls = []
+    monkeypatch.setattr(archive, 'rearchive_device', lambda *args, **kwargs: calls.append(threading.get_ident()))
+    diagnostics_added.send(app, rows=[_late_sample(archived)])
+    _settle(app)
+
+    assert calls and threading.get_ident() not in calls
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, select
+from app import retention, rollups
+from app.models import Device, DiagnosticsDayRollup, DiagnosticsHourRollup, DiagnosticsMinuteRollup, db
+from app.seed import seed
+
+
+def _buckets(model, device_id):
+    return dict(db.session.execute(
+        select(model.bucket, model.sample_count).where(model.device_id == device_id)
+    ).all())
+
+
+@pytest.fixture
+def purged(app):
+    """One device with four days of samples every 10 minutes, purged to the last two days (mid-hour)."""
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    seed(users=1, devices=1, diagnostics=6 * 24 * 4, interval=600, end=end)
+    device_id = db.session.execute(select(Device.id)).scalar_one()
+    history = {model: _buckets(model, device_id) for model in (DiagnosticsHourRollup, DiagnosticsDayRollup)}
+    cutoff = end - timedelta(days=2, minutes=25)
+    assert retention.purge_device(device_id, cutoff, pause=0).rows
+    return device_id, cutoff, history
+
+
+def test_purge_drops_expired_minute_rollups(purged):
+    device_id, cutoff, _ = purged
+    minutes = _buckets(DiagnosticsMinuteRollup, device_id)
+    assert minutes
+    assert min(minutes) >= rollups.bucket_start(cutoff, 'minute')
+
+
+def test_backfill_keeps_history_of_purged_ranges(purged):
+    device_id, cutoff, history = purged
+    boundary = rollups.bucket_start(cutoff, 'hour')
+    latest = max(history[DiagnosticsHourRollup])
+    db.session.execute(delete(DiagnosticsHourRollup).where(DiagnosticsHourRollup.bucket == latest))
+    db.session.commit()
+
+    rollups.backfill(device_id)
+
+    assert _buckets(DiagnosticsHourRollup, device_id) == history[DiagnosticsHourRollup]
+    assert _buckets(DiagnosticsDayRollup, device_id) == history[DiagnosticsDayRollup]
+    assert history[DiagnosticsHourRollup][boundary] == 6
+
+
+def test_refresh_keeps_partly_purged_buckets(purged):
+    device_id, cutoff, history = purged
+    boundary = rollups.bucket_start(cutoff, 'hour')
+
+    rollups.refresh_buckets([(device_id, cutoff + timedelta(minutes=1))])
+    db.session.commit()
+
+    hours = _buckets(DiagnosticsHourRollup, device_id)
+    assert hours[boundary] == history[DiagnosticsHourRollup][boundary]
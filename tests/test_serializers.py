@@ -0,0 +1,38 @@
+import json
+import math
+from datetime import datetime
+from app.serializers import RowEncoder
+
+ENCODER = RowEncoder([
+    ('id', 'int', False),
+    ('name', 'str', True),
+    ('value', 'float', False),
+    ('optional', 'float', True),
+    ('at', 'datetime', True),
+])
+
+
+def test_rows_match_json_dumps():
+    rows = [
+        (1, 'café "quoted"', 0.1, None, datetime(2026, 1, 2, 3, 4, 5, 678)),
+        (2, None, 1e300, -2.5, None),
+    ]
+    expected = json.dumps(
+        [{'id': i, 'name': n, 'value': v, 'optional': o, 'at': a.isoformat() if a else None}
+         for i, n, v, o, a in rows],
+        separators=(',', ':'),
+    )
+
+    assert ENCODER.encode_rows(rows) == expected
+
+
+def _reject_constant(name):
+    raise AssertionError(f"{name} is not JSON")
+
+
+def test_non_finite_floats_are_null():
+    rows = [(1, 'x', math.inf, -math.inf, None), (2, 'y', math.nan, math.nan, None)]
+
+    decoded = json.loads(ENCODER.encode_rows(rows), parse_constant=_reject_constant)
+
+    assert [(row['value'], row['optional']) for row in decoded] == [(None, None), (None, None)]
@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from app.engine_profile import install_sqlite_profile
+from app.metrics import registry
+
+
+@pytest.fixture
+def make_engine(app, tmp_path):
+    engines = []
+
+    def make(**config):
+        engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}", pool_size=4)
+        install_sqlite_profile(engine, dict(app.config, **config))
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def _create_samples(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sample (id INTEGER PRIMARY KEY, device_id INTEGER, value REAL)"))
+        if rows:
+            conn.execute(text("INSERT INTO sample (device_id, value) VALUES (:d, :v)"),
+                         [{'d': i % 10, 'v': i * 0.5} for i in range(rows)])
+
+
+def _lock_metrics():
+    snapshot = registry.snapshot()
+    waits = next((v for n, _, v in snapshot['histograms'] if n == 'sqlite_lock_wait_seconds'), [0, 0])
+    busy = next((v for n, _, v in snapshot['counters'] if n == 'sqlite_busy_waits_total'), 0)
+    return waits[-1], waits[-2], busy  # observations, total seconds, busy waits
+
+
+def test_wal_readers_not_blocked_by_open_write_transaction(make_engine):
+    # A tiny page cache makes the writer spill to the database mid-transaction, which takes
+    # an exclusive lock under the rollback journal; with WAL readers keep reading the last commit
+    engine = make_engine(SQLITE_JOURNAL_MODE='WAL', SQLITE_CACHE_SIZE=100)
+    _create_samples(engine, 1000)
+    written, release = threading.Event(), threading.Event()
+
+    def writer():
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO sample (device_id, value) VALUES (:d, :v)"),
+                         [{'d': i % 10, 'v': i * 0.5} for i in range(50000)])
+            written.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        assert written.wait(10)
+        latencies = []
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            with engine.connect() as conn:
+                count = conn.execute(text("SELECT count(*) FROM sample")).scalar()
+            latencies.append(time.perf_counter() - started)
+            assert count == 1000
+    finally:
+        release.set()
+        thread.join()
+
+    assert max(latencies) < 0.1
+
+
+def test_lock_wait_excludes_statement_time(make_engine):
+    engine = make_engine(SQLITE_BUSY_WAIT_THRESHOLD_MS=2)
+    _create_samples(engine, 0)
+
+    # A large uncontended write: its runtime is not a lock wait
+    observations, seconds, busy = _lock_metrics()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sample (device_id, value) VALUES (:d, :v)"),
+                     [{'d': i % 10, 'v': i * 0.5} for i in range(50000)])
+    after = _lock_metrics()
+    assert after[0] == observations + 1
+    assert after[1] - seconds < 0.002
+    assert after[2] == busy
+
+
+def test_lock_wait_counts_a_busy_write_lock(make_engine):
+    engine = make_engine(SQLITE_BUSY_WAIT_THRESHOLD_MS=2)
+    _create_samples(engine, 0)
+    holding = threading.Event()
+
+    def holder():
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO sample (device_id, value) VALUES (1, 1.0)"))
+            holding.set()
+            time.sleep(0.3)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    assert holding.wait(5)
+    observations, seconds, busy = _lock_metrics()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sample (device_id, value) VALUES (2, 2.0)"))
+    thread.join()
+
+    after = _lock_metrics()
+    assert after[0] == observations + 1
+    assert after[1] - seconds > 0.1
+    assert after[2] == busy + 1
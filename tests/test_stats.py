@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from app.stats import METRICS, PERCENTILES, grouped_stats
+
+
+def test_grouped_stats_match_numpy_for_large_values():
+    # Unbounded memory_usage: device count x value span far beyond 2**53
+    rng = np.random.default_rng(7)
+    devices = rng.integers(1, 400, size=20000)
+    columns = np.column_stack([devices, rng.uniform(0, 100, size=20000), rng.uniform(0, 1e13, size=20000)])
+
+    stats = grouped_stats(columns)
+
+    for device_id in np.unique(devices).tolist():
+        rows = columns[columns[:, 0] == device_id]
+        assert stats[device_id]['samples'] == len(rows)
+        for index, metric in enumerate(METRICS, start=1):
+            values = rows[:, index]
+            expected = {'avg': values.mean(), 'min': values.min(), 'max': values.max()}
+            expected.update({f'p{p}': np.percentile(values, p) for p in PERCENTILES})
+            for name, value in expected.items():
+                # Results are rounded to 2 decimals; allow for that and float noise, not for wrong ranks
+                assert stats[device_id][metric][name] == pytest.approx(float(value), rel=1e-12, abs=0.006), (
+                    device_id, metric, name
+                )
+
+
+def test_stats_rejects_windows_out_of_range(client):
+    for query in ('window=999999999w', 'window=99999999999999999999d', 'window=521w',
+                  'window=7d&end=0001-01-03T00:00:00', 'end=0001-01-01T00:30:00%2B01:00'):
+        response = client.get(f'/diagnostics/stats?{query}')
+        assert response.status_code == 400, query
+        assert response.json['error']
+
+    assert client.get('/diagnostics/stats?window=520w').status_code == 200
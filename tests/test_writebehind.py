@@ -0,0 +1,75 @@
+import threading
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select
+from app.models import Device, DeviceDiagnostics, db
+from app.writebehind import QueueFull, WriteBehindQueue
+
+
+def _rows(device_id, count):
+    return [{'device_id': device_id, 'cpu_usage': 50.0, 'memory_usage': 60.0, 'timestamp': datetime.utcnow()}
+            for _ in range(count)]
+
+
+def _stored(device_id):
+    count = db.session.execute(
+        select(func.count()).select_from(DeviceDiagnostics).where(DeviceDiagnostics.device_id == device_id)
+    ).scalar()
+    db.session.rollback()
+    return count
+
+
+@pytest.fixture
+def device_id(seeded):
+    device_id = db.session.execute(select(Device.id).order_by(Device.id)).scalars().first()
+    db.session.rollback()
+    return device_id
+
+
+def test_full_queue_rejects_after_put_timeout(app, device_id):
+    # Nothing is due for a minute, so the queue stays full
+    queue = WriteBehindQueue(app, max_rows=5, flush_rows=100, flush_interval=60, put_timeout=0.05)
+    queue.submit(_rows(device_id, 5))
+
+    with pytest.raises(QueueFull):
+        queue.submit(_rows(device_id, 1))
+    assert len(queue) == 5
+    queue.close()
+
+
+def test_blocked_producer_proceeds_once_a_group_is_written(app, device_id):
+    before = _stored(device_id)
+    queue = WriteBehindQueue(app, max_rows=5, flush_rows=100, flush_interval=0.1, put_timeout=10)
+    queue.submit(_rows(device_id, 5))
+
+    queue.submit(_rows(device_id, 3))
+    queue.close()
+
+    assert _stored(device_id) == before + 8
+
+
+def test_close_writes_queued_rows_and_stops_accepting(app, device_id):
+    before = _stored(device_id)
+    queue = WriteBehindQueue(app, flush_rows=100, flush_interval=60)
+    queue.submit(_rows(device_id, 7))
+    assert _stored(device_id) == before
+
+    queue.close()
+
+    assert _stored(device_id) == before + 7
+    assert len(queue) == 0
+    with pytest.raises(QueueFull):
+        queue.submit(_rows(device_id, 1))
+
+
+def test_failed_group_is_retried_without_missing_devices(app, device_id):
+    before = _stored(device_id)
+    missing = device_id + 1000
+    queue = WriteBehindQueue(app, flush_rows=100, flush_interval=60)
+    # The foreign key fails the whole group; the retry writes the rows of the live device
+    queue.submit(_rows(device_id, 4) + _rows(missing, 2) + _rows(device_id, 1))
+    queue.close()
+
+    assert _stored(device_id) == before + 5
+    assert _stored(missing) == 0
+    assert not any(t.name == 'diagnostics-write-behind' for t in threading.enumerate())